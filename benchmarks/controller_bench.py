@@ -0,0 +1,100 @@
+"""
+Switch latency of ClashController over TCP vs. a Unix socket.
+
+    python benchmarks/controller_bench.py [--switches 2000] [--nodes 200]
+
+Serves one FakeClash on 127.0.0.1 (free port) and on a Unix socket, from a
+separate thread with its own event loop, and times ClashController.switch_proxy
+(a PUT /proxies/{group} on a fresh connection, as the scan does) and a fresh
+get_configs through each address, alternating transports so drift hits both alike.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeClash, node_names
+from core.clash_api import ClashController
+
+
+def summary(samples: List[float]) -> List[float]:
+    """p50, p95, p99, max and mean in ms."""
+    ordered = sorted(samples)
+    at = [ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in (0.50, 0.95, 0.99, 1.0)]
+    return [value * 1000 for value in at + [sum(ordered) / len(ordered)]]
+
+
+class ServerThread(threading.Thread):
+    """FakeClash on TCP and a Unix socket, on its own loop so client and server don't share one."""
+
+    def __init__(self, names: List[str], socket_path: str):
+        super().__init__(daemon=True)
+        self.clash = FakeClash(names)
+        self.socket_path = socket_path
+        self.ready = threading.Event()
+        self.port = None
+        self.loop = asyncio.new_event_loop()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        runner = self.loop.run_until_complete(self.clash.serve(port=0, path=self.socket_path))
+        self.port = next(addr[1] for addr in runner.addresses if isinstance(addr, tuple))
+        self.ready.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(runner.cleanup())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join(5)
+
+
+async def measure(controllers: Dict[str, ClashController], names: List[str], switches: int) -> Dict[str, Dict]:
+    samples = {label: {"switch": [], "configs": []} for label in controllers}
+    for i in range(switches):
+        for label, controller in controllers.items():
+            started = time.perf_counter()
+            if not await controller.switch_proxy("Proxy", names[i % len(names)]):
+                raise RuntimeError(f"switch over {label} failed")
+            samples[label]["switch"].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            await controller.get_configs(fresh=True)
+            samples[label]["configs"].append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--switches", type=int, default=2000, help="Switches per transport")
+    parser.add_argument("--nodes", type=int, default=200, help="Nodes known to the fake core")
+    args = parser.parse_args()
+
+    names = node_names(args.nodes)
+    with tempfile.TemporaryDirectory() as tmp:
+        server = ServerThread(names, os.path.join(tmp, "clash.sock"))
+        server.start()
+        server.ready.wait(10)
+        controllers = {
+            "tcp": ClashController(f"http://127.0.0.1:{server.port}"),
+            "unix": ClashController(f"unix://{server.socket_path}"),
+        }
+        try:
+            asyncio.run(measure(controllers, names, min(args.switches, 50)))  # Warm-up: imports, allocator
+            samples = asyncio.run(measure(controllers, names, args.switches))
+        finally:
+            server.stop()
+
+    print(f"{args.switches} calls per transport, latency in ms\n")
+    print(f"  {'':14}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}{'mean':>8}")
+    for label, calls in samples.items():
+        for call, values in calls.items():
+            print(f"  {label + ' ' + call:14}" + "".join(f"{value:>8.3f}" for value in summary(values)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Stand-ins for the outside world, for load tests.
+- FakeClash: the subset of the Clash external-controller API the app uses,
+  served by aiohttp over TCP and/or a Unix socket, with every node of the
+  generated subscription.
+- FakeChecker: an IPChecker whose sources are simulated (latency drawn around
+  a mean, a share of degraded results), so no traffic leaves the machine.
+  Every result carries the time it was produced in full_string (see STAMP),
+  which clients use to measure event delivery lag.
+"""
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.ip_checker import IPChecker
+from core.timeouts import Deadline
+from core.traffic import meter
+
+STAMP = re.compile(r"t=(\d+\.\d+)")
+
+
+def stamp_of(name: str) -> Optional[float]:
+    """Production time stamped into a node name by FakeChecker, or None."""
+    match = STAMP.search(name or "")
+    return float(match.group(1)) if match else None
+
+
+def node_names(count: int) -> List[str]:
+    return [f"🇭🇰 Load {i:05d}" for i in range(count)]
+
+
+def subscription_yaml(count: int) -> str:
+    """Clash config with count shadowsocks nodes on distinct literal addresses (no DNS lookups)."""
+    lines = ["proxies:"]
+    for i, name in enumerate(node_names(count)):
+        lines.append(f'  - {{name: "{name}", type: ss, server: 10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}, '
+                     f'port: 8388, cipher: aes-128-gcm, password: "load-test"}}')
+    lines += ["proxy-groups:", '  - name: "Proxy"', "    type: select", "    proxies:"]
+    lines += [f'      - "{name}"' for name in node_names(count)]
+    lines += ["rules:", "  - MATCH,Proxy", ""]
+    return "\n".join(lines)
+
+
+class FakeClash:
+    def __init__(self, names: List[str], mixed_port: int = 7897, delay: float = 0.0):
+        self.names = list(names)
+        self.mixed_port = mixed_port
+        self.delay = delay  # Added to every API call, emulates a busy core
+        self.mode = "rule"
+        self.selected = {"GLOBAL": "DIRECT", "Proxy": self.names[0] if self.names else "DIRECT"}
+        self.requests = 0
+
+    async def _tick(self):
+        self.requests += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+    async def get_configs(self, request):
+        await self._tick()
+        return web.json_response({"mode": self.mode, "mixed-port": self.mixed_port, "port": 0, "socks-port": 0})
+
+    async def patch_configs(self, request):
+        await self._tick()
+        self.mode = (await request.json()).get("mode", self.mode)
+        return web.Response(status=204)
+
+    def _group(self, name: str) -> Dict:
+        members = ["DIRECT", "Proxy"] + self.names if name == "GLOBAL" else self.names
+        return {"name": name, "type": "Selector", "now": self.selected[name], "all": members}
+
+    async def get_proxies(self, request):
+        await self._tick()
+        proxies = {name: {"name": name, "type": "Shadowsocks"} for name in self.names}
+        proxies["DIRECT"] = {"name": "DIRECT", "type": "Direct"}
+        for group in self.selected:
+            proxies[group] = self._group(group)
+        return web.json_response({"proxies": proxies})
+
+    async def get_proxy(self, request):
+        await self._tick()
+        name = request.match_info["name"]
+        if name in self.selected:
+            return web.json_response(self._group(name))
+        if name in self.names:
+            return web.json_response({"name": name, "type": "Shadowsocks"})
+        return web.json_response({"message": "resource not found"}, status=404)
+
+    async def put_proxy(self, request):
+        await self._tick()
+        group = request.match_info["name"]
+        target = (await request.json()).get("name")
+        if group not in self.selected:
+            return web.json_response({"message": "resource not found"}, status=404)
+        if target not in self._group(group)["all"]:
+            return web.json_response({"message": "Selector update error: proxy not exist"}, status=400)
+        self.selected[group] = target
+        return web.Response(status=204)
+
+    async def delete_connections(self, request):
+        await self._tick()
+        return web.Response(status=204)
+
+    async def serve(self, host: str = "127.0.0.1", port: Optional[int] = None,
+                    path: Optional[str] = None) -> web.AppRunner:
+        """Serves on TCP (port, 0 = any free one) and/or a Unix socket (path); cleanup() the runner to stop."""
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        if port is not None:
+            await web.TCPSite(runner, host, port).start()
+        if path is not None:
+            await web.UnixSite(runner, path).start()
+        return runner
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/configs", self.get_configs)
+        app.router.add_patch("/configs", self.patch_configs)
+        app.router.add_get("/proxies", self.get_proxies)
+        app.router.add_get("/proxies/{name}", self.get_proxy)
+        app.router.add_put("/proxies/{name}", self.put_proxy)
+        app.router.add_delete("/connections", self.delete_connections)
+        return app
+
+
+class FakeChecker(IPChecker):
+    """IPChecker with simulated sources; the deadline/timeout wrappers of the real one still apply."""
+
+    def __init__(self, latency: float = 0.02, degraded_rate: float = 0.05, seed: int = 1, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.degraded_rate = degraded_rate
+        self._random = random.Random(seed)
+
+    async def _simulate(self, deadline: Deadline, source: str, received: int) -> Dict:
+        await asyncio.sleep(min(self._random.expovariate(1 / self.latency) if self.latency else 0, deadline.remaining()))
+        meter.record(source, 700, received)
+        rnd = self._random
+        score = rnd.randint(0, 100)
+        return {
+            "ip": f"198.51.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}",
+            "pure_score": f"{score}%", "pure_emoji": "⚪" if score <= 10 else "🟢",
+            "shared_users": "1-10", "shared_emoji": "🟢", "bot_score": f"{rnd.randint(0, 100)}%", "bot_emoji": "🟢",
+            "ip_attr": "住宅", "ip_src": "原生", "source": source,
+            "full_string": f"【⚪🟢 t={time.time():.6f}】",
+        }
+
+    async def _check_fast_impl(self, proxy=None, source="ping0", fallback=True, deadline: Optional[Deadline] = None):
+        deadline = deadline or self.node_deadline(fast_mode=True)
+        degraded = fallback and self._random.random() < self.degraded_rate
+        return await self._simulate(deadline, "ippure" if degraded else source, 30_000)
+
+    async def _check_browser_impl(self, proxy, deadline: Deadline):
+        return await self._simulate(deadline, "browser", 400_000)
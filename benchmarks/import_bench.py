@@ -0,0 +1,80 @@
+"""
+Start-up import cost, and a guard on the lazy imports of the check sources.
+
+    python benchmarks/import_bench.py [--top 15]
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+the modules the web app and the CLI load at start (state, clash_automator,
+core.ip_checker), prints the total and the slowest top-level imports, and
+exits with status 1 if Playwright or curl_cffi shows up in the trace: fast
+mode must not pay for the browser, and neither mode should load a source
+before it is used. tests/test_lazy_imports.py guards the same rule.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ("state", "clash_automator", "core.ip_checker")
+# Only imported on first use of the source that needs them
+LAZY = ("playwright", "curl_cffi")
+
+# import time: self [us] | cumulative | imported package
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_trace(module: str) -> List[Tuple[str, int, int, int]]:
+    """(package, self µs, cumulative µs, nesting level) of every import made by `import module`."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    trace = []
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            level = (len(match.group(3)) - 1) // 2
+            trace.append((match.group(4), int(match.group(1)), int(match.group(2)), level))
+    return trace
+
+
+def lazy_violations(trace: List[Tuple[str, int, int, int]]) -> Dict[str, List[str]]:
+    """LAZY package -> its modules that were imported."""
+    found = {}
+    for package, *_ in trace:
+        root = package.split(".")[0]
+        if root in LAZY:
+            found.setdefault(root, []).append(package)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports listed per module")
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        trace = import_trace(module)
+        own = next((cumulative for package, _, cumulative, _ in trace if package == module), None)
+        print(f"import {module}: {own / 1000 if own else float('nan'):.1f} ms cumulative")
+        # Direct imports of project modules and first-level third-party packages
+        shallow = [entry for entry in trace if entry[3] <= 1]
+        for package, _, cumulative, level in sorted(shallow, key=lambda e: e[2], reverse=True)[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {'  ' * level}{package}")
+        violations = lazy_violations(trace)
+        for package, modules in violations.items():
+            failed = True
+            print(f"  FAIL: {package} imported at start ({', '.join(modules[:3])}{', ...' if len(modules) > 3 else ''})")
+        if not violations:
+            print(f"  ok: none of {', '.join(LAZY)} imported")
+        print()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Serialization cost of the web service's JSON paths.
+
+    python benchmarks/json_bench.py [--nodes 10000]
+
+Compares the previous per-event json.dumps SSE frame with utils.json_io.sse_frame,
+and a full /api/nodes listing (json.dumps of every record) with RecordCache
+(cold = first listing, warm = listing after 1% of the nodes changed).
+Install orjson to see the fast backend; without it the json fallback is measured.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.json_io import BACKEND, RecordCache, sse_frame
+
+
+def make_node(i: int) -> dict:
+    proxy = {
+        "name": f"🇭🇰 香港 {i:05d} | IEPL", "type": "vmess", "server": f"hk{i}.example.com", "port": 443,
+        "uuid": "a3482e88-686a-4a58-8126-99c9df64b7bf", "alterId": 0, "cipher": "auto", "tls": True,
+        "network": "ws", "ws-opts": {"path": "/ray", "headers": {"Host": f"hk{i}.example.com"}},
+    }
+    return {
+        "id": i, "original_name": proxy["name"], "name": f"{proxy['name']}【⚪🟢 住宅|原生】",
+        "ip": f"203.0.{i // 256 % 256}.{i % 256}", "risk": "8%", "bot": "N/A", "shared": "1-10",
+        "type": "住宅", "native": "原生", "source": "ping0", "status": "✅",
+        "fingerprint": f"{i:016x}", "traffic": 2048, "proxy_config": proxy,
+    }
+
+
+def per_call(fn, number: int) -> float:
+    """Best-of-3 seconds per call."""
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number
+
+
+def fmt(seconds: float) -> str:
+    return f"{seconds * 1e6:10.1f} µs" if seconds < 1e-3 else f"{seconds * 1e3:10.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=10000, help="Nodes in the listing benchmark")
+    args = parser.parse_args()
+
+    nodes = [make_node(i) for i in range(args.nodes)]
+    event = {"type": "progress", "progress": 1, "total": args.nodes, "node": nodes[0]}
+    print(f"JSON backend: {BACKEND}, {args.nodes} nodes\n")
+
+    print("Per SSE event")
+    print(f"  json.dumps frame   {fmt(per_call(lambda: f'data: {json.dumps(event, ensure_ascii=False)}'.encode(), 2000))}")
+    print(f"  sse_frame          {fmt(per_call(lambda: sse_frame(event), 2000))}")
+
+    print(f"\nPer {args.nodes}-node listing")
+    print(f"  json.dumps         {fmt(per_call(lambda: json.dumps({'nodes': nodes}, ensure_ascii=False).encode(), 5))}")
+
+    def cold():
+        RecordCache().listing(nodes)
+
+    cache = RecordCache()
+    cache.listing(nodes)
+    changed = max(args.nodes // 100, 1)
+
+    def warm():
+        for i in range(changed):  # A scan replaces records as results come in
+            nodes[i] = dict(nodes[i])
+        cache.listing(nodes)
+
+    print(f"  RecordCache cold   {fmt(per_call(cold, 5))}")
+    print(f"  RecordCache warm   {fmt(per_call(warm, 5))}  ({changed} records changed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Load test of the web service: SSE fan-out, /api/nodes polling, exports and rechecks.
+
+    python benchmarks/loadtest.py [--nodes 2000] [--sse 50] [--pollers 10] [--exporters 2] [--rechecks 20]
+
+Starts a fake Clash controller and web.py (with FakeChecker sources) as
+separate processes, runs one scan while the simulated clients hammer the API,
+then a round of rechecks. Reports request latency percentiles, event delivery
+lag (result produced -> seen by an SSE client) and server CPU/RSS, and exits
+with status 1 if any threshold (--max-*) is exceeded or, with --baseline,
+if a metric regressed by more than --tolerance against a saved run (--save).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeClash, FakeChecker, node_names, stamp_of, subscription_yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max in ms (None without samples)."""
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+
+    def at(q):
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 1)
+    return {"count": len(ordered), "p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "max": at(1.0)}
+
+
+class ProcessSampler:
+    """CPU and RSS of a process from /proc (Linux); empty stats elsewhere."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.rss_peak = 0
+        self.cpu_samples: List[float] = []  # share of one core per interval
+
+    def _read(self):
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{self.pid}/status") as f:
+                rss = next((int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:")), 0)
+            return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, rss
+        except (OSError, IndexError, ValueError):
+            return None
+
+    async def run(self, stop: asyncio.Event):
+        previous = self._read()
+        last = time.monotonic()
+        while previous is not None and not stop.is_set():
+            await asyncio.sleep(self.interval)
+            current = self._read()
+            if current is None:
+                return
+            now = time.monotonic()
+            self.cpu_samples.append((current[0] - previous[0]) / (now - last))
+            self.rss_peak = max(self.rss_peak, current[1])
+            previous, last = current, now
+
+    def stats(self) -> Dict:
+        if not self.cpu_samples:
+            return {"cpu_avg": None, "cpu_peak": None, "rss_peak_mb": None}
+        return {
+            "cpu_avg": round(sum(self.cpu_samples) / len(self.cpu_samples), 3),
+            "cpu_peak": round(max(self.cpu_samples), 3),
+            "rss_peak_mb": round(self.rss_peak / 1024 / 1024, 1),
+        }
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.base = f"http://127.0.0.1:{args.port}"
+        self.latency: Dict[str, List[float]] = {"nodes": [], "export": [], "recheck": [], "start": []}
+        self.errors: Dict[str, int] = {}
+        self.lag: List[float] = []
+        self.sse_seen: List[int] = []  # distinct nodes with a result, per subscriber
+        self.sse_frames = 0
+
+    def _error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    async def _timed(self, kind: str, request):
+        started = time.monotonic()
+        try:
+            async with request as resp:
+                body = await resp.read()
+                if resp.status >= 400:
+                    self._error(kind)
+                    return None
+                self.latency[kind].append(time.monotonic() - started)
+                return json.loads(body) if body else None
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self._error(kind)
+            return None
+
+    async def subscriber(self, session: aiohttp.ClientSession):
+        seen = set()
+        url = f"{self.base}/api/progress?coalesce={self.args.coalesce}"
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=None, sock_read=60)) as resp:
+                buffer = b""
+                async for chunk in resp.content.iter_any():  # Frames can exceed the readline limit
+                    received = time.time()
+                    buffer += chunk
+                    *frames, buffer = buffer.split(b"\n\n")
+                    for frame in frames:
+                        if not frame.startswith(b"data: "):
+                            continue
+                        event = json.loads(frame[6:])
+                        self.sse_frames += 1
+                        nodes = event.get("nodes", []) if event["type"] == "batch" else [event.get("node") or {}]
+                        for node in nodes:
+                            stamp = stamp_of(node.get("name"))
+                            if stamp is not None:
+                                self.lag.append(max(received - stamp, 0))
+                                seen.add(node["id"])
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self._error("sse")
+        self.sse_seen.append(len(seen))
+
+    async def poller(self, session, stop: asyncio.Event):
+        while not stop.is_set():
+            await self._timed("nodes", session.get(f"{self.base}/api/nodes"))
+            await asyncio.sleep(self.args.poll_interval)
+
+    async def exporter(self, session, stop: asyncio.Event):
+        while not stop.is_set():
+            await asyncio.sleep(self.args.export_interval)
+            await self._timed("export", session.post(f"{self.base}/api/export",
+                                                      json={"node_ids": list(range(self.args.nodes))}))
+
+    async def wait_ready(self, session, url: str, server: subprocess.Popen, timeout: float = 30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with status {server.returncode} (--verbose shows its output)")
+            try:
+                async with session.get(url) as resp:
+                    if resp.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError(f"{url} not ready after {timeout}s")
+
+    def scan_config(self) -> Dict:
+        return {
+            "clash_api_url": f"http://127.0.0.1:{self.args.clash_port}",
+            "fast_mode": True, "source": "ping0", "fallback": True,
+            "switch_settle": 0, "egress_ordering": False, "adaptive_concurrency": False,
+        }
+
+    async def run(self, server: subprocess.Popen) -> Dict:
+        args = self.args
+        sampler = ProcessSampler(server.pid)
+        stop_sampling = asyncio.Event()
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60)) as session:
+            await self.wait_ready(session, f"{self.base}/api/nodes", server)
+            sampling = asyncio.create_task(sampler.run(stop_sampling))
+
+            # Phase 1: a scan with SSE subscribers, pollers and exporters
+            started = time.monotonic()
+            data = await self._timed("start", session.post(f"{self.base}/api/start", json={
+                "yaml_content": subscription_yaml(args.nodes), "config": self.scan_config()}))
+            if data is None:
+                raise RuntimeError("POST /api/start failed")
+            subscribers = [asyncio.create_task(self.subscriber(session)) for _ in range(args.sse)]
+            stop = asyncio.Event()
+            clients = [asyncio.create_task(self.poller(session, stop)) for _ in range(args.pollers)]
+            clients += [asyncio.create_task(self.exporter(session, stop)) for _ in range(args.exporters)]
+            await asyncio.gather(*subscribers)
+            scan_seconds = time.monotonic() - started
+
+            # Phase 2: rechecks (exclusive on the server) while polling goes on
+            for i in range(args.rechecks):
+                await self._timed("recheck", session.post(f"{self.base}/api/nodes/{i % args.nodes}/recheck",
+                                                          json={"config": self.scan_config()}))
+            stop.set()
+            await asyncio.gather(*clients)
+            stop_sampling.set()
+            await sampling
+
+        return {
+            "scan_seconds": round(scan_seconds, 2),
+            "latency_ms": {kind: percentiles(samples) for kind, samples in self.latency.items()},
+            "lag_ms": percentiles(self.lag),
+            "sse": {"subscribers": args.sse, "frames": self.sse_frames,
+                    "incomplete": sum(1 for seen in self.sse_seen if seen < args.nodes)},
+            "errors": self.errors,
+            "server": sampler.stats(),
+        }
+
+
+def check_thresholds(report: Dict, args) -> List[str]:
+    failures = []
+    limits = [
+        ("latency_ms.nodes.p95", report["latency_ms"]["nodes"]["p95"], args.max_poll_p95),
+        ("latency_ms.export.p95", report["latency_ms"]["export"]["p95"], args.max_export_p95),
+        ("latency_ms.recheck.p95", report["latency_ms"]["recheck"]["p95"], args.max_recheck_p95),
+        ("lag_ms.p95", report["lag_ms"]["p95"], args.max_lag_p95),
+        ("server.rss_peak_mb", report["server"]["rss_peak_mb"], args.max_rss_mb),
+        ("server.cpu_avg", report["server"]["cpu_avg"], args.max_cpu),
+        ("sse.incomplete", report["sse"]["incomplete"], 0),
+        ("errors", sum(report["errors"].values()), args.max_errors),
+    ]
+    for name, value, limit in limits:
+        if value is not None and limit is not None and value > limit:
+            failures.append(f"{name} = {value} > {limit}")
+    return failures
+
+
+def compare_baseline(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Metrics (higher is worse) that grew by more than tolerance over the baseline."""
+    failures = []
+    metrics = [("lag_ms", "p95"), ("server", "cpu_avg"), ("server", "rss_peak_mb")]
+    metrics += [("latency_ms", kind) for kind in report["latency_ms"]]
+    for section, key in metrics:
+        now, before = report[section].get(key), baseline.get(section, {}).get(key)
+        if isinstance(now, dict):
+            now, before = now.get("p95"), (before or {}).get("p95")
+        if now is None or not before:
+            continue
+        if now > before * (1 + tolerance):
+            failures.append(f"{section}.{key}: {now} vs baseline {before} (+{(now / before - 1) * 100:.0f}%)")
+    return failures
+
+
+def print_report(report: Dict):
+    print(f"\nScan: {report['scan_seconds']}s, SSE frames: {report['sse']['frames']}, "
+          f"incomplete subscribers: {report['sse']['incomplete']}/{report['sse']['subscribers']}")
+    print(f"{'':12}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}   (ms)")
+    rows = dict(report["latency_ms"], **{"event lag": report["lag_ms"]})
+    for kind, stats in rows.items():
+        cells = "".join(f"{'-' if stats[q] is None else stats[q]:>10}" for q in ("p50", "p95", "p99", "max"))
+        print(f"{kind:12}{stats['count']:>8}{cells}")
+    server = report["server"]
+    print(f"Server: CPU avg {server['cpu_avg']} / peak {server['cpu_peak']} cores, RSS peak {server['rss_peak_mb']} MB")
+    if report["errors"]:
+        print(f"Errors: {report['errors']}")
+
+
+def serve_app(args):
+    """Child process: web.py with simulated sources."""
+    import uvicorn
+    from state import state
+    from web import app, event_loop
+    state.checker = FakeChecker(latency=args.check_latency, fast_budget=15, browser_budget=45)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", loop=event_loop())
+
+
+def serve_clash(args):
+    """Child process: fake Clash controller."""
+    from aiohttp import web
+    clash = FakeClash(node_names(args.nodes), delay=args.clash_delay)
+    web.run_app(clash.app(), host="127.0.0.1", port=args.clash_port, print=None)
+
+
+def drive(args) -> int:
+    args.port = args.port or free_port()
+    args.clash_port = args.clash_port or free_port()
+    workdir = tempfile.mkdtemp(prefix="loadtest-")  # history.db and exports/ of the server
+    forwarded = ["--nodes", str(args.nodes), "--port", str(args.port), "--clash-port", str(args.clash_port),
+                 "--check-latency", str(args.check_latency), "--clash-delay", str(args.clash_delay)]
+    script = os.path.abspath(__file__)
+    quiet = None if args.verbose else subprocess.DEVNULL
+    clash = subprocess.Popen([sys.executable, script, "--role", "clash"] + forwarded, cwd=workdir,
+                             stdout=quiet, stderr=quiet)
+    server = subprocess.Popen([sys.executable, script, "--role", "server"] + forwarded, cwd=workdir,
+                              stdout=quiet, stderr=quiet, env=dict(os.environ, PYTHONPATH=ROOT))
+    try:
+        print(f"Load test: {args.nodes} nodes, {args.sse} SSE clients (coalesce={args.coalesce}ms), "
+              f"{args.pollers} pollers, {args.exporters} exporters, {args.rechecks} rechecks")
+        report = asyncio.run(LoadTest(args).run(server))
+    finally:
+        for proc in (server, clash):
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    print_report(report)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    failures = check_thresholds(report, args)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures += compare_baseline(report, json.load(f), args.tolerance)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("FAILED" if failures else "OK")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--role", choices=["drive", "server", "clash"], default="drive", help=argparse.SUPPRESS)
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--sse", type=int, default=50, help="SSE subscribers")
+    parser.add_argument("--coalesce", type=int, default=250, help="SSE coalesce interval in ms, 0 = one frame per event")
+    parser.add_argument("--pollers", type=int, default=10, help="Clients polling /api/nodes")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--exporters", type=int, default=2, help="Clients exporting every node")
+    parser.add_argument("--export-interval", type=float, default=5.0)
+    parser.add_argument("--rechecks", type=int, default=20, help="Rechecks after the scan")
+    parser.add_argument("--check-latency", type=float, default=0.01, help="Mean simulated check time (s)")
+    parser.add_argument("--clash-delay", type=float, default=0.0, help="Added to every fake controller call (s)")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--clash-port", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Show server output")
+    # Thresholds (ms unless noted); exceeding any fails the run
+    parser.add_argument("--max-poll-p95", type=float, default=500)
+    parser.add_argument("--max-export-p95", type=float, default=2000)
+    parser.add_argument("--max-recheck-p95", type=float, default=1000)
+    parser.add_argument("--max-lag-p95", type=float, default=1500)
+    parser.add_argument("--max-rss-mb", type=float, default=1024)
+    parser.add_argument("--max-cpu", type=float, default=None, help="Average server CPU in cores")
+    parser.add_argument("--max-errors", type=int, default=0)
+    parser.add_argument("--save", help="Write the report (JSON) here, e.g. to use as a baseline")
+    parser.add_argument("--baseline", help="Report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed growth over the baseline")
+    args = parser.parse_args()
+
+    if args.role == "server":
+        serve_app(args)
+    elif args.role == "clash":
+        serve_clash(args)
+    else:
+        sys.exit(drive(args))
+
+
+if __name__ == "__main__":
+    main()
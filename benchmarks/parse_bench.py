@@ -0,0 +1,69 @@
+"""
+Parse cost of the check-site pages.
+
+    python benchmarks/parse_bench.py [--padding 200]
+
+Times parse_ping0 (and the whole-page DOTALL regexes it replaced),
+parse_ippure_text, is_cloudflare_challenge and ping0_complete on every page
+in tests/fixtures. --padding KB of extra markup
+is appended to the ping0 pages (the real one carries large inline scripts),
+which is where anchored, windowed searches differ from whole-page scans.
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.sources.parsers import is_cloudflare_challenge, parse_ippure_text, parse_ping0, ping0_complete
+
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+FILLER = '<script>window.__cfg = {"cdn": "https://cdn.example.com/static", "v": "3.2.1"};</script>\n'
+
+
+def dotall_parse_ping0(html: str) -> list:
+    """The regexes parse_ping0 replaced: uncompiled, each scanning from the top of the page."""
+    return [
+        re.search(r"window\.ip\s*=\s*'([^']+)'", html) or re.search(r'href="[^"]*?/ping/([0-9.]+)"', html),
+        re.search(r'<div class="line line-iptype">.*?<span class="label[^>]*>(.*?)</span>', html, re.DOTALL),
+        re.search(r'class="riskitem riskcurrent"[^>]*><span class="value">(\d+)%</span>', html),
+        re.search(r'<div class="line line-nativeip">.*?<span class="label[^>]*>(.*?)</span>', html, re.DOTALL),
+        re.search(r'usecount="([^"]+)"', html)
+        or re.search(r'class="usecountbar"[^>]*>\s*(.*?)\s*</div>', html, re.DOTALL),
+    ]
+
+
+def per_call(fn, number: int) -> float:
+    """Best-of-3 seconds per call."""
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number
+
+
+def fmt(seconds: float) -> str:
+    return f"{seconds * 1e6:10.1f} µs"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--padding", type=int, default=200, help="KB of markup appended to the ping0 pages")
+    args = parser.parse_args()
+
+    for name in sorted(os.listdir(FIXTURES)):
+        with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+            page = f.read()
+        if name.startswith("ping0"):
+            page = page.replace("</body>", FILLER * (args.padding * 1024 // len(FILLER)) + "</body>")
+            print(f"{name} ({len(page) // 1024} KB)")
+            print(f"  DOTALL regexes           {fmt(per_call(lambda: dotall_parse_ping0(page), 200))}")
+            print(f"  parse_ping0              {fmt(per_call(lambda: parse_ping0(page), 200))}")
+            print(f"  ping0_complete           {fmt(per_call(lambda: ping0_complete(page), 200))}")
+        else:
+            print(f"{name} ({len(page)} B)")
+            print(f"  parse_ippure_text        {fmt(per_call(lambda: parse_ippure_text(page), 2000))}")
+        print(f"  is_cloudflare_challenge  {fmt(per_call(lambda: is_cloudflare_challenge(page), 200))}")
+
+
+if __name__ == "__main__":
+    main()
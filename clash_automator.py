@@ -1,13 +1,28 @@
+import argparse
 import asyncio
-import yaml
+import contextlib
+import copy
+import time
 import os
 import sys
 from typing import Dict, Any, List
 
 # Import Utils
 from utils.config_loader import load_config
+from utils.yaml_io import load_yaml, dump_yaml, YAMLError
+from utils.rename_patch import build_patch, apply_patch_stream, to_json, to_script
+from utils.jsonl_output import JsonlWriter
 from core.ip_checker import IPChecker
 from core.clash_api import ClashController
+from core.scheduler import NodeScheduler
+from core.history import HistoryStore, node_fingerprint
+from core.ordering import egress_order
+from core.traffic import format_bytes
+from core.concurrency import AIMDController, classify
+from core.tiering import select_for_browser, merge_results
+from core.memprof import profiler, format_report, rss_bytes
+from core.warmup import warm_up, format_timings
+from core.speedtest import SpeedTest, with_speed, DEFAULT_URL as SPEEDTEST_DEFAULT_URL
 
 # --- CONFIGURATION ---
 cfg = load_config("config.yaml") or {}
@@ -17,48 +32,105 @@ CLASH_API_URL = cfg.get('clash_api_url', "http://127.0.0.1:9097")
 CLASH_API_SECRET = cfg.get('clash_api_secret', "")
 SELECTOR_NAME = cfg.get('selector_name', "GLOBAL")
 OUTPUT_SUFFIX = cfg.get('output_suffix', "_checked")
+OUTPUT_PATCH = cfg.get('output_patch', False)  # Also write <output>.rename.json / <output>.override.js
 FAST_MODE = cfg.get('fast_mode', True) 
 SKIP_KEYWORDS = cfg.get('skip_keywords', ["剩余", "重置", "到期", "有效期", "官网", "网址", "更新", "公告"])
 HEADLESS = cfg.get('headless', True)
+BROWSER_POOL_SIZE = cfg.get('browser_pool_size', 1)
+BROWSER_MAX_CHECKS = cfg.get('browser_max_checks', 200)
+BROWSER_MAX_RSS_MB = cfg.get('browser_max_rss_mb', 1500)
+NODE_TIMEOUT = cfg.get('node_timeout', 15)
+BROWSER_NODE_TIMEOUT = cfg.get('browser_node_timeout', 45)
+SWITCH_SETTLE = cfg.get('switch_settle', 1)  # Seconds for a switch to take effect
+WARMUP = cfg.get('warmup', False)  # Load sources / launch the browser before the first node
 SOURCE = cfg.get('source', 'ping0')
 FALLBACK = cfg.get('fallback', True)
 
+# Daemon mode
+DAEMON_CHECKS_PER_MINUTE = cfg.get('daemon_checks_per_minute', 6)
+DAEMON_RECHECK_INTERVAL = cfg.get('daemon_recheck_interval', 3600)
+DAEMON_WRITE_INTERVAL = cfg.get('daemon_write_interval', 300)
+PRIMARY_GROUPS = cfg.get('primary_groups', [])
+
+# Tiered mode: fast pass on every node, then a browser pass (bot score) only for
+# the top-K cleanest nodes, nodes of the listed groups and degraded/incomplete results
+TIERED = cfg.get('tiered', False)
+TIER_TOP_K = cfg.get('tier_top_k', 20)
+TIER_GROUPS = cfg.get('tier_groups', [])
+TIER_AMBIGUOUS = cfg.get('tier_ambiguous', True)
+
+# Offline IP database (built with: python -m core.sources.localdb csv ranges.csv ipdb.bin)
+LOCAL_DB = cfg.get('local_db', '')
+LOCAL_DB_SKIP_DATACENTER = cfg.get('local_db_skip_datacenter', False)
+
+# Results history (SQLite file, empty to disable)
+HISTORY_DB = cfg.get('history_db', 'history.db')
+
+# Check nodes sharing a server address back-to-back, so repeated exit IPs hit the cache
+EGRESS_ORDERING = cfg.get('egress_ordering', True)
+
+# Back off (pause between nodes) when Cloudflare challenges, timeouts or API errors pile up
+ADAPTIVE_CONCURRENCY = cfg.get('adaptive_concurrency', True)
+
+# Reuse HTTP connections while on the same node (pools are reset on every switch)
+REUSE_CONNECTIONS = cfg.get('reuse_connections', True)
+# Also close all of the core's connections on each switch (DELETE /connections, affects other apps too)
+DROP_CONNECTIONS = cfg.get('drop_connections', False)
+
+# Speed stage after the IP check: handshake, TTFB and throughput through the node
+SPEEDTEST = cfg.get('speedtest', False)
+SPEEDTEST_URL = cfg.get('speedtest_url', SPEEDTEST_DEFAULT_URL)
+SPEEDTEST_MAX_BYTES = cfg.get('speedtest_max_bytes', 2_000_000)
+SPEEDTEST_TIMEOUT = cfg.get('speedtest_timeout', 8)
+
+SPEED_TEST = SpeedTest(SPEEDTEST_URL, SPEEDTEST_MAX_BYTES, SPEEDTEST_TIMEOUT) if SPEEDTEST else None
+
 async def test_single_proxy(controller: ClashController, checker: IPChecker, proxy_name: str, selector: str, local_proxy: str, 
-                          fast_mode: bool = FAST_MODE, source: str = SOURCE, fallback: bool = FALLBACK) -> Dict[str, Any]:
+                          fast_mode: bool = FAST_MODE, source: str = SOURCE, fallback: bool = FALLBACK,
+                          speedtest: SpeedTest = SPEED_TEST) -> Dict[str, Any]:
     """
-    Tests a single proxy: switches to it, waits, and checks IP.
+    Tests a single proxy: switches to it, waits, and checks IP
+    (then measures its speed if a SpeedTest is given).
     Returns the result dictionary (or error dict).
     """
     print(f"\nTesting: {proxy_name}")
     
-    # ... switch logic same ...
+    # One time budget for switch + checks of this node
+    deadline = checker.node_deadline(fast_mode)
     
     # 1. Switch Node
     print(f"  -> Switching {selector} ...")
     switched = await controller.switch_proxy(selector, proxy_name)
     if not switched:
         print("  -> Switch failed, skipping IP check.")
-        return {"full_string": "【❌ Switch Error】", "ip": "Error", "pure_score": "?", "bot_score": "?"}
+        return {"full_string": "【❌ Switch Error】", "ip": "Error", "pure_score": "?", "bot_score": "?", "source": "switch_error"}
 
     # 2. Wait for switch to take effect
-    await asyncio.sleep(1) 
+    await asyncio.sleep(SWITCH_SETTLE)
 
     # 3. Check IP
     print(f"  -> Running IP Check ({'Fast Mode' if fast_mode else 'Browser Mode'})...")
     res = None
     
-    if fast_mode:
-        res = await checker.check_fast(proxy=local_proxy, source=source, fallback=fallback)
-    else:
-        # Browser Mode
-        try:
-            res = await checker.check_browser(proxy=local_proxy)
-        except Exception as e:
-            print(f"     Check error: {e}")
+    with checker.traffic.node(proxy_name):
+        if fast_mode:
+            res = await checker.check_fast(proxy=local_proxy, source=source, fallback=fallback, deadline=deadline)
+        else:
+            # Browser Mode
+            try:
+                res = await checker.check_browser(proxy=local_proxy, deadline=deadline)
+            except Exception as e:
+                print(f"     Check error: {e}")
     
     if not res:
             res = {"full_string": "【❌ Error】", "ip": "Error", "pure_score": "?", "bot_score": "?"}
 
+    # 4. Measure speed (own time budget, on top of the check's)
+    if speedtest and speedtest.worth_measuring(res):
+        print("  -> Measuring speed...")
+        with checker.traffic.node(proxy_name):
+            res = with_speed(res, await speedtest.measure(local_proxy))
+
     full_str = res['full_string']
     ip_addr = res.get('ip', 'Unknown')
     p_score = res.get('pure_score', 'N/A')
@@ -72,59 +144,193 @@ async def test_single_proxy(controller: ClashController, checker: IPChecker, pro
         details_str += f" | Bot流量比: {b_score}"
     if s_users != 'N/A':
         details_str += f" | 共享人数: {s_users}"
+    if res.get('speed_label'):
+        details_str += f" | 速度: {res['speed_label']}"
+    used = checker.traffic.of(proxy_name)
+    details_str += f" | 流量: {format_bytes(used['sent'] + used['received'])}"
     print(details_str)
     
     return res
 
-def save_config_results(original_config: dict, results_map: Dict[str, str], output_path: str):
+def rename_in_config(config: dict, renames: Dict[str, str]) -> dict:
+    """
+    Renames proxies and their proxy-group entries in a parsed config, in place.
+    """
+    for proxy in config.get('proxies', []):
+        if proxy['name'] in renames:
+            proxy['name'] = renames[proxy['name']]
+
+    for group in config.get('proxy-groups', []):
+        if 'proxies' in group:
+            group['proxies'] = [renames.get(p_name, p_name) for p_name in group['proxies']]
+    return config
+
+def save_patch_files(patch: dict, output_path: str):
+    """
+    Writes the rename patch next to the output: JSON map and mihomo override script.
+    """
+    base = os.path.splitext(output_path)[0]
+    for path, content in ((f"{base}.rename.json", to_json(patch)), (f"{base}.override.js", to_script(patch))):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    print(f"Saved rename patch: {base}.rename.json, {base}.override.js")
+
+def save_config_results(original_config: dict, results_map: Dict[str, str], output_path: str,
+                        source_path: str = None):
     """
     Appends results to proxy names and saves the new config file.
+    With source_path the rename is streamed from that file (rules are never
+    parsed); otherwise a copy of original_config is renamed and dumped.
     """
     print("\nUpdating config names...")
-    new_proxies = []
-    name_mapping = {} # Old -> New
-
-    proxies = original_config.get('proxies', [])
-    for proxy in proxies:
-        old_name = proxy['name']
-        if old_name in results_map:
-            new_name = f"{old_name} {results_map[old_name]}"
-            proxy['name'] = new_name
-            name_mapping[old_name] = new_name
-        new_proxies.append(proxy)
-    
-    original_config['proxies'] = new_proxies
-
-    # Update groups
-    if 'proxy-groups' in original_config:
-        for group in original_config['proxy-groups']:
-            if 'proxies' in group:
-                new_group_proxies = []
-                for p_name in group['proxies']:
-                    if p_name in name_mapping:
-                        new_group_proxies.append(name_mapping[p_name])
-                    else:
-                        new_group_proxies.append(p_name)
-                group['proxies'] = new_group_proxies
-    
+    patch = build_patch({old_name: f"{old_name} {result}" for old_name, result in results_map.items()})
+    if OUTPUT_PATCH:
+        save_patch_files(patch, output_path)
+
+    # Streaming from the output itself (output_suffix "") would stack results on every save
+    stream = (source_path and os.path.exists(source_path)
+              and os.path.abspath(source_path) != os.path.abspath(output_path))
+
+    # Write to a temp file first so readers (Clash, cron jobs) never see a half-written config
+    tmp_path = f"{output_path}.tmp"
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            yaml.dump(original_config, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if stream:
+                try:
+                    with open(source_path, 'r', encoding='utf-8') as src:
+                        apply_patch_stream(src, f, patch)
+                except YAMLError as e:
+                    print(f"Streaming rename failed ({e}), dumping parsed config instead")
+                    f.seek(0)
+                    f.truncate()
+                    stream = False
+            if not stream:
+                dump_yaml(rename_in_config(copy.deepcopy(original_config), patch['rename']), f)
+        os.replace(tmp_path, output_path)
         print(f"\nSuccess! Saved updated config to: {output_path}")
     except Exception as e:
         print(f"Error saving config: {e}")
 
-async def main():
+def load_target_config():
+    """Loads the Clash config to be tested. Returns None on error."""
     print(f"Loading config from: {CLASH_CONFIG_PATH}")
     if not os.path.exists(CLASH_CONFIG_PATH):
         print(f"Error: Config file not found at {CLASH_CONFIG_PATH}")
-        return
+        return None
 
     try:
         with open(CLASH_CONFIG_PATH, 'r', encoding='utf-8') as f:
-            config_data = yaml.full_load(f)
+            return load_yaml(f)
     except Exception as e:
         print(f"Error parsing YAML: {e}")
+        return None
+
+def get_output_path():
+    base = os.path.basename(CLASH_CONFIG_PATH)
+    filename, ext = os.path.splitext(base)
+    output_filename = f"{filename}{OUTPUT_SUFFIX}{ext}"
+    return os.path.join(os.getcwd(), output_filename)
+
+def should_skip(name: str) -> bool:
+    return any(kw in name for kw in SKIP_KEYWORDS)
+
+def is_success(res: Dict[str, Any]) -> bool:
+    return res.get('ip') not in (None, '❓', 'Error') and '❌' not in res.get('full_string', '')
+
+def print_unavailable(unavailable: Dict[str, str]):
+    if not unavailable:
+        return
+    print(f"\n{len(unavailable)} nodes can't be selected in the running core and will be skipped:")
+    for name, reason in unavailable.items():
+        print(f"  - {name}: {reason}")
+
+def print_traffic_summary(checker: IPChecker):
+    summary = checker.traffic.summary()
+    if not summary['nodes']:
+        return
+    print(f"\nTraffic: sent {format_bytes(summary['sent'])}, received {format_bytes(summary['received'])} "
+          f"over {summary['nodes']} nodes (avg {format_bytes(summary['per_node'])}/node)")
+    for source, usage in summary['sources'].items():
+        print(f"  {source}: {usage['requests']} requests, "
+              f"{format_bytes(usage['sent'])} sent, {format_bytes(usage['received'])} received")
+
+def print_memory_report(checker: IPChecker, **extra):
+    """tracemalloc top/growth and checker gauges, only with --memprof."""
+    if profiler.running:
+        print("\n" + format_report(profiler.report(), dict(rss=rss_bytes(), **checker.memory_gauges(deep=True), **extra)))
+
+async def start_checker(checker: IPChecker, controller: ClashController, fast: bool, browser: bool):
+    """
+    With warmup: fast sources, their hosts, the browser (if any pass needs it) and the
+    controller config, all at once. Without: only the browser, if the first pass needs it.
+    """
+    if WARMUP:
+        timings = await warm_up(checker, controller, browser=browser, sources=("ping0", "ippure") if fast else ())
+        print(f"[Warmup] {format_timings(timings)}")
+    elif not fast:
+        # Fast mode never touches Playwright, so don't pay for launching Chromium
+        await checker.start()
+
+def node_record(proxy: dict, status: str, res: Dict[str, Any] = None, started: float = None,
+                elapsed: float = None, traffic: Dict[str, Any] = None, **extra) -> Dict[str, Any]:
+    """One --output jsonl line: node identity, every result field and timings."""
+    record = {
+        "name": proxy['name'], "type": proxy.get('type'), "server": proxy.get('server'),
+        "port": proxy.get('port'), "fingerprint": node_fingerprint(proxy), "status": status,
+    }
+    if res:
+        record.update(res)
+    if started is not None:
+        record["timings"] = {"started_at": round(started, 3), "finished_at": round(started + elapsed, 3),
+                             "elapsed": round(elapsed, 3)}
+    if traffic:
+        record["traffic"] = traffic
+    record.update(extra)
+    return record
+
+def group_members(config_data: dict, group_names) -> set:
+    """Proxy names listed in the given proxy-groups."""
+    names = set()
+    for group in config_data.get('proxy-groups') or []:
+        if group.get('name') in group_names:
+            names.update(group.get('proxies') or [])
+    return names
+
+def get_primary_nodes(config_data: dict) -> set:
+    """Proxy names in the primary proxy-groups (configured, or the first group by default)."""
+    if PRIMARY_GROUPS:
+        return group_members(config_data, PRIMARY_GROUPS)
+    groups = (config_data.get('proxy-groups') or [])[:1]
+    return group_members(config_data, [g.get('name') for g in groups])
+
+async def browser_pass(controller: ClashController, checker: IPChecker, selector: str, local_proxy: str,
+                       config_data: dict, fast_results: Dict[str, Dict], results_map: Dict[str, str],
+                       history: HistoryStore = None, output: JsonlWriter = None):
+    """Tiered mode, second pass: browser checks for the nodes that matter, merged into their fast results."""
+    proxies_by_name = {p['name']: p for p in config_data.get('proxies', [])}
+    selected = select_for_browser(((name, name, res) for name, res in fast_results.items()),
+                                  top_k=TIER_TOP_K, group_nodes=group_members(config_data, TIER_GROUPS),
+                                  ambiguous=TIER_AMBIGUOUS, primary_source=SOURCE)
+    print(f"\n[Tiered] Browser pass for {len(selected)}/{len(fast_results)} nodes")
+
+    for pos, name in enumerate(selected):
+        print(f"[Browser {pos+1}/{len(selected)}] Progress...", end="")
+        started_at = time.time()
+        started = time.monotonic()
+        # Speed was measured in the fast pass and carries over in merge_results
+        res = await test_single_proxy(controller, checker, name, selector, local_proxy, fast_mode=False,
+                                      speedtest=None)
+        merged = merge_results(fast_results[name], res)
+        results_map[name] = merged['full_string']
+        if history:
+            history.record(proxies_by_name[name], merged)
+        if output:
+            output.write(node_record(proxies_by_name[name], "refined", merged, started_at,
+                                     time.monotonic() - started, checker.traffic.of(name)))
+
+async def main(output: JsonlWriter = None):
+    config_data = load_target_config()
+    if config_data is None:
         return
 
     proxies = config_data.get('proxies', [])
@@ -134,7 +340,7 @@ async def main():
 
     print(f"Found {len(proxies)} proxies to test.")
     
-    controller = ClashController(CLASH_API_URL, CLASH_API_SECRET)
+    controller = ClashController(CLASH_API_URL, CLASH_API_SECRET, drop_connections=DROP_CONNECTIONS)
     
     # FORCE GLOBAL MODE
     await controller.set_mode("global")
@@ -146,49 +352,207 @@ async def main():
     local_proxy_url = f"http://127.0.0.1:{mixed_port}"
     print(f"Using Local Proxy: {local_proxy_url}")
     
-    selector_to_use = SELECTOR_NAME
-    # (Optional) Verify selector existence logic could go here, omitting for brevity/fidelity to original flow for now
+    # Check every name against the running core once, instead of failing one switch at a time
+    names = [p['name'] for p in proxies if not should_skip(p['name'])]
+    selector_to_use, unavailable = await controller.prepare_selector(names, SELECTOR_NAME)
+    print_unavailable(unavailable)
 
-    checker = IPChecker(headless=HEADLESS)
-    await checker.start()
+    checker = IPChecker(headless=HEADLESS, local_db=LOCAL_DB, skip_datacenter=LOCAL_DB_SKIP_DATACENTER,
+                        fast_budget=NODE_TIMEOUT, browser_budget=BROWSER_NODE_TIMEOUT)
+    checker.configure_browser(pool_size=BROWSER_POOL_SIZE, max_checks=BROWSER_MAX_CHECKS,
+                              max_rss_mb=BROWSER_MAX_RSS_MB)
+    checker.follow(controller, reuse=REUSE_CONNECTIONS)
+    # Tiered scans start with a fast pass; the browser is launched lazily for the second one (or by the warm-up)
+    first_pass_fast = FAST_MODE or TIERED
+    await start_checker(checker, controller, fast=first_pass_fast, browser=not FAST_MODE or TIERED)
 
+    history = HistoryStore(HISTORY_DB) if HISTORY_DB else None
     results_map = {} # name -> result_string
+    fast_results = {} # name -> result dict of the first pass (tiered mode)
+    order = await egress_order(proxies) if EGRESS_ORDERING else range(len(proxies))
+    # Nodes go through one core one at a time: the limit only drops below 1 (pausing) on trouble
+    aimd = AIMDController(maximum=1) if ADAPTIVE_CONCURRENCY else None
 
     try:
-        for i, proxy in enumerate(proxies):
+        for pos, i in enumerate(order):
+            proxy = proxies[i]
             name = proxy['name']
             
             # Check Skip logic
-            should_skip = False
-            for kw in SKIP_KEYWORDS:
-                if kw in name:
-                    should_skip = True
-                    break
+            if should_skip(name):
+                print(f"\n[{pos+1}/{len(proxies)}] Skipping (Status Node): {name}")
+                if output:
+                    output.write(node_record(proxy, "skipped"))
+                continue
             
-            if should_skip:
-                print(f"\n[{i+1}/{len(proxies)}] Skipping (Status Node): {name}")
+            if name in unavailable:
+                if output:
+                    output.write(node_record(proxy, "unavailable", error=unavailable[name]))
                 continue
             
-            print(f"[{i+1}/{len(proxies)}] Progress...", end="") 
+            print(f"[{pos+1}/{len(proxies)}] Progress...", end="") 
 
             # CALL TEST FUNCTION
-            res = await test_single_proxy(controller, checker, name, selector_to_use, local_proxy_url)
+            cloudflare_before = checker.cloudflare_hits
+            started_at = time.time()
+            started = time.monotonic()
+            res = await test_single_proxy(controller, checker, name, selector_to_use, local_proxy_url,
+                                          fast_mode=first_pass_fast)
+            elapsed = time.monotonic() - started
             results_map[name] = res['full_string']
+            fast_results[name] = res
+            if history:
+                history.record(proxy, res)
+            if output:
+                output.write(node_record(proxy, "checked", res, started_at, elapsed, checker.traffic.of(name)))
+
+            if aimd:
+                adjustment = aimd.record(classify(res, cloudflare=checker.cloudflare_hits > cloudflare_before), elapsed)
+                if adjustment:
+                    print(f"  -> [AIMD] concurrency {adjustment['previous']} -> {adjustment['concurrency']}: {adjustment['reason']}")
+                pause = aimd.pause(elapsed)
+                if pause:
+                    await asyncio.sleep(pause)
+
+        if TIERED:
+            await browser_pass(controller, checker, selector_to_use, local_proxy_url, config_data,
+                               fast_results, results_map, history, output)
 
     except KeyboardInterrupt:
         print("\nProcess interrupted by user. Saving current progress...")
     finally:
         await checker.stop()
+        if history:
+            history.close()
+
+    print_traffic_summary(checker)
+    print_memory_report(checker, results=len(results_map))
 
     # SAVE RESULTS
-    base = os.path.basename(CLASH_CONFIG_PATH)
-    filename, ext = os.path.splitext(base)
-    output_filename = f"{filename}{OUTPUT_SUFFIX}{ext}"
-    output_path = os.path.join(os.getcwd(), output_filename)
-    
-    save_config_results(config_data, results_map, output_path)
+    save_config_results(config_data, results_map, get_output_path(), CLASH_CONFIG_PATH)
+
+async def daemon(output: JsonlWriter = None):
+    """
+    Long-running mode: keeps rechecking the stalest nodes within the
+    checks-per-minute budget and periodically rewrites the output file.
+    """
+    config_data = load_target_config()
+    if config_data is None:
+        return
+
+    proxies_by_name = {p['name']: p for p in config_data.get('proxies', []) if not should_skip(p['name'])}
+    names = list(proxies_by_name)
+    if not names:
+        print("No 'proxies' found in config.")
+        return
+
+    controller = ClashController(CLASH_API_URL, CLASH_API_SECRET, drop_connections=DROP_CONNECTIONS)
+    await controller.set_mode("global")
+    selector_to_use, unavailable = await controller.prepare_selector(names, SELECTOR_NAME)
+    print_unavailable(unavailable)
+    names = [n for n in names if n not in unavailable]
+    if not names:
+        return
+
+    primary = get_primary_nodes(config_data)
+    scheduler = NodeScheduler(names, important=primary, recheck_interval=DAEMON_RECHECK_INTERVAL)
+    print(f"[Daemon] {len(names)} nodes ({len(primary & set(names))} primary), "
+          f"budget {DAEMON_CHECKS_PER_MINUTE} checks/min, recheck every {DAEMON_RECHECK_INTERVAL}s")
+
+    mixed_port = await controller.get_running_port()
+    local_proxy_url = f"http://127.0.0.1:{mixed_port}"
+    print(f"Using Local Proxy: {local_proxy_url}")
+
+    checker = IPChecker(headless=HEADLESS, local_db=LOCAL_DB, skip_datacenter=LOCAL_DB_SKIP_DATACENTER,
+                        fast_budget=NODE_TIMEOUT, browser_budget=BROWSER_NODE_TIMEOUT)
+    checker.configure_browser(pool_size=BROWSER_POOL_SIZE, max_checks=BROWSER_MAX_CHECKS,
+                              max_rss_mb=BROWSER_MAX_RSS_MB)
+    checker.follow(controller, reuse=REUSE_CONNECTIONS)
+    await start_checker(checker, controller, fast=FAST_MODE, browser=not FAST_MODE)
+
+    history = HistoryStore(HISTORY_DB) if HISTORY_DB else None
+    output_path = get_output_path()
+    min_gap = 60 / max(DAEMON_CHECKS_PER_MINUTE, 0.1)
+    results_map = {}
+    dirty = False
+    last_write = time.monotonic()
+    last_cache_clear = time.monotonic()
+
+    def flush():
+        nonlocal dirty, last_write
+        save_config_results(config_data, results_map, output_path, CLASH_CONFIG_PATH)
+        dirty = False
+        last_write = time.monotonic()
+        print_memory_report(checker, results=len(results_map))
+
+    try:
+        while True:
+            # Cached IP results would otherwise be served forever
+            if time.monotonic() - last_cache_clear >= DAEMON_RECHECK_INTERVAL:
+                checker.clear_cache()
+                last_cache_clear = time.monotonic()
+
+            wait = scheduler.peek_due() - time.time()
+            if wait > 0:
+                if dirty:
+                    flush()
+                await asyncio.sleep(min(wait, DAEMON_WRITE_INTERVAL))
+                continue
+
+            name = scheduler.pop()
+            started_at = time.time()
+            started = time.monotonic()
+            res = await test_single_proxy(controller, checker, name, selector_to_use, local_proxy_url)
+            results_map[name] = res['full_string']
+            scheduler.record(name, is_success(res))
+            if history:
+                history.record(proxies_by_name[name], res)
+            if output:
+                output.write(node_record(proxies_by_name[name], "checked", res, started_at,
+                                         time.monotonic() - started, checker.traffic.of(name)))
+            dirty = True
+
+            if time.monotonic() - last_write >= DAEMON_WRITE_INTERVAL:
+                flush()
+
+            # Stay within the checks-per-minute budget
+            elapsed = time.monotonic() - started
+            if elapsed < min_gap:
+                await asyncio.sleep(min_gap - elapsed)
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("\n[Daemon] Stopping...")
+    finally:
+        await checker.stop()
+        if history:
+            history.close()
+        if dirty:
+            flush()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clash node IP checker")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and continuously recheck the stalest nodes")
+    parser.add_argument("--output", choices=["yaml", "jsonl"], default="yaml",
+                        help="jsonl: also stream one JSON record per node as soon as it is checked")
+    parser.add_argument("--output-file", default="-",
+                        help="where JSON lines go (appended), - for stdout")
+    parser.add_argument("--memprof", action="store_true",
+                        help="trace allocations; report top/growing modules at the end (daemon: on every write)")
+    args = parser.parse_args()
+    if args.memprof:
+        profiler.start()
+
+    output = JsonlWriter(args.output_file, stream=sys.stdout) if args.output == "jsonl" else None
+    # With records on stdout, the human-readable log moves to stderr
+    logs_to_stderr = output is not None and args.output_file == "-"
+
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-    asyncio.run(main())
+    try:
+        with contextlib.redirect_stdout(sys.stderr) if logs_to_stderr else contextlib.nullcontext():
+            asyncio.run(daemon(output) if args.daemon else main(output))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if output:
+            output.close()
@@ -1,66 +1,221 @@
 import aiohttp
+import time
 import urllib.parse
 
+from .timeouts import LatencyTracker
+
+UNIX_SCHEME = "unix://"
+
+class ProxyIndex:
+    """
+    Snapshot of the proxies and selector groups known to the running core,
+    built from one GET /proxies, so names that can't be switched to are
+    found before the scan instead of by a failing PUT per node.
+    """
+
+    def __init__(self, proxies):
+        self.names = set(proxies)
+        self.selectors = {
+            name: set(info.get('all') or [])
+            for name, info in proxies.items()
+            if info.get('type') == 'Selector'
+        }
+
+    def pick_selector(self, names, preferred=None):
+        """The preferred selector if it holds every name, else the one holding the most."""
+        wanted = set(names)
+        if preferred in self.selectors and wanted <= self.selectors[preferred]:
+            return preferred
+        best = None
+        best_cover = -1
+        for selector, members in self.selectors.items():
+            cover = len(wanted & members)
+            # GLOBAL wins ties, it is the group global mode actually routes through
+            if cover > best_cover or (cover == best_cover and selector == 'GLOBAL'):
+                best, best_cover = selector, cover
+        if preferred in self.selectors and best_cover <= len(wanted & self.selectors[preferred]):
+            return preferred
+        return best
+
+    def unavailable(self, names, selector):
+        """Maps each name that can't be selected in `selector` to the reason."""
+        members = self.selectors.get(selector, set())
+        problems = {}
+        for name in names:
+            if name not in self.names:
+                problems[name] = "not in running core"
+            elif name not in members:
+                problems[name] = f"not in {selector}"
+        return problems
+
+
 class ClashController:
-    def __init__(self, api_url, secret=""):
-        self.api_url = api_url.rstrip('/')
+    def __init__(self, api_url, secret="", drop_connections=False, config_ttl=30):
+        self.address = api_url
+        # "unix:///path/to/mihomo.sock": the controller on a Unix socket (mihomo external-controller-unix)
+        if api_url.startswith(UNIX_SCHEME):
+            self.socket_path = api_url[len(UNIX_SCHEME):]
+            self.api_url = "http://localhost"  # Not connected to, requests only need a host
+        else:
+            self.socket_path = None
+            self.api_url = api_url.rstrip('/')
+        # Also close the core's open connections on every switch (affects all clients of the core)
+        self.drop_connections = drop_connections
+        self._switch_listeners = []
+        # /configs (ports, mode) is read several times per scan; kept for config_ttl seconds,
+        # updated by set_mode and dropped on any controller error
+        self.config_ttl = config_ttl
+        self._configs = None
+        self._configs_at = 0.0
         self.headers = {
             "Authorization": f"Bearer {secret}",
             "Content-Type": "application/json"
         }
+        # A local controller answers in milliseconds; don't wait 5s on a dead one
+        self.latency = LatencyTracker(default=5, floor=1, ceiling=10)
+
+    def _session(self):
+        """Session for one API call, over the Unix socket if the address is one."""
+        connector = aiohttp.UnixConnector(path=self.socket_path) if self.socket_path else None
+        return aiohttp.ClientSession(connector=connector)
+
+    def _timeout(self, minimum=0):
+        return aiohttp.ClientTimeout(total=max(self.latency.timeout(), minimum))
+
+    def on_switch(self, listener):
+        """Registers listener(selector, proxy_name), called after every successful switch."""
+        if listener not in self._switch_listeners:  # Controllers are reused across scans
+            self._switch_listeners.append(listener)
+
+    def invalidate_configs(self):
+        """Forgets the cached /configs, e.g. after the core was reloaded."""
+        self._configs = None
+
+    async def close_connections(self):
+        """Closes every connection open in the core (DELETE /connections)."""
+        try:
+            async with self._session() as session:
+                async with session.delete(f"{self.api_url}/connections", headers=self.headers, timeout=self._timeout()) as resp:
+                    return resp.status == 204
+        except Exception as e:
+            print(f"API Error closing connections: {e}")
+            return False
 
     async def switch_proxy(self, selector, proxy_name):
         """Switches the selector to the specified proxy."""
         url = f"{self.api_url}/proxies/{urllib.parse.quote(selector)}"
         payload = {"name": proxy_name}
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.put(url, json=payload, headers=self.headers, timeout=5) as resp:
-                    if resp.status == 204:
-                        return True
-                    else:
+            started = time.monotonic()
+            async with self._session() as session:
+                async with session.put(url, json=payload, headers=self.headers, timeout=self._timeout()) as resp:
+                    if resp.status != 204:
                         print(f"Failed to switch to {proxy_name}. Status: {resp.status}")
                         return False
+                    self.latency.observe(time.monotonic() - started)
         except Exception as e:
             print(f"API Error switching to {proxy_name}: {e}")
+            self.invalidate_configs()  # The core may have restarted with other ports
             return False
 
+        # Tunnels opened before the switch still lead to the previous node
+        for listener in self._switch_listeners:
+            listener(selector, proxy_name)
+        if self.drop_connections:
+            await self.close_connections()
+        return True
+
     async def set_mode(self, mode):
         """Sets the Clash mode (global, rule, direct)."""
         url = f"{self.api_url}/configs"
         payload = {"mode": mode}
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.patch(url, json=payload, headers=self.headers, timeout=5) as resp:
+            async with self._session() as session:
+                async with session.patch(url, json=payload, headers=self.headers, timeout=self._timeout()) as resp:
                     if resp.status == 204:
                         print(f"Successfully set mode to: {mode}")
+                        if self._configs is not None:
+                            self._configs = dict(self._configs, mode=mode)
                         return True
                     else:
                         print(f"Failed to set mode logic. Status: {resp.status}")
+                        self.invalidate_configs()
                         return False
         except Exception as e:
             print(f"API Error setting mode: {e}")
+            self.invalidate_configs()
             return False
 
+    async def get_configs(self, fresh=False):
+        """The running config (/configs), cached for config_ttl seconds unless fresh; None on error."""
+        if not fresh and self._configs is not None and time.monotonic() - self._configs_at < self.config_ttl:
+            return self._configs
+        self.invalidate_configs()
+        try:
+            async with self._session() as session:
+                async with session.get(f"{self.api_url}/configs", headers=self.headers, timeout=self._timeout()) as resp:
+                    if resp.status == 200:
+                        self._configs = await resp.json()
+                        self._configs_at = time.monotonic()
+                        return self._configs
+        except Exception:
+            pass
+        return None
+
+    async def get_mode(self):
+        """Current Clash mode (rule, global, direct), or None if unknown."""
+        conf = await self.get_configs()
+        return conf.get('mode') if conf else None
+
     async def get_running_port(self):
         """Fetches the mixed-port or http-port from running instance."""
+        conf = await self.get_configs()
+        if conf:
+            if conf.get('mixed-port', 0) != 0: return conf['mixed-port']
+            if conf.get('port', 0) != 0: return conf['port']
+            if conf.get('socks-port', 0) != 0: return conf['socks-port']
+        return 7897 # Default fallback
+
+    async def get_selected(self, selector):
+        """Name of the proxy currently selected in the given group, or None."""
+        url = f"{self.api_url}/proxies/{urllib.parse.quote(selector)}"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.api_url}/configs", headers=self.headers) as resp:
+            async with self._session() as session:
+                async with session.get(url, headers=self.headers, timeout=self._timeout()) as resp:
                     if resp.status == 200:
-                        conf = await resp.json()
-                        if conf.get('mixed-port', 0) != 0: return conf['mixed-port']
-                        if conf.get('port', 0) != 0: return conf['port']
-                        if conf.get('socks-port', 0) != 0: return conf['socks-port']
+                        return (await resp.json()).get('now')
         except Exception:
             pass
-        return 7897 # Default fallback
+        return None
     
+    async def build_index(self):
+        """ProxyIndex of the running core, or None if /proxies can't be read."""
+        proxies = await self.get_proxies()
+        return ProxyIndex(proxies) if proxies else None
+
+    async def prepare_selector(self, names, preferred="GLOBAL"):
+        """
+        Reconciles the names to test with the running core in one request.
+        Returns (selector to use, {name: reason} for names that can't be switched to).
+        Without a readable /proxies, falls back to the preferred selector and no checks.
+        """
+        index = await self.build_index()
+        if index is None:
+            return preferred, {}
+
+        selector = index.pick_selector(names, preferred) or preferred
+        if selector != preferred:
+            print(f"Selector '{preferred}' can't reach all nodes, using '{selector}' instead")
+        # Global mode routes through GLOBAL, point it at the chosen group
+        if selector != "GLOBAL" and selector in index.selectors.get("GLOBAL", ()):
+            await self.switch_proxy("GLOBAL", selector)
+        return selector, index.unavailable(names, selector)
+
     async def get_proxies(self):
         """Fetches all proxies."""
         try:
-             async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.api_url}/proxies", headers=self.headers) as resp:
+             async with self._session() as session:
+                async with session.get(f"{self.api_url}/proxies", headers=self.headers, timeout=self._timeout(minimum=10)) as resp:
                     if resp.status == 200:
                         data = await resp.json()
                         return data.get('proxies', {})
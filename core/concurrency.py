@@ -0,0 +1,107 @@
+"""
+AIMD concurrency control for node checks.
+The limit is the average number of checks in flight. It grows additively
+while checks succeed with stable latency, and is cut multiplicatively when
+Cloudflare challenges, timeouts or Clash API errors pile up. Values below 1
+mean pausing between checks (a duty cycle), which is how a scan that can only
+run one node at a time through a single core still backs off.
+"""
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+OK = "ok"
+FAILED = "failed"  # Dead node: says nothing about the host's load, neutral
+CLOUDFLARE = "cloudflare"
+TIMEOUT = "timeout"
+API_ERROR = "api_error"
+PROBLEMS = (CLOUDFLARE, TIMEOUT, API_ERROR)
+
+REASONS = {
+    CLOUDFLARE: "Cloudflare 拦截增多",
+    TIMEOUT: "超时增多",
+    API_ERROR: "Clash API 错误增多",
+}
+
+
+def classify(result: Optional[Dict], switched: bool = True, cloudflare: bool = False) -> str:
+    """Outcome of one node check, from its result dict."""
+    if not switched or (result and result.get("source") == "switch_error"):
+        return API_ERROR
+    if cloudflare:
+        return CLOUDFLARE
+    if not result:
+        return FAILED
+    if result.get("source") == "timeout":
+        return TIMEOUT
+    if result.get("pure_score", "❓") not in ("❓", "?"):
+        return OK
+    return FAILED
+
+
+class AIMDController:
+    def __init__(self, initial: float = 1, minimum: float = 0.25, maximum: float = 1,
+                 increase: float = 0.25, decrease: float = 0.5, window: int = 10,
+                 max_problem_rate: float = 0.2, latency_factor: float = 2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = min(max(initial, minimum), maximum)
+        self.increase = increase
+        self.decrease = decrease
+        self.window = window
+        self.max_problem_rate = max_problem_rate
+        self.latency_factor = latency_factor
+
+        self._outcomes: List[Tuple[str, float]] = []
+        self.baseline: Optional[float] = None  # Lowest p50 latency seen on a healthy window
+        self.adjustments: List[Dict] = []
+
+    @property
+    def in_flight(self) -> int:
+        """Whole checks that may run at once."""
+        return max(int(self.limit), 1)
+
+    def pause(self, elapsed: float) -> float:
+        """Seconds to wait after a check that took elapsed, when the limit is below one."""
+        if self.limit >= 1:
+            return 0.0
+        return elapsed * (1 / self.limit - 1)
+
+    def record(self, outcome: str, seconds: float) -> Optional[Dict]:
+        """Adds one check outcome; every window outcomes, returns the adjustment made (if any)."""
+        self._outcomes.append((outcome, seconds))
+        if len(self._outcomes) < self.window:
+            return None
+        outcomes, self._outcomes = self._outcomes, []
+        return self._adjust(outcomes)
+
+    def _adjust(self, outcomes: List[Tuple[str, float]]) -> Optional[Dict]:
+        counts = Counter(outcome for outcome, _ in outcomes)
+        problems = sum(counts[p] for p in PROBLEMS)
+        latencies = sorted(seconds for outcome, seconds in outcomes if outcome == OK)
+        p50 = latencies[len(latencies) // 2] if latencies else None
+
+        old = self.limit
+        if problems / len(outcomes) > self.max_problem_rate:
+            worst = max(PROBLEMS, key=lambda p: counts[p])
+            reason = f"{REASONS[worst]} ({problems}/{len(outcomes)})"
+            self.limit = max(self.limit * self.decrease, self.minimum)
+        elif p50 is not None and self.baseline is not None and p50 > self.baseline * self.latency_factor:
+            reason = f"延迟升高 (p50 {p50:.1f}s > {self.baseline:.1f}s x{self.latency_factor:g})"
+            self.limit = max(self.limit * self.decrease, self.minimum)
+        else:
+            reason = "成功率与延迟正常"
+            if p50 is not None:
+                self.baseline = p50 if self.baseline is None else min(self.baseline, p50)
+            self.limit = min(self.limit + self.increase, self.maximum)
+
+        if self.limit == old:
+            return None
+        adjustment = {"concurrency": round(self.limit, 2), "previous": round(old, 2),
+                      "reason": reason, "at": time.time()}
+        self.adjustments.append(adjustment)
+        return adjustment
+
+    def stats(self) -> Dict:
+        return {"concurrency": round(self.limit, 2), "baseline_p50": self.baseline,
+                "adjustments": self.adjustments[-10:]}
@@ -0,0 +1,76 @@
+import inspect
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+async def _close(session):
+    # aiohttp and curl_cffi AsyncSession close with a coroutine, curl_cffi Session synchronously
+    try:
+        result = session.close()
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        print(f"[Connections] Error closing session: {e}")
+
+
+class ConnectionManager:
+    """
+    Pooled HTTP sessions for requests through the Clash mixed port.
+    A keep-alive tunnel through the mixed port stays bound to the node that
+    was selected when it was opened, so sessions are tagged with the selector
+    generation: every successful switch bumps it, and sessions of an older
+    generation are closed instead of reused. Connections are thus reused
+    within a node and never carried over to the next one.
+
+    Pooling only starts once the manager follows a ClashController; until
+    then get() returns None and every request opens its own session.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.generation = 0
+        self._pool: Dict[Tuple[str, Optional[str]], Tuple[int, Any]] = {}
+        self.counters = {"created": 0, "reused": 0, "invalidated": 0}
+
+    def follow(self, controller):
+        """Invalidates pooled sessions on every switch made through this controller."""
+        controller.on_switch(self.invalidate)
+        self.enabled = True
+        self.invalidate()  # Nothing is known about what was selected before
+
+    def invalidate(self, *_):
+        self.generation += 1
+
+    async def _sweep(self):
+        stale = [key for key, (generation, _) in self._pool.items() if generation != self.generation]
+        for key in stale:
+            _, session = self._pool.pop(key)
+            self.counters["invalidated"] += 1
+            await _close(session)
+
+    async def get(self, kind: str, proxy: Optional[str], factory: Callable[[Optional[str]], Any]):
+        """Session of this kind for the current node, created with factory(proxy) if needed; None if pooling is off."""
+        if not self.enabled:
+            return None
+        await self._sweep()
+        entry = self._pool.get((kind, proxy))
+        if entry is not None:
+            self.counters["reused"] += 1
+            return entry[1]
+        session = factory(proxy)
+        self._pool[(kind, proxy)] = (self.generation, session)
+        self.counters["created"] += 1
+        return session
+
+    async def discard(self, kind: str, proxy: Optional[str]):
+        """Drops a session that failed mid-request, its connection state is unknown."""
+        entry = self._pool.pop((kind, proxy), None)
+        if entry is not None:
+            await _close(entry[1])
+
+    async def close(self):
+        for _, session in self._pool.values():
+            await _close(session)
+        self._pool.clear()
+
+    def stats(self) -> Dict:
+        return dict(self.counters, generation=self.generation, open=len(self._pool))
@@ -0,0 +1,137 @@
+import itertools
+import secrets
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class WorkQueue:
+    """
+    Work units of a distributed scan, handed out to pull-based workers.
+    A unit is leased to one worker at a time; if the worker stops heart-beating
+    before the lease expires, the unit goes back to the queue. Nodes that fail
+    to get a result max_attempts times are given up on.
+    Lease expiry follows clock (time.monotonic unless a test injects one).
+    """
+
+    def __init__(self, nodes: List[Tuple[int, Dict]], unit_size: int = 10,
+                 lease_seconds: float = 120, max_attempts: int = 3, clock: Callable[[], float] = time.monotonic):
+        self.unit_size = max(int(unit_size), 1)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.clock = clock
+
+        self._ids = itertools.count()
+        self.pending: deque = deque()
+        self.leased: Dict[str, Dict] = {}  # unit_id -> unit
+        self.attempts: Dict[int, int] = {}  # node id -> failed attempts
+        self.completed = 0
+        self.given_up = 0
+        self.workers: Dict[str, Dict] = {}  # worker_id -> {"last_seen", "units", "nodes"}
+        self.limit: Optional[int] = None  # Max units leased at once (set by the AIMD controller)
+
+        for start in range(0, len(nodes), self.unit_size):
+            self._enqueue(nodes[start:start + self.unit_size])
+
+    def _enqueue(self, nodes: List[Tuple[int, Dict]]):
+        if nodes:
+            self.pending.append({"unit_id": f"u{next(self._ids)}", "nodes": list(nodes)})
+
+    def _seen(self, worker_id: str) -> Dict:
+        worker = self.workers.setdefault(worker_id, {"last_seen": 0.0, "units": 0, "nodes": 0})
+        worker["last_seen"] = time.time()
+        return worker
+
+    @property
+    def finished(self) -> bool:
+        return not self.pending and not self.leased
+
+    def lease(self, worker_id: str) -> Optional[Dict]:
+        """Next unit for this worker, or None if nothing is pending or the in-flight limit is reached."""
+        self._seen(worker_id)
+        if not self.pending or (self.limit is not None and len(self.leased) >= self.limit):
+            return None
+        unit = self.pending.popleft()
+        unit["worker_id"] = worker_id
+        unit["lease_id"] = secrets.token_hex(8)
+        unit["expires"] = self.clock() + self.lease_seconds
+        self.leased[unit["unit_id"]] = unit
+        return {
+            "unit_id": unit["unit_id"],
+            "lease_id": unit["lease_id"],
+            "lease_seconds": self.lease_seconds,
+            "nodes": [{"id": i, "proxy": proxy} for i, proxy in unit["nodes"]],
+        }
+
+    def _owned(self, worker_id: str, unit_id: str, lease_id: str) -> Optional[Dict]:
+        unit = self.leased.get(unit_id)
+        if unit is None or unit["lease_id"] != lease_id or unit["worker_id"] != worker_id:
+            return None  # expired and re-leased, or never ours
+        return unit
+
+    def heartbeat(self, worker_id: str, unit_id: str, lease_id: str) -> bool:
+        """Extends the lease; False means the worker lost it and should drop the unit."""
+        self._seen(worker_id)
+        unit = self._owned(worker_id, unit_id, lease_id)
+        if unit is None:
+            return False
+        unit["expires"] = self.clock() + self.lease_seconds
+        return True
+
+    def complete(self, worker_id: str, unit_id: str, lease_id: str,
+                 results: Dict[int, Dict]) -> Tuple[Optional[List[Tuple[int, Dict, Dict]]], List[Tuple[int, Dict]]]:
+        """
+        Accepts the results of a leased unit.
+        Returns ([(id, proxy, result)] to merge, [(id, proxy)] given up on);
+        the first item is None if the lease is no longer valid (results are dropped,
+        the unit already went to someone else). Nodes without a result are retried.
+        """
+        worker = self._seen(worker_id)
+        unit = self._owned(worker_id, unit_id, lease_id)
+        if unit is None:
+            return None, []
+        del self.leased[unit_id]
+
+        accepted, missing = [], []
+        for i, proxy in unit["nodes"]:
+            if i in results:
+                accepted.append((i, proxy, results[i]))
+            else:
+                missing.append((i, proxy))
+        worker["units"] += 1
+        worker["nodes"] += len(accepted)
+        self.completed += len(accepted)
+        return accepted, self._retry(missing)
+
+    def reap(self) -> List[Tuple[int, Dict]]:
+        """Requeues units whose lease expired (lost worker). Returns nodes given up on."""
+        now = self.clock()
+        given_up = []
+        for unit_id, unit in list(self.leased.items()):
+            if unit["expires"] <= now:
+                del self.leased[unit_id]
+                print(f"[Coordinator] Lease of {unit_id} by {unit['worker_id']} expired, requeueing")
+                given_up += self._retry(unit["nodes"])
+        return given_up
+
+    def _retry(self, nodes: List[Tuple[int, Dict]]) -> List[Tuple[int, Dict]]:
+        retry, given_up = [], []
+        for i, proxy in nodes:
+            self.attempts[i] = self.attempts.get(i, 0) + 1
+            (given_up if self.attempts[i] >= self.max_attempts else retry).append((i, proxy))
+        # Retried nodes go to the front: they are the oldest work
+        for start in reversed(range(0, len(retry), self.unit_size)):
+            self.pending.appendleft({"unit_id": f"u{next(self._ids)}", "nodes": retry[start:start + self.unit_size]})
+        self.given_up += len(given_up)
+        return given_up
+
+    def stats(self) -> Dict:
+        now = time.time()
+        return {
+            "pending_units": len(self.pending),
+            "leased_units": len(self.leased),
+            "limit": self.limit,
+            "completed": self.completed,
+            "given_up": self.given_up,
+            "workers": {wid: dict(w, idle=round(now - w["last_seen"], 1)) for wid, w in self.workers.items()},
+        }
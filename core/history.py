@@ -0,0 +1,242 @@
+import hashlib
+import ipaddress
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    fingerprint TEXT NOT NULL,
+    name TEXT,
+    server TEXT,
+    provider TEXT,
+    ip TEXT,
+    source TEXT,
+    pure_score REAL,
+    bot_score REAL,
+    shared_users TEXT,
+    shared_upper INTEGER,
+    ip_attr TEXT,
+    ip_src TEXT,
+    ok INTEGER NOT NULL,
+    handshake_ms REAL,
+    ttfb_ms REAL,
+    speed_mbps REAL
+);
+CREATE INDEX IF NOT EXISTS idx_checks_fp_ts ON checks (fingerprint, ts);
+CREATE INDEX IF NOT EXISTS idx_checks_ip_ts ON checks (ip, ts);
+CREATE INDEX IF NOT EXISTS idx_checks_provider_ts ON checks (provider, ts);
+CREATE INDEX IF NOT EXISTS idx_checks_ts ON checks (ts);
+"""
+
+COLUMNS = ("ts", "fingerprint", "name", "server", "provider", "ip", "source", "pure_score",
+           "bot_score", "shared_users", "shared_upper", "ip_attr", "ip_src", "ok",
+           "handshake_ms", "ttfb_ms", "speed_mbps")
+
+# Columns added after the first release, created on databases that predate them
+ADDED_COLUMNS = {"handshake_ms": "REAL", "ttfb_ms": "REAL", "speed_mbps": "REAL"}
+
+
+def node_fingerprint(proxy: Dict) -> str:
+    """Stable id of a node that survives renames (hash of everything but the name)."""
+    data = {k: v for k, v in proxy.items() if k != "name"}
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def provider_of(server: Optional[str]) -> str:
+    """Groups nodes by provider: the registered domain of the server, or the IP itself."""
+    if not server:
+        return "unknown"
+    try:
+        ipaddress.ip_address(server)
+        return server
+    except ValueError:
+        pass
+    labels = server.lower().rstrip(".").split(".")
+    return ".".join(labels[-2:])
+
+
+def _percent(value) -> Optional[float]:
+    try:
+        return float(str(value).replace("%", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def _shared_upper(value) -> Optional[int]:
+    nums = re.findall(r"\d+", str(value or ""))
+    return int(nums[-1]) if nums else None
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class HistoryStore:
+    """
+    Append-only time series of check results in SQLite.
+    record() only enqueues; a background thread inserts in batches so the
+    scan loop never waits on disk.
+    """
+
+    def __init__(self, path: str = "history.db", batch_size: int = 50, flush_interval: float = 2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._writer = None
+        self._lock = threading.Lock()
+        self._init_schema()
+
+    def _init_schema(self):
+        """WAL mode, migrations and schema, once per store (both persist in the file)."""
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(checks)")}
+            if existing:
+                for column, kind in ADDED_COLUMNS.items():
+                    if column not in existing:
+                        conn.execute(f"ALTER TABLE checks ADD COLUMN {column} {kind}")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        conn = self._connect()
+        sql = f"INSERT INTO checks ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        stop = False
+        while not stop:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(sql, batch)
+                except sqlite3.Error as e:
+                    print(f"[History] Insert failed: {e}")
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                self._queue.task_done()
+        conn.close()
+
+    def record(self, proxy: Dict, result: Dict, ts: Optional[float] = None):
+        """Queues one check result. Never blocks."""
+        ip = result.get("ip")
+        server = proxy.get("server")
+        speed = result.get("speed") or {}
+        row = (
+            ts if ts is not None else time.time(),
+            node_fingerprint(proxy),
+            proxy.get("name"),
+            server,
+            provider_of(server),
+            ip,
+            result.get("source"),
+            _percent(result.get("pure_score")),
+            _percent(result.get("bot_score")),
+            result.get("shared_users"),
+            _shared_upper(result.get("shared_users")),
+            result.get("ip_attr"),
+            result.get("ip_src"),
+            int(ip not in (None, "❓", "Error")),
+            speed.get("handshake_ms"),
+            speed.get("ttfb_ms"),
+            speed.get("mbps"),
+        )
+        self._ensure_writer()
+        self._queue.put(row)
+
+    @property
+    def pending(self) -> int:
+        """Results queued and not written yet."""
+        return self._queue.qsize()
+
+    def flush(self):
+        """Blocks until every queued result is written."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._writer = None
+
+    # --- Queries ---
+
+    def _query(self, sql: str, params=()) -> List[Dict]:
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def node_history(self, fingerprint: str, since: Optional[float] = None, limit: int = 500) -> List[Dict]:
+        """Results of one node, newest first."""
+        return self._query(
+            "SELECT * FROM checks WHERE fingerprint = ? AND ts >= ? ORDER BY ts DESC LIMIT ?",
+            (fingerprint, since or 0, limit),
+        )
+
+    def ip_history(self, ip: str, since: Optional[float] = None, limit: int = 500) -> List[Dict]:
+        """Results seen for one exit IP (across all nodes), newest first."""
+        return self._query(
+            "SELECT * FROM checks WHERE ip = ? AND ts >= ? ORDER BY ts DESC LIMIT ?",
+            (ip, since or 0, limit),
+        )
+
+    def provider_stats(self, since: Optional[float] = None) -> List[Dict]:
+        """Risk percentiles and success rate per provider."""
+        rows = self._query(
+            "SELECT provider, pure_score, ok FROM checks WHERE ts >= ?",
+            (since or 0,),
+        )
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row["provider"], []).append(row)
+
+        stats = []
+        for provider, items in grouped.items():
+            scores = [r["pure_score"] for r in items if r["pure_score"] is not None]
+            stats.append({
+                "provider": provider,
+                "checks": len(items),
+                "success_rate": round(sum(r["ok"] for r in items) / len(items), 3),
+                "p50_risk": _percentile(scores, 50),
+                "p90_risk": _percentile(scores, 90),
+            })
+        stats.sort(key=lambda s: s["checks"], reverse=True)
+        return stats
@@ -1,29 +1,131 @@
 import asyncio
 import re
+import time
 import aiohttp
 from typing import Optional, Dict
 
-# Strategies
-from .sources.ping0 import Ping0Source
-from .sources.ippure import IPPureSource
-from .sources.browser import BrowserSource
+from .timeouts import Deadline, TimeoutPolicy
+from .traffic import meter, header_bytes
+from .connections import ConnectionManager
+from .memprof import deep_size
+
+# Strategies are imported lazily: Playwright and curl_cffi are slow to import
+# and only one of them is needed for a given mode.
+
+TIMEOUT_RESULT = {
+    "pure_emoji": "❓", "shared_emoji": "❓", "ip_attr": "❓", "ip_src": "❓",
+    "pure_score": "❓", "shared_users": "N/A", "full_string": "【⏱️ Timeout】", 
+    "ip": "❓", "error": "Timeout", "source": "timeout"
+}
 
 class IPChecker:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, local_db=None, skip_datacenter=False,
+                 fast_budget=15, browser_budget=45):
         self._headless = headless
+
+        # Per-node time budgets; stage timeouts adapt to observed source latency
+        self.fast_budget = fast_budget
+        self.browser_budget = browser_budget
+        self.timeouts = TimeoutPolicy()
         
-        # Components
-        self.ping0 = Ping0Source()
-        self.ippure = IPPureSource()
-        self.browser_source = BrowserSource(headless=headless)
+        # Components (created on first use)
+        self._ping0 = None
+        self._ippure = None
+        self._browser_source = None
+        self.browser_options = {}  # pool_size / max_checks / max_rss_mb for BrowserSource
+        self.localdb = None
+        self.skip_datacenter = skip_datacenter
+        if local_db:
+            self.configure_local_db(local_db, skip_datacenter)
         
         self.cache = {} # Map IP -> Result Dict
+        self.traffic = meter  # bytes per node/source, reported in the scan summary
+        self.connections = ConnectionManager()  # pooled per node once following a controller
+
+    @property
+    def ping0(self):
+        if self._ping0 is None:
+            from .sources.ping0 import Ping0Source
+            self._ping0 = Ping0Source()
+        return self._ping0
+
+    @property
+    def ippure(self):
+        if self._ippure is None:
+            from .sources.ippure import IPPureSource
+            self._ippure = IPPureSource()
+        return self._ippure
+
+    @property
+    def browser_source(self):
+        if self._browser_source is None:
+            from .sources.browser import BrowserSource
+            self._browser_source = BrowserSource(headless=self._headless, **self.browser_options)
+        return self._browser_source
+
+    def configure_browser(self, **options):
+        """Updates browser pool limits; applied live if the browser source already exists."""
+        options = {k: v for k, v in options.items() if v is not None}
+        self.browser_options.update(options)
+        if self._browser_source is not None:
+            for key, value in options.items():
+                setattr(self._browser_source, key, value)
+
+    @property
+    def cloudflare_hits(self):
+        """Cloudflare challenges ping0 returned so far (0 if ping0 was never used)."""
+        return self._ping0.cloudflare_hits if self._ping0 is not None else 0
+
+    def browser_stats(self):
+        """Browser pool gauges, or None if browser mode was never used."""
+        if self._browser_source is None:
+            return None
+        return self._browser_source.stats()
+
+    def memory_gauges(self, deep=False):
+        """Sizes of the checker's in-memory structures; deep adds (slow) byte estimates."""
+        gauges = {
+            "ip_cache": len(self.cache),
+            "traffic_nodes": len(self.traffic.nodes),
+            "connections": self.connections.stats()["open"],
+            "latency_samples": sum(len(t.samples) for t in self.timeouts.trackers.values()),
+            "browser": self.browser_stats(),
+        }
+        if deep:
+            gauges["ip_cache_bytes"] = deep_size(self.cache)
+            gauges["traffic_bytes"] = deep_size(self.traffic.nodes)
+        return gauges
 
     def clear_cache(self):
         """Clears the IP result cache."""
         self.cache.clear()
         print("[IPChecker] Cache cleared.")
 
+    def configure_local_db(self, path, skip_datacenter=False):
+        """Enables offline lookups from a local range database (empty path disables)."""
+        self.skip_datacenter = skip_datacenter
+        if self.localdb and self.localdb.path == path:
+            return
+        if self.localdb:
+            self.localdb.close()
+            self.localdb = None
+        if path:
+            from .sources.localdb import LocalDBSource
+            try:
+                self.localdb = LocalDBSource(path)
+                self.localdb.open()
+            except (OSError, ValueError) as e:
+                print(f"[IPChecker] Local IP database unavailable: {e}")
+                self.localdb = None
+
+    def _enrich(self, result):
+        """Adds offline ASN/provider/country info to a remote result."""
+        if self.localdb and result.get("ip") not in (None, "❓"):
+            info = self.localdb.lookup(result["ip"])
+            if info:
+                result.update({k: info[k] for k in ("asn", "country", "provider")})
+        return result
+
     @property
     def headless(self):
         return self._headless
@@ -31,38 +133,73 @@ class IPChecker:
     @headless.setter
     def headless(self, value):
         self._headless = value
-        self.browser_source.headless = value
+        if self._browser_source is not None:
+            self._browser_source.headless = value
 
     async def start(self):
+        """Launches the browser. Only needed for browser mode."""
         await self.browser_source.start()
 
     async def stop(self):
-        await self.browser_source.stop()
+        await self.connections.close()
+        if self._browser_source is not None:
+            await self._browser_source.stop()
 
-    async def get_simple_ip(self, proxy=None):
+    def follow(self, controller, reuse=True):
+        """Reuses HTTP connections between switches of this controller (and only between them)."""
+        if reuse:
+            self.connections.follow(controller)
+        else:
+            self.connections.enabled = False
+
+    def node_deadline(self, fast_mode=True) -> Deadline:
+        """Time budget for checking one node, to be shared by all its stages."""
+        return Deadline(self.fast_budget if fast_mode else self.browser_budget)
+
+    async def get_simple_ip(self, proxy=None, deadline: Optional[Deadline] = None):
         """Fast IPv4 check for caching."""
         urls = ["http://api.ipify.org", "http://v4.ident.me"]
-        for url in urls:
-            try:
-                # User modified timeout to 3s
-                timeout = aiohttp.ClientTimeout(total=3)
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    async with session.get(url, proxy=proxy) as resp:
+        session = await self.connections.get("simple_ip", proxy, lambda _: aiohttp.ClientSession())
+        owned = session is None
+        if owned:
+            session = aiohttp.ClientSession()
+        try:
+            for url in urls:
+                if deadline and deadline.expired:
+                    break
+                limit = self.timeouts.timeout("simple_ip", deadline)
+                try:
+                    started = time.monotonic()
+                    async with session.get(url, proxy=proxy, timeout=aiohttp.ClientTimeout(total=limit)) as resp:
+                        body = await resp.read()
+                        self.traffic.record("simple_ip", header_bytes(resp.request_info.headers, "GET / HTTP/1.1"),
+                                            header_bytes(resp.headers, "HTTP/1.1 200 OK") + len(body))
                         if resp.status == 200:
-                            ip = (await resp.text()).strip()
+                            ip = body.decode(errors="ignore").strip()
                             if re.match(r"^\d{1,3}(\.\d{1,3}){3}$", ip):
+                                self.timeouts.observe("simple_ip", time.monotonic() - started)
                                 return ip
-            except Exception:
-                continue 
-        return None
+                except Exception:
+                    continue 
+            return None
+        finally:
+            if owned:
+                await session.close()
 
     # --- Main Interface ---
 
-    async def check_browser(self, url="https://ippure.com/", proxy=None, timeout=20000):
+    async def check_browser(self, url="https://ippure.com/", proxy=None, deadline: Optional[Deadline] = None):
         """Full browser check"""
-        
+        deadline = deadline or self.node_deadline(fast_mode=False)
+        try:
+            return await asyncio.wait_for(self._check_browser_impl(proxy, deadline), timeout=deadline.remaining())
+        except asyncio.TimeoutError:
+            print(f"     [check_browser] Total timeout exceeded")
+            return dict(TIMEOUT_RESULT, bot_emoji="❓", bot_score="❓")
+
+    async def _check_browser_impl(self, proxy, deadline: Deadline):
         # 1. Cleaner Fast IP & Cache Logic
-        current_ip = await self.get_simple_ip(proxy)
+        current_ip = await self.get_simple_ip(proxy, deadline)
         if current_ip and current_ip in self.cache:
             # Strict mode: Only accept cache if it has bot_score (from browser check)
             cached = self.cache[current_ip]
@@ -76,58 +213,80 @@ class IPChecker:
             print("     [Warning] Fast IP check failed. Scanning with browser...")
 
         # 2. Delegate to Browser Source
-        result = await self.browser_source.check(proxy)
+        if deadline.expired:
+            return dict(TIMEOUT_RESULT, bot_emoji="❓", bot_score="❓")
+        started = time.monotonic()
+        result = await self.browser_source.check(proxy, timeout=self.timeouts.timeout("browser", deadline))
+        if result["pure_score"] != "❓":
+            self.timeouts.observe("browser", time.monotonic() - started)
         
         # Inject IP if browser failed to find it but simple check passed
         if result["ip"] == "❓" and current_ip:
             result["ip"] = current_ip
 
         # Cache Update
+        self._enrich(result)
         if result["ip"] != "❓" and result["pure_score"] != "❓":
             self.cache[result["ip"]] = result.copy()
             
         return result
 
-    async def check_fast(self, proxy=None, source="ping0", fallback=True):
+    async def check_fast(self, proxy=None, source="ping0", fallback=True, deadline: Optional[Deadline] = None):
         """
         Fast mode: Prioritizes source (ping0/ippure), falls back if enabled.
         """
+        deadline = deadline or self.node_deadline(fast_mode=True)
         try:
-            # Hard timeout of 20 seconds for entire check
+            # Hard limit: whatever is left of the node budget
             return await asyncio.wait_for(
-                self._check_fast_impl(proxy, source, fallback),
-                timeout=15
+                self._check_fast_impl(proxy, source, fallback, deadline),
+                timeout=deadline.remaining()
             )
         except asyncio.TimeoutError:
             print(f"     [check_fast] Total timeout exceeded")
-            return {
-                "pure_emoji": "❓", "shared_emoji": "❓", "ip_attr": "❓", "ip_src": "❓",
-                "pure_score": "❓", "shared_users": "N/A", "full_string": "【⏱️ Timeout】", 
-                "ip": "❓", "error": "Timeout", "source": "timeout"
-            }
+            return dict(TIMEOUT_RESULT)
     
-    async def _check_fast_impl(self, proxy=None, source="ping0", fallback=True):
+    async def _check_fast_impl(self, proxy=None, source="ping0", fallback=True, deadline: Optional[Deadline] = None):
         """Internal implementation of check_fast with prioritization"""
         # 0. Check Cache First (Optimization)
         try:
-            fast_ip = await self.get_simple_ip(proxy)
+            fast_ip = await self.get_simple_ip(proxy, deadline)
             if fast_ip and fast_ip in self.cache:
                 # print(f"     [Cache Hit] {fast_ip}")
                 return self.cache[fast_ip]
         except Exception:
-            pass # Ignore fast check errors and proceed to normal check
+            fast_ip = None # Ignore fast check errors and proceed to normal check
+
+        # Obvious datacenter ranges don't need a remote lookup
+        if fast_ip and self.localdb and self.skip_datacenter:
+            local = await self.localdb.check(ip=fast_ip)
+            if local and local["ip_attr"] == "机房":
+                self.cache[fast_ip] = local.copy()
+                return local
 
         # Helper wrappers to update cache
         async def try_ping0():
-            res = await self.ping0.check(proxy)
+            if deadline and deadline.expired:
+                return None
+            started = time.monotonic()
+            session = await self.connections.get("ping0", proxy, self.ping0.new_session)
+            res = await self.ping0.check(proxy, timeout=self.timeouts.timeout("ping0", deadline), session=session)
             if res and res.get("ip") and res["ip"] != "❓":
+                self.timeouts.observe("ping0", time.monotonic() - started)
+                self._enrich(res)
                 self.cache[res["ip"]] = res.copy()
                 return res
             return None
 
         async def try_ippure():
-            res = await self.ippure.check(proxy)
+            if deadline and deadline.expired:
+                return None
+            started = time.monotonic()
+            session = await self.connections.get("ippure", proxy, self.ippure.new_session)
+            res = await self.ippure.check(proxy, timeout=self.timeouts.timeout("ippure", deadline), session=session)
             if res and res.get("ip") and res["ip"] != "❓":
+                self.timeouts.observe("ippure", time.monotonic() - started)
+                self._enrich(res)
                 self.cache[res["ip"]] = res.copy()
                 return res
             return None
@@ -0,0 +1,165 @@
+"""
+Opt-in memory instrumentation for long-running instances.
+tracemalloc snapshots grouped by module (top allocators, growth since a
+baseline) plus helpers for the size gauges of the main in-memory structures
+(AppState.memory_gauges, IPChecker.memory_gauges), so growth can be
+attributed without attaching a debugger.
+"""
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+from .traffic import format_bytes
+
+# Frames outside any module (tracemalloc itself, import machinery)
+IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>",
+                 "<unknown>")
+
+
+def rss_bytes() -> Optional[int]:
+    """Current RSS of this process (Linux), else the peak RSS from getrusage, None if neither works."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def deep_size(obj, limit: int = 1_000_000) -> int:
+    """
+    Approximate size in bytes of obj and everything reachable through
+    containers (dict, list, tuple, set) and instance __dict__s. Shared objects
+    count once; the walk stops after limit objects, so the result is a floor.
+    """
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack and len(seen) < limit:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item, 0)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__") and not isinstance(item, type):
+            stack.append(vars(item))
+    return size
+
+
+def _module_of(filename: str, roots: List[str]) -> str:
+    """Dotted module name of a source file, relative to the longest matching sys.path entry."""
+    for root in roots:
+        if filename.startswith(root + os.sep):
+            relative = os.path.splitext(filename[len(root) + 1:])[0]
+            module = relative.replace(os.sep, ".")
+            return module[:-len(".__init__")] if module.endswith(".__init__") else module
+    return filename
+
+
+class MemoryProfiler:
+    """
+    tracemalloc wrapper. start() records a baseline snapshot; report() lists
+    the modules holding the most traced memory and the ones that grew most
+    since the baseline. Tracing costs CPU and memory, so it is off until started.
+    """
+
+    def __init__(self, frames: int = 1, top: int = 20):
+        self.frames = frames
+        self.top = top
+        self.baseline: Optional[Dict[str, Tuple[int, int]]] = None
+        self.baseline_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: Optional[int] = None):
+        if not self.running:
+            tracemalloc.start(frames or self.frames)
+        self.reset_baseline()
+
+    def stop(self):
+        if self.running:
+            tracemalloc.stop()
+        self.baseline = self.baseline_at = None
+
+    def reset_baseline(self):
+        self.baseline = self._by_module()
+        self.baseline_at = time.time()
+
+    def _by_module(self) -> Dict[str, Tuple[int, int]]:
+        """module -> (bytes, blocks) of the current snapshot."""
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, pattern) for pattern in IGNORED_FILES])
+        roots = sorted((os.path.abspath(p) for p in sys.path if p), key=len, reverse=True)
+        modules: Dict[str, Tuple[int, int]] = {}
+        for stat in snapshot.statistics("filename"):
+            module = _module_of(stat.traceback[0].filename, roots)
+            size, count = modules.get(module, (0, 0))
+            modules[module] = (size + stat.size, count + stat.count)
+        return modules
+
+    def report(self, top: Optional[int] = None) -> Dict:
+        """Top modules by traced size and by growth since the baseline; {"tracing": False} if not started."""
+        if not self.running:
+            return {"tracing": False}
+        top = top or self.top
+        current, peak = tracemalloc.get_traced_memory()
+        modules = self._by_module()
+        largest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        baseline = self.baseline or {}
+        growth = []
+        for module in set(modules) | set(baseline):
+            size, count = modules.get(module, (0, 0))
+            before_size, before_count = baseline.get(module, (0, 0))
+            if size != before_size:
+                growth.append({"module": module, "size_diff": size - before_size, "count_diff": count - before_count,
+                               "size": size})
+        growth.sort(key=lambda item: item["size_diff"], reverse=True)
+        return {
+            "tracing": True,
+            "traced": {"current": current, "peak": peak},
+            "baseline_age": round(time.time() - self.baseline_at, 1) if self.baseline_at else None,
+            "top": [{"module": module, "size": size, "count": count} for module, (size, count) in largest],
+            "growth": growth[:top],
+        }
+
+
+def format_report(report: Dict, gauges: Optional[Dict] = None) -> str:
+    """Plain-text rendering of report() (and gauges) for the CLI."""
+    lines = []
+    if gauges:
+        rss = gauges.get("rss")
+        lines.append(f"[Memory] RSS {format_bytes(rss) if rss else 'n/a'}")
+        for key, value in gauges.items():
+            if key != "rss":
+                lines.append(f"  {key}: {value}")
+    if not report.get("tracing"):
+        return "\n".join(lines)
+    lines.append(f"[Memory] Traced {format_bytes(report['traced']['current'])} "
+                 f"(peak {format_bytes(report['traced']['peak'])}), top modules:")
+    for item in report["top"]:
+        lines.append(f"  {format_bytes(item['size']):>10}  {item['count']:>8} blocks  {item['module']}")
+    if report["growth"]:
+        lines.append(f"[Memory] Growth over the last {report['baseline_age']}s:")
+        for item in report["growth"]:
+            if item["size_diff"] > 0:
+                lines.append(f"  {'+' + format_bytes(item['size_diff']):>10}  {item['count_diff']:>+8} blocks  {item['module']}")
+    return "\n".join(lines)
+
+
+profiler = MemoryProfiler()
@@ -0,0 +1,78 @@
+"""
+Scan ordering by likely egress.
+Nodes whose servers resolve to the same address (or share a provider domain)
+usually land on the same exit IP, so checking them back-to-back turns most
+of them into IPChecker cache hits after the cheap simple-IP lookup.
+"""
+import asyncio
+import ipaddress
+import socket
+import time
+from typing import Dict, List, Optional
+
+from .history import provider_of
+
+DNS_TTL = 300
+_dns_cache: Dict[str, tuple] = {}  # host -> (expires, address or None)
+
+
+async def resolve_host(host: str, timeout: float = 2.0) -> Optional[str]:
+    """First address of host, cached for DNS_TTL seconds (failures too)."""
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+
+    cached = _dns_cache.get(host)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    address = None
+    try:
+        loop = asyncio.get_running_loop()
+        infos = await asyncio.wait_for(loop.getaddrinfo(host, None, type=socket.SOCK_STREAM), timeout)
+        if infos:
+            address = infos[0][4][0]
+    except (OSError, asyncio.TimeoutError, UnicodeError):
+        pass
+    _dns_cache[host] = (time.monotonic() + DNS_TTL, address)
+    return address
+
+
+async def resolve_servers(proxies: List[Dict], concurrency: int = 32) -> Dict[str, Optional[str]]:
+    """Resolves every distinct server of the proxies concurrently."""
+    hosts = {str(p.get("server")) for p in proxies if p.get("server")}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def resolve(host):
+        async with sem:
+            return host, await resolve_host(host)
+
+    return dict(await asyncio.gather(*(resolve(h) for h in hosts)))
+
+
+def cluster_key(proxy: Dict, resolved: Dict[str, Optional[str]]) -> str:
+    server = str(proxy.get("server") or "")
+    address = resolved.get(server)
+    if address:
+        return f"addr:{address}"
+    return f"provider:{provider_of(server)}"
+
+
+async def egress_order(proxies: List[Dict]) -> List[int]:
+    """
+    Indices of proxies grouped by resolved address, and address clusters of
+    the same provider kept next to each other. Otherwise the YAML order is kept.
+    """
+    resolved = await resolve_servers(proxies)
+    clusters: Dict[str, List[int]] = {}
+    provider_rank: Dict[str, int] = {}
+    for i, proxy in enumerate(proxies):
+        clusters.setdefault(cluster_key(proxy, resolved), []).append(i)
+        provider_rank.setdefault(provider_of(str(proxy.get("server") or "")), len(provider_rank))
+
+    def rank(members):
+        return provider_rank[provider_of(str(proxies[members[0]].get("server") or ""))]
+
+    return [i for members in sorted(clusters.values(), key=rank) for i in members]
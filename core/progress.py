@@ -0,0 +1,59 @@
+"""
+Coalesced progress stream for the web UI.
+Instead of one SSE frame per node, progress events are folded into a single
+"batch" frame per interval: the latest progress/total and, per node, only the
+fields that changed since this stream last sent that node (None for a
+field that went away).
+"""
+from typing import Dict, List
+
+# Server-side only, the table never shows it
+OMITTED_FIELDS = ("proxy_config",)
+
+
+class ProgressCoalescer:
+    def __init__(self):
+        self._sent: Dict[int, Dict] = {}  # node id -> node as last sent on this stream
+        self._pending: Dict[int, Dict] = {}  # node id -> latest node not sent yet
+        self._progress = None
+
+    def _diff(self, node: Dict) -> Dict:
+        previous = self._sent.get(node["id"], {})
+        diff = {key: value for key, value in node.items()
+                if key not in OMITTED_FIELDS and previous.get(key) != value}
+        # Fields the new version no longer has (e.g. "error" once a retry succeeded)
+        diff.update({key: None for key in previous if key not in node and key not in OMITTED_FIELDS})
+        diff["id"] = node["id"]
+        self._sent[node["id"]] = node
+        return diff
+
+    def _flush(self) -> List[Dict]:
+        if self._progress is None and not self._pending:
+            return []
+        batch = dict(self._progress or {}, type="batch",
+                     nodes=[self._diff(node) for node in self._pending.values()])
+        self._pending.clear()
+        self._progress = None
+        return [batch]
+
+    def feed(self, events: List[Dict]) -> List[Dict]:
+        """Frames to send for these events; progress is held back until flush, other events keep their order."""
+        frames = []
+        for event in events:
+            if event.get("type") != "progress":
+                frames += self._flush()
+                frames.append(event)
+                if event.get("type") == "update" and event.get("node"):
+                    # The client replaced the whole node: later diffs start from this version
+                    self._sent[event["node"]["id"]] = event["node"]
+                continue
+            self._progress = {"progress": event["progress"], "total": event["total"]}
+            node = event.get("node")
+            if node:
+                self._pending[node["id"]] = node
+                self._progress["current"] = node.get("original_name", "")
+        return frames
+
+    def flush(self) -> List[Dict]:
+        """Batch frame of everything held back so far (empty if nothing)."""
+        return self._flush()
@@ -0,0 +1,79 @@
+import heapq
+import itertools
+import time
+from typing import Dict, Iterable, Optional, Set
+
+
+class NodeScheduler:
+    """
+    Priority queue of nodes for daemon mode.
+    The node whose result is the stalest (weighted by importance and failure
+    history) is always popped first.
+    """
+
+    def __init__(self, names: Iterable[str], important: Optional[Set[str]] = None,
+                 recheck_interval: float = 3600, max_backoff: int = 4):
+        self.recheck_interval = recheck_interval
+        self.max_backoff = max_backoff
+        self.important = set(important or ())
+
+        self.last_checked: Dict[str, float] = {}
+        self.failures: Dict[str, int] = {}
+        self._heap = []
+        self._entries = {}  # name -> live heap entry (older entries are stale)
+        self._counter = itertools.count()
+
+        for name in names:
+            self._push(name)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def due_at(self, name: str) -> float:
+        """Timestamp at which the node should be rechecked."""
+        last = self.last_checked.get(name)
+        if last is None:
+            return 0.0  # Never checked: as stale as it gets
+
+        interval = self.recheck_interval
+        if name in self.important:
+            interval /= 2
+        # Nodes that keep failing are most likely dead, back them off exponentially
+        # so they don't eat the check budget of healthy nodes.
+        fails = min(self.failures.get(name, 0), self.max_backoff)
+        interval *= 2 ** fails
+        return last + interval
+
+    def _push(self, name: str):
+        # Important nodes win ties (e.g. on the first round, when nothing is checked yet)
+        entry = [self.due_at(name), 0 if name in self.important else 1, next(self._counter), name]
+        self._entries[name] = entry
+        heapq.heappush(self._heap, entry)
+
+    def pop(self) -> Optional[str]:
+        """Removes and returns the stalest node, or None if the queue is empty."""
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            name = entry[-1]
+            if self._entries.get(name) is entry:
+                del self._entries[name]
+                return name
+        return None
+
+    def peek_due(self) -> Optional[float]:
+        """Due time of the stalest node without removing it."""
+        while self._heap:
+            entry = self._heap[0]
+            if self._entries.get(entry[-1]) is entry:
+                return entry[0]
+            heapq.heappop(self._heap)
+        return None
+
+    def record(self, name: str, success: bool, now: Optional[float] = None):
+        """Stores the outcome of a check and puts the node back into the queue."""
+        self.last_checked[name] = now if now is not None else time.time()
+        if success:
+            self.failures.pop(name, None)
+        else:
+            self.failures[name] = self.failures.get(name, 0) + 1
+        self._push(name)
@@ -1,37 +1,193 @@
 from .base import BaseCheckSource
-from playwright.async_api import async_playwright
-import re
+from .parsers import parse_ippure_text
+from ..traffic import meter
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 import asyncio
-from typing import Dict, Optional
+import os
+import time
+from typing import Dict, List, Optional
+
+# Resource types never needed to read the scores
+BLOCKED_RESOURCES = {"image", "media", "font", "manifest", "texttrack"}
+
+# Checks a browser serves before it can be recycled for RSS, so a pool that
+# starts out over the limit isn't relaunched on every check
+RSS_MIN_CHECKS = 20
+
+try:
+    import psutil
+except ImportError:  # RSS based recycling is simply disabled
+    psutil = None
+
+
+class _BrowserSlot:
+    """One Chromium process of the pool and its usage counters."""
+
+    def __init__(self, browser, headless):
+        self.browser = browser
+        self.headless = headless
+        self.checks = 0
+        self.in_flight = 0
+        self.retiring = False
+        self.connected = True
+        browser.on("disconnected", self._on_disconnected)
+
+    def _on_disconnected(self, *_):
+        self.connected = False
+
 
 class BrowserSource(BaseCheckSource):
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, pool_size=1, max_checks=200, max_rss_mb=1500):
         self.headless = headless
+        # Lifecycle limits, read on every check so they can be changed at runtime
+        self.pool_size = pool_size
+        self.max_checks = max_checks    # Recycle a browser after this many checks (0 = never)
+        self.max_rss_mb = max_rss_mb    # Recycle when browser processes exceed this RSS (0 = never)
+
         self.playwright = None
-        self.browser = None
+        self.slots: List[_BrowserSlot] = []
+        self._next = 0
+        self._lock = asyncio.Lock()
+        self.checks = 0
+        self.recycles = 0
+        self.relaunches = 0
+        self.rss_baseline: Optional[float] = None  # RSS right after the last launch
+
+    @property
+    def browser(self):
+        live = [slot for slot in self.slots if not slot.retiring]
+        return live[0].browser if live else None
+
+    async def _launch(self) -> _BrowserSlot:
+        browser = await self.playwright.chromium.launch(
+            headless=self.headless,
+            args=["--no-sandbox", "--disable-setuid-sandbox"]
+        )
+        slot = _BrowserSlot(browser, self.headless)
+        self.slots.append(slot)
+        self.rss_baseline = self.rss_mb() if self.max_rss_mb else None
+        return slot
 
     async def start(self):
-        if not self.playwright:
-            self.playwright = await async_playwright().start()
-            self.browser = await self.playwright.chromium.launch(
-                headless=self.headless,
-                args=["--no-sandbox", "--disable-setuid-sandbox"]
-            )
+        # Locked like _acquire: a warm-up start may still be running when the first check comes in
+        async with self._lock:
+            if not self.playwright:
+                self.playwright = await async_playwright().start()
+            while len([s for s in self.slots if not s.retiring]) < max(self.pool_size, 1):
+                await self._launch()
 
     async def stop(self):
-        if self.browser:
-            await self.browser.close()
-            self.browser = None
+        for slot in self.slots:
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
+        self.slots = []
         if self.playwright:
             await self.playwright.stop()
             self.playwright = None
 
+    def rss_mb(self) -> Optional[float]:
+        """RSS of the Playwright driver and Chromium processes (needs psutil)."""
+        if psutil is None:
+            return None
+        total = 0
+        try:
+            for child in psutil.Process(os.getpid()).children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    continue
+        except psutil.Error:
+            return None
+        return total / (1024 * 1024)
 
+    async def _retire(self, slot: _BrowserSlot):
+        slot.retiring = True
+        if slot.in_flight == 0:
+            self.slots.remove(slot)
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
 
-    async def check(self, proxy: Optional[str] = None) -> Dict:
-        if not self.browser:
-            await self.start()
-            
+    async def _acquire(self) -> _BrowserSlot:
+        async with self._lock:
+            if not self.playwright:
+                self.playwright = await async_playwright().start()
+
+            rss = self.rss_mb() if self.max_rss_mb else None
+            # Only growth counts: a fresh pool may already be over the limit
+            over_rss = rss is not None and rss > max(self.max_rss_mb, self.rss_baseline or 0)
+
+            for slot in [s for s in self.slots if not s.retiring]:
+                if not slot.connected:
+                    print("     [Browser] Chromium disconnected, relaunching...")
+                    self.relaunches += 1
+                    await self._retire(slot)
+                elif slot.headless != self.headless or (self.max_checks and slot.checks >= self.max_checks):
+                    self.recycles += 1
+                    await self._retire(slot)
+
+            live = [s for s in self.slots if not s.retiring]
+            if over_rss and live:
+                # Replace the most used browser; new ones start small
+                slot = max(live, key=lambda s: s.checks)
+                if slot.checks >= RSS_MIN_CHECKS:
+                    print(f"     [Browser] RSS {rss:.0f}MB over {self.max_rss_mb}MB "
+                          f"(after launch: {self.rss_baseline or 0:.0f}MB), recycling a browser")
+                    self.recycles += 1
+                    await self._retire(slot)
+
+            while len([s for s in self.slots if not s.retiring]) < max(self.pool_size, 1):
+                await self._launch()
+
+            live = [s for s in self.slots if not s.retiring]
+            slot = live[self._next % len(live)]
+            self._next += 1
+            slot.checks += 1
+            slot.in_flight += 1
+            self.checks += 1
+            return slot
+
+    async def _release(self, slot: _BrowserSlot):
+        slot.in_flight -= 1
+        if slot.retiring and slot.in_flight == 0 and slot in self.slots:
+            await self._retire(slot)
+
+    def stats(self) -> Dict:
+        return {
+            "browsers": len([s for s in self.slots if not s.retiring]),
+            "retiring": len([s for s in self.slots if s.retiring]),
+            "rss_mb": self.rss_mb(),
+            "rss_baseline_mb": self.rss_baseline,
+            "checks": self.checks,
+            "recycles": self.recycles,
+            "relaunches": self.relaunches,
+        }
+
+    async def check(self, proxy: Optional[str] = None, timeout: float = 20) -> Dict:
+        slot = await self._acquire()
+        try:
+            return await self._check_with(slot.browser, proxy, timeout)
+        finally:
+            await self._release(slot)
+
+    async def _record_traffic(self, requests):
+        """Adds up the wire sizes of every request the page completed."""
+        try:
+            sizes = await asyncio.wait_for(
+                asyncio.gather(*(r.sizes() for r in requests), return_exceptions=True), timeout=2)
+        except asyncio.TimeoutError:
+            return
+        sent = received = 0
+        for size in sizes:
+            if isinstance(size, dict):
+                sent += size.get("requestHeadersSize", 0) + size.get("requestBodySize", 0)
+                received += size.get("responseHeadersSize", 0) + size.get("responseBodySize", 0)
+        meter.record("browser", sent, received)
+
+    async def _check_with(self, browser, proxy: Optional[str], timeout: float) -> Dict:
         context_args = {
              "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         }
@@ -40,61 +196,41 @@ class BrowserSource(BaseCheckSource):
             # Incoming proxy arg is likely "http://127.0.0.1:7890"
             context_args["proxy"] = {"server": proxy}
             
-        context = await self.browser.new_context(**context_args)
+        context = await browser.new_context(**context_args)
         
         # Resource blocking
         await context.route("**/*", lambda route: route.abort() 
-            if route.request.resource_type in ["image", "media", "font"] 
+            if route.request.resource_type in BLOCKED_RESOURCES
             else route.continue_())
 
         page = await context.new_page()
+        finished = []
+        page.on("requestfinished", finished.append)
         
         result = {
             "pure_emoji": "❓", "bot_emoji": "❓", "ip_attr": "❓", "ip_src": "❓",
             "pure_score": "❓", "bot_score": "❓", "full_string": "", "ip": "❓", "error": None, "source": "ippure"
         }
 
+        cancelled = False
         try:
-            await page.goto("https://ippure.com/", wait_until="domcontentloaded", timeout=20000)
+            started = time.monotonic()
+            await page.goto("https://ippure.com/", wait_until="domcontentloaded", timeout=timeout * 1000)
+            # Whatever is left of the budget, at most the old 10s, for the scores to render
+            remaining = max(timeout - (time.monotonic() - started), 0)
             try:
-                await page.wait_for_selector("text=人机流量比", timeout=10000)
-            except: pass 
+                await page.wait_for_selector("text=人机流量比", timeout=min(max(remaining, 0.1), 10) * 1000)
+            except PlaywrightTimeoutError:
+                pass  # Parse whatever rendered
             
             await page.wait_for_timeout(2000)
             text = await page.inner_text("body")
 
-            # 1. IPPure Score
-            score_match = re.search(r"IPPure系数.*?(\d+%)", text, re.DOTALL)
-            if score_match:
-                result["pure_score"] = score_match.group(1)
+            result.update(parse_ippure_text(text))
+            if result["pure_score"] != "❓":
                 result["pure_emoji"] = self.get_emoji(result["pure_score"])
-
-            # 2. Bot Ratio
-            bot_match = re.search(r"bot\s*(\d+(\.\d+)?)%", text, re.IGNORECASE)
-            if bot_match:
-                val = bot_match.group(0).replace('bot', '').strip()
-                if not val.endswith('%'): val += "%"
-                result["bot_score"] = val
-                result["bot_emoji"] = self.get_emoji(val)
-
-            # 3. Attributes
-            attr_match = re.search(r"IP属性\s*\n\s*(.+)", text)
-            if not attr_match: attr_match = re.search(r"IP属性\s*(.+)", text)
-            if attr_match:
-                raw = attr_match.group(1).strip()
-                result["ip_attr"] = re.sub(r"IP$", "", raw)
-
-            # 4. Source
-            src_match = re.search(r"IP来源\s*\n\s*(.+)", text)
-            if not src_match: src_match = re.search(r"IP来源\s*(.+)", text)
-            if src_match:
-                raw = src_match.group(1).strip()
-                result["ip_src"] = re.sub(r"IP$", "", raw)
-
-            # 5. Fallback IP
-            if result["ip"] == "❓":
-                ip_match = re.search(r"\b(?:\d{1,3}\.){3}\d{1,3}\b", text)
-                if ip_match: result["ip"] = ip_match.group(0)
+            if result["bot_score"] != "❓":
+                result["bot_emoji"] = self.get_emoji(result["bot_score"])
 
             # String
             attr = result["ip_attr"] if result["ip_attr"] != "❓" else ""
@@ -104,13 +240,18 @@ class BrowserSource(BaseCheckSource):
             
             result["full_string"] = f"【{result['pure_emoji']}{result['bot_emoji']} {info}】"
 
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
         except Exception as e:
             result["error"] = str(e)
             result["full_string"] = "【❌ Error】"
         finally:
-            if not self.headless:
+            if not self.headless and not cancelled:
                 print("     [Debug] Waiting 5s before closing browser window...")
                 await asyncio.sleep(5)
+            if not cancelled:
+                await self._record_traffic(finished)
             await page.close()
             await context.close()
             
@@ -1,12 +1,22 @@
 from .base import BaseCheckSource
+from ..traffic import meter, header_bytes
 from curl_cffi.requests import Session
 import asyncio
+import contextvars
 from typing import Dict, Optional
 
+# Headers curl sends when impersonating Chrome: not visible on the response object
+REQUEST_ESTIMATE = 600
+
+
 class IPPureSource(BaseCheckSource):
 
 
-    def _check_sync(self, proxy: Optional[str] = None):
+    def new_session(self, proxy: Optional[str] = None) -> Session:
+        proxies = {"http": proxy, "https": proxy} if proxy else None
+        return Session(proxies=proxies, impersonate="chrome110")
+
+    def _check_sync(self, proxy: Optional[str] = None, timeout: float = 5, session: Optional[Session] = None):
         url = "https://my.123169.xyz/v1/info"
         result = {
             "pure_emoji": "❓", "shared_emoji": "❓", "ip_attr": "❓", "ip_src": "❓",
@@ -14,9 +24,13 @@ class IPPureSource(BaseCheckSource):
             "error": None, "source": "ippure"
         }
         try:
-            proxies = {"http": proxy, "https": proxy} if proxy else None
-            with Session(proxies=proxies, impersonate="chrome110", timeout=5) as session:
-                resp = session.get(url)
+            owned = session is None
+            if owned:
+                session = self.new_session(proxy)
+            try:
+                resp = session.get(url, timeout=timeout)
+                meter.record("ippure", REQUEST_ESTIMATE,
+                             header_bytes(resp.headers, "HTTP/1.1 200 OK") + len(resp.content))
                 if resp.status_code == 200:
                     data = resp.json()
                     result["ip"] = data.get("ip", "❓")
@@ -42,12 +56,18 @@ class IPPureSource(BaseCheckSource):
                 else:
                     result["error"] = f"API Error {resp.status_code}"
                     result["full_string"] = "【❌ API Error】"
+            finally:
+                if owned:
+                    session.close()
         except Exception as e:
             print(f"     [ippure] curl_cffi error: {e}")
             result["error"] = str(e)
             result["full_string"] = "【❌ Error】"
         return result
 
-    async def check(self, proxy: Optional[str] = None) -> Dict:
+    async def check(self, proxy: Optional[str] = None, timeout: float = 5, session: Optional[Session] = None) -> Dict:
+        """session: pooled session for the current node, a private one is opened (and closed) if None."""
         loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, self._check_sync, proxy)
+        # Copy the context so the traffic is still attributed to the current node
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(None, ctx.run, self._check_sync, proxy, timeout, session)
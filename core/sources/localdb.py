@@ -0,0 +1,241 @@
+from .base import BaseCheckSource
+import argparse
+import csv
+import ipaddress
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, Optional, Tuple
+
+# File layout (little endian):
+#   header:  magic(8) | record count (u32) | string table offset (u32)
+#   records: start (u32) | end (u32) | asn (u32) | country (2s) | flags (u8) | pad | provider offset (u32)
+#   strings: length (u16) | utf-8 bytes, referenced by byte offset from the table start
+MAGIC = b"CIPDB1\0\0"
+HEADER = struct.Struct("<8sII")
+RECORD = struct.Struct("<III2sBxI")
+START = struct.Struct("<I")
+STRLEN = struct.Struct("<H")
+
+FLAG_HOSTING = 1
+FLAG_RESIDENTIAL = 2
+
+HOSTING_WORDS = {"1", "true", "yes", "hosting", "datacenter", "idc", "business"}
+RESIDENTIAL_WORDS = {"residential", "isp", "home"}
+
+
+def _ip_range(row: Dict) -> Tuple[int, int]:
+    if row.get("network"):
+        net = ipaddress.ip_network(row["network"].strip(), strict=False)
+        return int(net.network_address), int(net.broadcast_address)
+    return int(ipaddress.IPv4Address(row["start_ip"].strip())), int(ipaddress.IPv4Address(row["end_ip"].strip()))
+
+
+def _flags(value) -> int:
+    value = str(value or "").strip().lower()
+    if value in HOSTING_WORDS:
+        return FLAG_HOSTING
+    if value in RESIDENTIAL_WORDS:
+        return FLAG_RESIDENTIAL
+    return 0
+
+
+def _flatten(rows):
+    """
+    Turns possibly nested/overlapping ranges into sorted disjoint segments,
+    the most specific range winning, so a binary search on start stays exact.
+    """
+    stack = []
+    cursor = 0
+    # Outer ranges first when they share a start
+    for row in sorted(rows, key=lambda r: (r[0], -r[1])):
+        start = row[0]
+        while stack and stack[-1][1] < start:
+            top = stack.pop()
+            if cursor <= top[1]:
+                yield (cursor, top[1]) + tuple(top[2:])
+                cursor = top[1] + 1
+        if stack and cursor < start:
+            yield (cursor, start - 1) + tuple(stack[-1][2:])
+        cursor = max(cursor, start)
+        stack.append(row)
+    while stack:
+        top = stack.pop()
+        if cursor <= top[1]:
+            yield (cursor, top[1]) + tuple(top[2:])
+            cursor = top[1] + 1
+
+
+def build_database(rows: Iterable[Tuple[int, int, int, str, str, int]], out_path: str) -> int:
+    """
+    Writes (start, end, asn, country, provider, flags) ranges to the binary format.
+    Returns the number of records written.
+    """
+    strings = bytearray()
+    string_offsets = {}
+    records = bytearray()
+    count = 0
+
+    for start, end, asn, country, provider, flags in _flatten(rows):
+        provider = (provider or "")[:200]
+        if provider not in string_offsets:
+            encoded = provider.encode("utf-8")
+            string_offsets[provider] = len(strings)
+            strings += STRLEN.pack(len(encoded)) + encoded
+        country_code = (country or "").upper().encode("ascii", "ignore")[:2].ljust(2, b"\0")
+        records += RECORD.pack(start, end, asn or 0, country_code, flags, string_offsets[provider])
+        count += 1
+
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, count, HEADER.size + len(records)))
+        f.write(records)
+        f.write(strings)
+    os.replace(tmp_path, out_path)
+    return count
+
+
+def import_csv(csv_path: str, out_path: str) -> int:
+    """
+    CSV columns: network (CIDR) or start_ip/end_ip, asn, country, provider, type
+    (type: hosting/datacenter/1 or residential/isp, anything else is unknown).
+    """
+    def rows():
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    start, end = _ip_range(row)
+                except (ValueError, KeyError, AttributeError):
+                    continue  # IPv6 or malformed line
+                asn = str(row.get("asn") or "").upper().replace("AS", "")
+                yield (start, end, int(asn) if asn.isdigit() else 0, row.get("country", ""),
+                       row.get("provider", ""), _flags(row.get("type") or row.get("hosting")))
+    return build_database(rows(), out_path)
+
+
+def import_mmdb(mmdb_path: str, out_path: str) -> int:
+    """Imports the IPv4 part of a MaxMind/ipinfo style .mmdb (requires the maxminddb package)."""
+    try:
+        import maxminddb
+    except ImportError:
+        raise RuntimeError("MMDB import needs the 'maxminddb' package: pip install maxminddb")
+
+    def rows():
+        with maxminddb.open_database(mmdb_path) as reader:
+            for network, record in reader:
+                if network.version != 4 or not isinstance(record, dict):
+                    continue
+                asn = record.get("autonomous_system_number") or str(record.get("asn", "")).upper().replace("AS", "")
+                country = record.get("country")
+                if isinstance(country, dict):
+                    country = country.get("iso_code")
+                provider = record.get("autonomous_system_organization") or record.get("as_name") or record.get("name")
+                yield (int(network.network_address), int(network.broadcast_address),
+                       int(asn) if str(asn).isdigit() else 0, country or "", provider or "",
+                       _flags(record.get("type") or record.get("hosting")))
+    return build_database(rows(), out_path)
+
+
+class LocalDBSource(BaseCheckSource):
+    """
+    Offline lookups (ASN, provider, country, hosting flag) from a range database
+    built by import_csv/import_mmdb. The file is memory-mapped and searched with
+    binary search, so a lookup costs microseconds and no network.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._mm = None
+        self._count = 0
+        self._strings_offset = 0
+
+    def open(self):
+        if self._mm is not None:
+            return
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count, self._strings_offset = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a local IP database")
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def lookup(self, ip: str) -> Optional[Dict]:
+        """Returns {asn, country, provider, hosting, residential} or None if not covered."""
+        try:
+            target = int(ipaddress.IPv4Address(ip))
+        except ValueError:
+            return None
+        self.open()
+
+        mm = self._mm
+        lo, hi = 0, self._count - 1
+        found = -1
+        # Last record whose start <= target
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            if START.unpack_from(mm, HEADER.size + mid * RECORD.size)[0] <= target:
+                found = mid
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        if found < 0:
+            return None
+
+        start, end, asn, country, flags, str_off = RECORD.unpack_from(mm, HEADER.size + found * RECORD.size)
+        if target > end:
+            return None
+
+        pos = self._strings_offset + str_off
+        (length,) = STRLEN.unpack_from(mm, pos)
+        provider = mm[pos + STRLEN.size:pos + STRLEN.size + length].decode("utf-8", "replace")
+        return {
+            "asn": asn or None,
+            "country": country.rstrip(b"\0").decode("ascii") or None,
+            "provider": provider or None,
+            "hosting": bool(flags & FLAG_HOSTING),
+            "residential": bool(flags & FLAG_RESIDENTIAL),
+        }
+
+    async def check(self, proxy: Optional[str] = None, ip: Optional[str] = None) -> Optional[Dict]:
+        """
+        Partial result for an already known exit IP. There is no risk score offline,
+        only the attribute (datacenter/residential) and network info.
+        """
+        info = self.lookup(ip) if ip else None
+        if not info:
+            return None
+
+        result = {
+            "pure_emoji": "❓", "shared_emoji": "", "ip_attr": "❓", "ip_src": "❓",
+            "pure_score": "❓", "shared_users": "N/A", "full_string": "", "ip": ip,
+            "error": None, "source": "localdb",
+            "asn": info["asn"], "country": info["country"], "provider": info["provider"],
+        }
+        if info["hosting"]:
+            result["ip_attr"] = "机房"
+        elif info["residential"]:
+            result["ip_attr"] = "住宅"
+
+        info_str = result["ip_attr"] if result["ip_attr"] != "❓" else "未知"
+        result["full_string"] = f"【{result['pure_emoji']} {info_str}】"
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local IP database used by LocalDBSource")
+    parser.add_argument("format", choices=["csv", "mmdb"])
+    parser.add_argument("input")
+    parser.add_argument("output")
+    args = parser.parse_args()
+
+    importer = import_csv if args.format == "csv" else import_mmdb
+    print(f"Imported {importer(args.input, args.output)} ranges into {args.output}")
@@ -0,0 +1,181 @@
+"""
+Pure parsing functions for the HTML/text returned by the check sites.
+Patterns are compiled once, and every field is searched from its fixed anchor
+in a bounded window instead of scanning the whole page with DOTALL.
+"""
+import re
+from typing import Dict, Optional
+
+# Window searched after an anchor; the fields sit right next to their labels
+WINDOW = 4096
+
+CLOUDFLARE_MARKERS = ("<title>Just a moment...</title>", "challenge-platform", "cf-turnstile")
+
+# --- ping0.cc ---
+PING0_IP = re.compile(r"window\.ip\s*=\s*'([^']+)'")
+PING0_IP_LINK = re.compile(r'href="[^"]*?/ping/([0-9.]+)"')
+PING0_LABEL = re.compile(r'<span class="label[^>]*>(.*?)</span>', re.DOTALL)
+PING0_RISK = re.compile(r'class="riskitem riskcurrent"[^>]*><span class="value">(\d+)%</span>')
+PING0_USECOUNT = re.compile(r'usecount="([^"]+)"')
+PING0_USECOUNT_BAR = re.compile(r'class="usecountbar"[^>]*>\s*(.*?)\s*</div>', re.DOTALL)
+
+# Anchors of every field parse_ping0 reads; once all are in (plus a tail for
+# their values) the rest of the page can be dropped unread
+PING0_MARKERS = ("window.ip", '<div class="line line-iptype">', 'class="riskitem riskcurrent"',
+                 '<div class="line line-nativeip">', "usecount")
+# The parser searches WINDOW chars from each anchor; the slack covers anchors found a
+# little after their marker ("usecount" first matches the line-usecount class)
+PING0_TAIL = WINDOW + 1024
+
+# --- ippure.com (page text) ---
+IPPURE_SCORE = re.compile(r"(\d+%)")
+IPPURE_BOT = re.compile(r"bot\s*(\d+(\.\d+)?)%", re.IGNORECASE)
+IPPURE_ATTR = (re.compile(r"IP属性\s*\n\s*(.+)"), re.compile(r"IP属性\s*(.+)"))
+IPPURE_SRC = (re.compile(r"IP来源\s*\n\s*(.+)"), re.compile(r"IP来源\s*(.+)"))
+IPV4 = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")
+IP_SUFFIX = re.compile(r"IP$")
+
+
+def is_cloudflare_challenge(html: str) -> bool:
+    return any(marker in html for marker in CLOUDFLARE_MARKERS)
+
+
+def ping0_complete(html: str) -> bool:
+    """True once every ping0 field anchor and enough text after it has arrived."""
+    last = 0
+    for marker in PING0_MARKERS:
+        pos = html.find(marker)
+        if pos < 0:
+            return False
+        last = max(last, pos)
+    return len(html) - last >= PING0_TAIL
+
+
+class Ping0Stream:
+    """
+    ping0_complete / is_cloudflare_challenge for a page arriving in chunks.
+    Each chunk is searched once, together with the last few chars of the
+    previous one (so a marker split across chunks is still found), which
+    keeps the work linear in the page size.
+    """
+
+    OVERLAP = max(len(marker) for marker in PING0_MARKERS + CLOUDFLARE_MARKERS) - 1
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+        self.found: Dict[str, int] = {}  # marker -> position of its first occurrence
+        self.challenge = False
+        self._tail = ""
+
+    def feed(self, text: str) -> bool:
+        """Adds a chunk; True once reading can stop (every field is in, or it is a challenge page)."""
+        window = self._tail + text
+        base = self.size - len(self._tail)
+        for marker in PING0_MARKERS:
+            if marker not in self.found:
+                pos = window.find(marker)
+                if pos >= 0:
+                    self.found[marker] = base + pos
+        if not self.challenge:
+            self.challenge = any(marker in window for marker in CLOUDFLARE_MARKERS)
+        self.parts.append(text)
+        self.size += len(text)
+        self._tail = window[-self.OVERLAP:]
+        return self.challenge or self.complete
+
+    @property
+    def complete(self) -> bool:
+        return len(self.found) == len(PING0_MARKERS) and self.size - max(self.found.values()) >= PING0_TAIL
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def _after(pattern, text: str, anchor: str) -> Optional[re.Match]:
+    pos = text.find(anchor)
+    if pos < 0:
+        return None
+    return pattern.search(text, pos, pos + WINDOW)
+
+
+def parse_ping0(html: str) -> Dict:
+    """
+    Extracts the raw fields of a ping0.cc page.
+    Missing fields keep their "❓"/"N/A" placeholders.
+    """
+    fields = {"ip": "❓", "ip_attr": "❓", "ip_src": "❓", "pure_score": "❓", "shared_users": "N/A"}
+
+    # 1. IP
+    ip_match = _after(PING0_IP, html, "window.ip") or PING0_IP_LINK.search(html)
+    if ip_match:
+        fields["ip"] = ip_match.group(1).strip()
+
+    # 2. Type
+    type_match = _after(PING0_LABEL, html, '<div class="line line-iptype">')
+    if type_match:
+        raw_type = type_match.group(1).strip()
+        if "机房" in raw_type or "IDC" in raw_type: fields["ip_attr"] = "机房"
+        elif "家庭" in raw_type or "住宅" in raw_type: fields["ip_attr"] = "住宅"
+        else: fields["ip_attr"] = raw_type
+
+    # 3. Score
+    score_match = _after(PING0_RISK, html, 'class="riskitem riskcurrent"')
+    if score_match:
+        fields["pure_score"] = f"{score_match.group(1)}%"
+
+    # 4. Native
+    native_match = _after(PING0_LABEL, html, '<div class="line line-nativeip">')
+    if native_match:
+        raw_native = native_match.group(1).strip()
+        if "广播" in raw_native: fields["ip_src"] = "广播"
+        elif "原生" in raw_native: fields["ip_src"] = "原生"
+        else: fields["ip_src"] = raw_native
+
+    # 5. Shared
+    shared_match = _after(PING0_USECOUNT, html, 'usecount="') or _after(PING0_USECOUNT_BAR, html, 'class="usecountbar"')
+    if shared_match:
+        fields["shared_users"] = shared_match.group(1).strip()
+
+    return fields
+
+
+def _first(patterns, text: str) -> Optional[re.Match]:
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            return match
+    return None
+
+
+def parse_ippure_text(text: str) -> Dict:
+    """Extracts the raw fields from the visible body text of ippure.com."""
+    fields = {"ip": "❓", "ip_attr": "❓", "ip_src": "❓", "pure_score": "❓", "bot_score": "❓"}
+
+    # 1. IPPure Score
+    score_match = _after(IPPURE_SCORE, text, "IPPure系数")
+    if score_match:
+        fields["pure_score"] = score_match.group(1)
+
+    # 2. Bot Ratio
+    bot_match = IPPURE_BOT.search(text)
+    if bot_match:
+        fields["bot_score"] = f"{bot_match.group(1)}%"
+
+    # 3. Attributes
+    attr_match = _first(IPPURE_ATTR, text)
+    if attr_match:
+        fields["ip_attr"] = IP_SUFFIX.sub("", attr_match.group(1).strip())
+
+    # 4. Source
+    src_match = _first(IPPURE_SRC, text)
+    if src_match:
+        fields["ip_src"] = IP_SUFFIX.sub("", src_match.group(1).strip())
+
+    # 5. IP
+    ip_match = IPV4.search(text)
+    if ip_match:
+        fields["ip"] = ip_match.group(0)
+
+    return fields
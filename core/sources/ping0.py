@@ -1,10 +1,19 @@
 from .base import BaseCheckSource
+from .parsers import parse_ping0, is_cloudflare_challenge, Ping0Stream
+from ..traffic import meter, header_bytes
 from curl_cffi.requests import AsyncSession
+import codecs
 import re
 from typing import Dict, Optional
 
+# Headers curl sends when impersonating Chrome: not visible on the response object
+REQUEST_ESTIMATE = 700
+
+
 class Ping0Source(BaseCheckSource):
 
+    def __init__(self):
+        self.cloudflare_hits = 0  # Challenge pages seen, a sign of being rate limited
 
     def get_shared_emoji(self, shared_str):
         if not shared_str or shared_str == "N/A":
@@ -22,78 +31,74 @@ class Ping0Source(BaseCheckSource):
         except Exception:
             return "❓"
 
-    async def check(self, proxy: Optional[str] = None) -> Optional[Dict]:
-        url = "https://ping0.cc/"
+    async def _read_until_complete(self, resp):
+        """
+        Reads the streamed page only until every field is in (or a challenge
+        page is recognised). Returns (text, body bytes read).
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        stream = Ping0Stream()
+        body = 0
+        async for chunk in resp.aiter_content():
+            body += len(chunk)
+            if stream.feed(decoder.decode(chunk)):
+                return stream.text, body
+        stream.feed(decoder.decode(b"", final=True))
+        return stream.text, body
+
+    def new_session(self, proxy: Optional[str] = None) -> AsyncSession:
         proxies = {"http": proxy, "https": proxy} if proxy else None
+        return AsyncSession(proxies=proxies, impersonate="chrome124")
+
+    async def check(self, proxy: Optional[str] = None, timeout: float = 5,
+                    session: Optional[AsyncSession] = None) -> Optional[Dict]:
+        """session: pooled session for the current node, a private one is opened (and closed) if None."""
+        url = "https://ping0.cc/"
+        owned = session is None
+        if owned:
+            session = self.new_session(proxy)
         
         try:
-            async with AsyncSession(proxies=proxies, impersonate="chrome124", timeout=5) as session:
-                resp = await session.get(url)
-                
+            resp = await session.get(url, stream=True, timeout=timeout)
+            received = header_bytes(resp.headers, "HTTP/1.1 200 OK")
+            try:
                 if resp.status_code != 200:
                     return None
-                
-                html = resp.text
-                
-                # Cloudflare detection
-                if "<title>Just a moment...</title>" in html or "challenge-platform" in html or "cf-turnstile" in html:
-                    print("     [Ping0] Cloudflare blocked, falling back to ippure")
-                    return None
-                
-                result = {
-                    "ip": "❓", "ip_attr": "❓", "ip_src": "❓",
-                    "pure_score": "❓", "shared_users": "N/A",
-                    "pure_emoji": "❓", "shared_emoji": "❓",
-                    "full_string": "", "error": None, "source": "ping0"
-                }
-                
-                # 1. IP
-                ip_match = re.search(r"window\.ip\s*=\s*'([^']+)'", html)
-                if not ip_match:
-                    ip_match = re.search(r'href="[^"]*?/ping/([0-9.]+)"', html)
-                if ip_match:
-                    result["ip"] = ip_match.group(1).strip()
-                
-                # 2. Type
-                type_match = re.search(r'<div class="line line-iptype">.*?<span class="label[^>]*>(.*?)</span>', html, re.DOTALL)
-                if type_match:
-                    raw_type = type_match.group(1).strip()
-                    if "机房" in raw_type or "IDC" in raw_type: result["ip_attr"] = "机房"
-                    elif "家庭" in raw_type or "住宅" in raw_type: result["ip_attr"] = "住宅"
-                    else: result["ip_attr"] = raw_type
-                
-                # 3. Score
-                score_match = re.search(r'class="riskitem riskcurrent"[^>]*><span class="value">(\d+)%</span>', html)
-                if score_match:
-                    result["pure_score"] = f"{score_match.group(1)}%"
-                    result["pure_emoji"] = self.get_emoji(result["pure_score"])
-                
-                # 4. Native
-                native_match = re.search(r'<div class="line line-nativeip">.*?<span class="label[^>]*>(.*?)</span>', html, re.DOTALL)
-                if native_match:
-                    raw_native = native_match.group(1).strip()
-                    if "广播" in raw_native: result["ip_src"] = "广播"
-                    elif "原生" in raw_native: result["ip_src"] = "原生"
-                    else: result["ip_src"] = raw_native
-                
-                # 5. Shared
-                shared_match = re.search(r'usecount="([^"]+)"', html)
-                if not shared_match:
-                    shared_match = re.search(r'class="usecountbar"[^>]*>\s*(.*?)\s*</div>', html, re.DOTALL)
-                if shared_match:
-                    result["shared_users"] = shared_match.group(1).strip()
-                    result["shared_emoji"] = self.get_shared_emoji(result["shared_users"])
-                
-                # Finish
-                attr = result["ip_attr"] if result["ip_attr"] != "❓" else ""
-                src = result["ip_src"] if result["ip_src"] != "❓" else ""
-                info = f"{attr}|{src}".strip()
-                if info == "|" or not info: info = "未知"
-                
-                result["full_string"] = f"【{result['pure_emoji']}{result['shared_emoji']} {info}】"
-                
-                return result
-                
+                html, body = await self._read_until_complete(resp)
+                received += body
+            finally:
+                await resp.aclose()
+                meter.record("ping0", REQUEST_ESTIMATE, received)
+            
+            # Cloudflare detection
+            if is_cloudflare_challenge(html):
+                self.cloudflare_hits += 1
+                print("     [Ping0] Cloudflare blocked, falling back to ippure")
+                return None
+            
+            result = {
+                "pure_emoji": "❓", "shared_emoji": "❓",
+                "full_string": "", "error": None, "source": "ping0"
+            }
+            result.update(parse_ping0(html))
+            if result["pure_score"] != "❓":
+                result["pure_emoji"] = self.get_emoji(result["pure_score"])
+            if result["shared_users"] != "N/A":
+                result["shared_emoji"] = self.get_shared_emoji(result["shared_users"])
+            
+            # Finish
+            attr = result["ip_attr"] if result["ip_attr"] != "❓" else ""
+            src = result["ip_src"] if result["ip_src"] != "❓" else ""
+            info = f"{attr}|{src}".strip()
+            if info == "|" or not info: info = "未知"
+            
+            result["full_string"] = f"【{result['pure_emoji']}{result['shared_emoji']} {info}】"
+            
+            return result
+            
         except Exception as e:
             print(f"     [Ping0] Error: {e}")
             return None
+        finally:
+            if owned:
+                await session.close()
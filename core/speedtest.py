@@ -0,0 +1,99 @@
+"""
+Optional speed stage, run after the IP check: handshake latency, TTFB and
+download throughput of a node, measured through the local proxy.
+Each measurement uses a fresh connection (a pooled one would hide the
+handshake) and stops at max_bytes or after timeout seconds, whichever comes
+first, so the extra time per node is bounded.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+import aiohttp
+
+from .traffic import meter, header_bytes
+
+DEFAULT_URL = "https://speed.cloudflare.com/__down?bytes=2000000"
+UNREACHABLE = ("❓", "Error", None)
+
+
+def format_speed(speed: Optional[Dict]) -> str:
+    """Short label for full_string and the web table, e.g. "⚡12.3M 180ms"."""
+    if not speed or speed.get("mbps") is None:
+        return "⚡✖"
+    return f"⚡{speed['mbps']:.1f}M {speed['ttfb_ms']:.0f}ms"
+
+
+def with_speed(result: Dict, speed: Dict) -> Dict:
+    """Result with the speed fields, the label appended inside full_string's brackets."""
+    merged = dict(result, speed=speed, speed_label=format_speed(speed))
+    full = result.get("full_string", "")
+    if full.endswith("】"):
+        merged["full_string"] = f"{full[:-1]} {merged['speed_label']}】"
+    else:
+        merged["full_string"] = f"{full}【{merged['speed_label']}】"
+    return merged
+
+
+class SpeedTest:
+    def __init__(self, url: str = DEFAULT_URL, max_bytes: int = 2_000_000, timeout: float = 8.0):
+        self.url = url
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+
+    @staticmethod
+    def worth_measuring(result: Optional[Dict]) -> bool:
+        """Only nodes the IP check got through; a dead node would just burn the timeout."""
+        return bool(result) and result.get("ip") not in UNREACHABLE and result.get("source") != "timeout"
+
+    async def measure(self, proxy: Optional[str]) -> Dict:
+        """{handshake_ms, ttfb_ms, mbps, bytes, error}; a timeout mid-download keeps the partial throughput."""
+        progress = {"started": time.monotonic(), "bytes": 0}
+
+        async def connection_start(session, ctx, params):
+            progress["connect_start"] = time.monotonic()
+
+        async def connection_end(session, ctx, params):
+            progress["connect_end"] = time.monotonic()
+
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_start.append(connection_start)
+        trace.on_connection_create_end.append(connection_end)
+
+        error = None
+        try:
+            await asyncio.wait_for(self._download(proxy, trace, progress), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except aiohttp.ClientError as e:
+            error = str(e) or type(e).__name__
+        error = progress.get("error", error)
+
+        first_byte = progress.get("first_byte")
+        end = progress.get("end", time.monotonic())
+        result = {"handshake_ms": None, "ttfb_ms": None, "mbps": None, "bytes": progress["bytes"], "error": error}
+        if "connect_end" in progress and "connect_start" in progress:
+            result["handshake_ms"] = round((progress["connect_end"] - progress["connect_start"]) * 1000, 1)
+        if first_byte is not None:
+            result["ttfb_ms"] = round((first_byte - progress["started"]) * 1000, 1)
+            if progress["bytes"] and end > first_byte:
+                result["mbps"] = round(progress["bytes"] * 8 / (end - first_byte) / 1_000_000, 2)
+        return result
+
+    async def _download(self, proxy: Optional[str], trace: aiohttp.TraceConfig, progress: Dict):
+        connector = aiohttp.TCPConnector(force_close=True)
+        async with aiohttp.ClientSession(connector=connector, trace_configs=[trace]) as session:
+            async with session.get(self.url, proxy=proxy) as resp:
+                progress["first_byte"] = time.monotonic()
+                sent = header_bytes(resp.request_info.headers, "GET / HTTP/1.1")
+                try:
+                    if resp.status != 200:
+                        progress["error"] = f"HTTP {resp.status}"
+                        return
+                    async for chunk in resp.content.iter_chunked(65536):
+                        progress["bytes"] += len(chunk)
+                        progress["end"] = time.monotonic()
+                        if progress["bytes"] >= self.max_bytes:
+                            break
+                finally:
+                    meter.record("speedtest", sent, header_bytes(resp.headers, "HTTP/1.1 200 OK") + progress["bytes"])
@@ -0,0 +1,79 @@
+"""
+Tiered scans: a fast pass (check_fast) over every node, then a browser pass
+(check_browser) only for the nodes where the bot score matters, merged back
+into one result.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .speedtest import with_speed
+
+UNKNOWN = ("❓", "?", "N/A", None)
+
+
+def score_of(result: Dict) -> Optional[float]:
+    """pure_score as a number ("12%" -> 12.0), None if unknown."""
+    try:
+        return float(str(result.get("pure_score", "")).rstrip("%"))
+    except ValueError:
+        return None
+
+
+def is_ambiguous(result: Dict, primary_source: str = "ping0") -> bool:
+    """Reached the node but the fast result is degraded (fallback source) or incomplete."""
+    if result.get("ip") in UNKNOWN or result.get("ip") == "Error":
+        return False  # Unreachable: a browser won't do better
+    if result.get("source") != primary_source:
+        return True
+    return any(result.get(field) in UNKNOWN for field in ("pure_score", "ip_attr", "ip_src"))
+
+
+def select_for_browser(fast_results: Iterable[Tuple[object, str, Dict]], top_k: int = 0,
+                       group_nodes: Optional[Set[str]] = None, ambiguous: bool = True,
+                       primary_source: str = "ping0") -> List[object]:
+    """
+    Keys of the nodes that get a browser check, from (key, name, fast result):
+    the top_k cleanest by pure_score, every node in group_nodes, and (if
+    ambiguous) every node whose fast result is degraded or incomplete.
+    Order: top-K first (best first), then the rest in scan order.
+    """
+    fast_results = list(fast_results)
+    group_nodes = group_nodes or set()
+
+    scored = [(score_of(res), key) for key, _, res in fast_results if score_of(res) is not None]
+    selected = [key for _, key in sorted(scored, key=lambda item: item[0])[:max(top_k, 0)]]
+    chosen = set(selected)
+    for key, name, res in fast_results:
+        if key in chosen:
+            continue
+        if name in group_nodes or (ambiguous and is_ambiguous(res, primary_source)):
+            selected.append(key)
+            chosen.add(key)
+    return selected
+
+
+def merge_results(fast: Dict, browser: Optional[Dict]) -> Dict:
+    """
+    Fast result enriched with the browser's bot score; fields the fast pass
+    missed are filled from the browser. A failed browser check leaves the
+    fast result untouched.
+    """
+    if not browser or browser.get("bot_score") in UNKNOWN:
+        return fast
+
+    merged = dict(fast)
+    for field in ("ip", "pure_score", "pure_emoji", "ip_attr", "ip_src"):
+        if merged.get(field) in UNKNOWN and browser.get(field) not in UNKNOWN:
+            merged[field] = browser[field]
+    merged["bot_score"] = browser["bot_score"]
+    merged["bot_emoji"] = browser.get("bot_emoji", "❓")
+    merged["source"] = f"{fast.get('source', 'unknown')}+browser"
+
+    attr = merged.get("ip_attr") if merged.get("ip_attr") not in UNKNOWN else ""
+    src = merged.get("ip_src") if merged.get("ip_src") not in UNKNOWN else ""
+    info = f"{attr}|{src}".strip()
+    if info == "|" or not info:
+        info = "未知"
+    merged["full_string"] = f"【{merged.get('pure_emoji', '❓')}{merged.get('shared_emoji', '')}{merged['bot_emoji']} {info}】"
+    if fast.get("speed"):  # Measured in the fast pass, keep it in the label
+        merged = with_speed(merged, fast["speed"])
+    return merged
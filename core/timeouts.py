@@ -0,0 +1,93 @@
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Playwright, curl_cffi and aiohttp all read a timeout of 0 as "wait forever":
+# a capped stage timeout never goes below this
+MIN_STAGE_TIMEOUT = 0.1
+
+
+class LatencyTracker:
+    """
+    Online latency estimate of one source over a sliding window.
+    The timeout is p99 x factor, clamped to [floor, ceiling]; until enough
+    samples are in, the old hard-coded default is used.
+    """
+
+    def __init__(self, default: float, floor: float, ceiling: float,
+                 factor: float = 3.0, window: int = 100, min_samples: int = 5):
+        self.default = default
+        self.floor = floor
+        self.ceiling = ceiling
+        self.factor = factor
+        self.min_samples = min_samples
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        """Records the latency of a successful request."""
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+    def timeout(self) -> float:
+        if len(self.samples) < self.min_samples:
+            return self.default
+        return min(max(self.percentile(99) * self.factor, self.floor), self.ceiling)
+
+    def stats(self) -> Dict:
+        return {
+            "samples": len(self.samples),
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "timeout": round(self.timeout(), 2),
+        }
+
+
+class Deadline:
+    """Time budget of one node, shared by all stages of its check."""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(self.expires - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def cap(self, timeout: float) -> float:
+        """Shortens a stage timeout so it never runs past the node budget; never 0, see MIN_STAGE_TIMEOUT."""
+        return max(min(timeout, self.remaining()), MIN_STAGE_TIMEOUT)
+
+
+class TimeoutPolicy:
+    """Latency trackers of every source, keyed by name."""
+
+    # name: (default, floor, ceiling) in seconds
+    DEFAULTS = {
+        "simple_ip": (3, 1, 5),
+        "ping0": (5, 2, 10),
+        "ippure": (5, 2, 10),
+        "browser": (20, 8, 30),
+    }
+
+    def __init__(self, overrides: Optional[Dict] = None):
+        limits = dict(self.DEFAULTS)
+        limits.update(overrides or {})
+        self.trackers = {name: LatencyTracker(*values) for name, values in limits.items()}
+
+    def timeout(self, name: str, deadline: Optional[Deadline] = None) -> float:
+        timeout = self.trackers[name].timeout()
+        return deadline.cap(timeout) if deadline else timeout
+
+    def observe(self, name: str, seconds: float):
+        self.trackers[name].observe(seconds)
+
+    def stats(self) -> Dict:
+        return {name: tracker.stats() for name, tracker in self.trackers.items()}
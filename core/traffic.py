@@ -0,0 +1,96 @@
+"""
+Traffic accounting for check requests.
+Sources report the bytes of every request they make; the scan loop marks
+which node is being checked, so usage adds up per node and per source.
+Sizes are measured at the application level (headers + body), which is
+close to, but not exactly, what a metered plan bills.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+
+_current_node: ContextVar[Optional[str]] = ContextVar("traffic_node", default=None)
+
+UNATTRIBUTED = "-"
+
+
+def header_bytes(headers, first_line: str = "") -> int:
+    """Approximate size of a header block: 'Key: value\\r\\n' per header plus the request/status line."""
+    items: Iterable[Tuple[str, str]] = headers.items() if hasattr(headers, "items") else headers or ()
+    size = len(first_line) + 2 + 2  # first line + blank line
+    for key, value in items:
+        size += len(str(key)) + len(str(value)) + 4
+    return size
+
+
+class TrafficMeter:
+    """Bytes sent/received, keyed by node then source. Thread-safe (executor sources)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.nodes: Dict[str, Dict[str, list]] = {}  # node -> source -> [sent, received, requests]
+
+    @contextmanager
+    def node(self, name: str):
+        """Attributes every request made inside the block (and its tasks) to this node."""
+        token = _current_node.set(name)
+        try:
+            yield
+        finally:
+            _current_node.reset(token)
+
+    def record(self, source: str, sent: int, received: int):
+        node = _current_node.get() or UNATTRIBUTED
+        with self._lock:
+            bucket = self.nodes.setdefault(node, {}).setdefault(source, [0, 0, 0])
+            bucket[0] += sent
+            bucket[1] += received
+            bucket[2] += 1
+
+    def of(self, node: str) -> Dict:
+        """{"sent", "received", "sources": {source: {...}}} for one node."""
+        with self._lock:
+            sources = {src: list(v) for src, v in self.nodes.get(node, {}).items()}
+        return {
+            "sent": sum(v[0] for v in sources.values()),
+            "received": sum(v[1] for v in sources.values()),
+            "sources": {src: {"sent": v[0], "received": v[1], "requests": v[2]} for src, v in sources.items()},
+        }
+
+    def summary(self) -> Dict:
+        """Totals per source and per node on average, for the end-of-scan report."""
+        per_source: Dict[str, list] = {}
+        with self._lock:
+            node_count = len([n for n in self.nodes if n != UNATTRIBUTED])
+            for sources in self.nodes.values():
+                for src, (sent, received, requests) in sources.items():
+                    total = per_source.setdefault(src, [0, 0, 0])
+                    total[0] += sent
+                    total[1] += received
+                    total[2] += requests
+        sent = sum(v[0] for v in per_source.values())
+        received = sum(v[1] for v in per_source.values())
+        return {
+            "nodes": node_count,
+            "sent": sent,
+            "received": received,
+            "per_node": round((sent + received) / node_count) if node_count else 0,
+            "sources": {src: {"sent": v[0], "received": v[1], "requests": v[2]} for src, v in per_source.items()},
+        }
+
+    def reset(self):
+        with self._lock:
+            self.nodes.clear()
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.2f}GB"
+
+
+# One meter per process: the web app and the CLI each run one scan at a time
+meter = TrafficMeter()
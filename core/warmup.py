@@ -0,0 +1,74 @@
+"""
+Start-up warm-up: does ahead of time what would otherwise land on the first
+scan. Chromium is launched, the lazily imported sources (curl_cffi, its
+impersonation profiles) are loaded, the hosts of the check sources are
+resolved and the controller's /configs is cached. All steps run
+concurrently, so the warm-up takes about as long as its slowest step.
+"""
+import asyncio
+import socket
+import time
+from typing import Dict, Iterable, Optional
+
+from .connections import _close
+
+# Hosts each check source talks to
+SOURCE_HOSTS = {
+    "ping0": ("ping0.cc",),
+    "ippure": ("my.123169.xyz",),
+    "browser": ("ippure.com",),
+}
+
+
+async def resolve(host: str, port: int = 443):
+    """Resolves host through the system resolver, so its cache is warm."""
+    await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+
+
+async def load_sources(checker, sources: Iterable[str]):
+    """Imports the fast sources and builds (and closes) one session each."""
+    for name in sources:
+        # The import is the slow part, keep it off the event loop
+        source = await asyncio.to_thread(getattr, checker, name)
+        await _close(source.new_session())
+
+
+async def load_controller(controller):
+    """Caches the controller's /configs (mixed port, mode)."""
+    if await controller.get_configs() is None:
+        raise ConnectionError(f"{controller.address} unreachable")
+
+
+async def warm_up(checker, controller=None, browser: bool = False,
+                  sources: Iterable[str] = ("ping0", "ippure")) -> Dict[str, Optional[float]]:
+    """
+    Runs the warm-up steps, returns {step: milliseconds} (None for a step that
+    failed; failures are printed and otherwise ignored, the scan will retry).
+    """
+    sources = tuple(sources)
+    steps = {"sources": load_sources(checker, sources)}
+    if controller is not None:
+        steps["controller"] = load_controller(controller)
+    if browser:
+        steps["browser"] = checker.start()
+    hosts = {host for name in sources + (("browser",) if browser else ()) for host in SOURCE_HOSTS.get(name, ())}
+    for host in sorted(hosts):
+        steps[f"dns {host}"] = resolve(host)
+
+    timings: Dict[str, Optional[float]] = {}
+
+    async def timed(name, coro):
+        started = time.monotonic()
+        try:
+            await coro
+            timings[name] = round((time.monotonic() - started) * 1000, 1)
+        except Exception as e:
+            timings[name] = None
+            print(f"[Warmup] {name} failed: {e}")
+
+    await asyncio.gather(*(timed(name, coro) for name, coro in steps.items()))
+    return {name: timings[name] for name in steps}
+
+
+def format_timings(timings: Dict[str, Optional[float]]) -> str:
+    return ", ".join(f"{name} {'failed' if ms is None else f'{ms:.0f}ms'}" for name, ms in timings.items())
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Header, HTTPException, Request
+from typing import Optional
+import gc
+import secrets
+
+from state import state
+from core.memprof import profiler
+
+router = APIRouter(prefix="/api/admin")
+
+LOOPBACK = ("127.0.0.1", "::1", "localhost")
+
+
+def _authorize(request: Request, token: Optional[str]):
+    """With an admin token set (web.py --admin-token) it is required; without one, only local clients get in."""
+    if state.admin_token:
+        if not secrets.compare_digest(token or "", state.admin_token):
+            raise HTTPException(status_code=403, detail="Admin token 无效")
+    elif not request.client or request.client.host not in LOOPBACK:
+        raise HTTPException(status_code=403, detail="仅限本机访问 (或设置 --admin-token)")
+
+
+@router.get("/memory")
+async def memory_report(request: Request, deep: bool = False, top: int = 20, collect: bool = False,
+                        x_admin_token: Optional[str] = Header(None)):
+    """Size gauges of AppState/IPChecker and, if tracing, the top allocating modules and their growth"""
+    _authorize(request, x_admin_token)
+    if collect:
+        gc.collect()  # Growth that survives a collection is a real leak, not garbage
+    return {"gauges": state.memory_gauges(deep), "tracemalloc": profiler.report(top)}
+
+
+@router.post("/memory/start")
+async def memory_start(request: Request, frames: int = 1, x_admin_token: Optional[str] = Header(None)):
+    """Starts tracemalloc (baseline = now); costs CPU and memory while it runs"""
+    _authorize(request, x_admin_token)
+    profiler.start(frames)
+    return {"tracing": True, "frames": frames}
+
+
+@router.post("/memory/baseline")
+async def memory_baseline(request: Request, x_admin_token: Optional[str] = Header(None)):
+    """Growth in later reports is measured from now"""
+    _authorize(request, x_admin_token)
+    if not profiler.running:
+        raise HTTPException(status_code=409, detail="tracemalloc 未启动")
+    profiler.reset_baseline()
+    return {"tracing": True}
+
+
+@router.post("/memory/stop")
+async def memory_stop(request: Request, x_admin_token: Optional[str] = Header(None)):
+    _authorize(request, x_admin_token)
+    profiler.stop()
+    return {"tracing": False}
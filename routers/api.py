@@ -1,22 +1,35 @@
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse
-from ruamel.yaml import YAML, YAMLError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from ruamel.yaml import YAML
 import asyncio
+import time
 import uuid
-import json
-import copy
 import io
 import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
 # Local imports
 from state import state
 from schemas import StartRequest, UpdateNodeRequest, ExportRequest, RecheckRequest
 from core.clash_api import ClashController
+from core.history import node_fingerprint
+from core.ordering import egress_order
+from core.coordinator import WorkQueue
+from core.concurrency import AIMDController, classify, API_ERROR
+from core.tiering import select_for_browser, merge_results
+from core.progress import ProgressCoalescer
+from core.speedtest import SpeedTest, with_speed, DEFAULT_URL as SPEEDTEST_URL
+from utils.rename_patch import build_patch, to_json, to_script
+from utils.json_io import sse_frame
+from utils.yaml_io import get_subscription, YAMLError
 
 router = APIRouter(prefix="/api")
-yaml = YAML()
-yaml.preserve_quotes = True
+
+# Export formats besides the full YAML: format -> (file extension, renderer)
+PATCH_FORMATS = {
+    "patch": (".rename.json", to_json),
+    "script": (".override.js", to_script),
+}
 
 # --- Helper Function to run check in background ---
 async def _run_check(proxies: List[Dict], config: Dict):
@@ -25,13 +38,21 @@ async def _run_check(proxies: List[Dict], config: Dict):
     api_url = config.get("clash_api_url", "http://127.0.0.1:9097")
     api_secret = config.get("clash_api_secret", "")
     selector = config.get("selector_name", "GLOBAL")
-    fast_mode = config.get("fast_mode", True)
+    # Tiered: a fast pass on every node first, browser checks only where they matter
+    tiered = config.get("tiered", False)
+    fast_mode = config.get("fast_mode", True) or tiered
     source = config.get("source", "ping0")
     fallback = config.get("fallback", True)
     headless = config.get("headless", True)
     
     # Update checker headless setting dynamically
     state.checker.headless = headless
+    state.checker.configure_local_db(config.get("local_db", ""), config.get("local_db_skip_datacenter", False))
+    state.checker.configure_browser(pool_size=config.get("browser_pool_size"),
+                                    max_checks=config.get("browser_max_checks"),
+                                    max_rss_mb=config.get("browser_max_rss_mb"))
+    state.checker.fast_budget = config.get("node_timeout", 15)
+    state.checker.browser_budget = config.get("browser_node_timeout", 45)
     
     # Check if empty
     if not proxies:
@@ -42,114 +63,342 @@ async def _run_check(proxies: List[Dict], config: Dict):
     state.total = len(proxies)
     
     # Initialize Clash controller
-    controller = ClashController(api_url, api_secret)
-    
-    try:
-        # Set Global mode for testing
-        await controller.set_mode("global")
-        
-        # Get proxy port from Clash API
-        port = await controller.get_running_port()
-        proxy_url = f"http://127.0.0.1:{port}"
-        print(f"[Web] Using Clash proxy: {proxy_url}")
-        
-    except Exception as e:
-        state.events.append({
-            "type": "error",
-            "node_name": "Clash API",
-            "error": f"无法连接到 Clash API: {e}"
-        })
-        state.is_running = False
-        state.checker.clear_cache() # Clear cache on error
-        state.events.append({"type": "complete", "total": 0})
-        return
+    await state.warmed_up()
+    controller = state.controller(api_url, api_secret, drop_connections=config.get("drop_connections", False))
+    state.checker.follow(controller, reuse=config.get("reuse_connections", True))
     
-    checked_count = 0
+    # Remember the user's mode and selection, they are put back on finish/stop
+    saved_mode, saved_selected = await _save_clash_state(controller, [selector, "GLOBAL"])
+    cancelled = False
     
-    for i, proxy in enumerate(proxies):
-        if not state.is_running:
-            break
-        
-        name = proxy.get("name", f"Node {i}")
-        state.current_node = name
-        
+    try:
         try:
-            # 1. Switch to this node via Clash API
-            print(f"[Web] Switching to: {name}")
-            switched = await controller.switch_proxy(selector, name)
-            
-            if not switched:
-                node_data = {
-                    "id": i,
-                    "original_name": name,
-                    "name": f"{name}【❌ 切换失败】",
-                    "ip": "❓",
-                    "status": "❌ 切换失败",
-                    "proxy_config": proxy
-                }
-                state.nodes[i] = node_data
-                state.events.append({"type": "progress", "progress": checked_count + 1, "total": state.total, "node": node_data})
-                checked_count += 1
-                continue
+            # Set Global mode for testing
+            await controller.set_mode("global")
             
-            # 2. Wait for switch to take effect
-            await asyncio.sleep(1)
+            # Get proxy port from Clash API
+            port = await controller.get_running_port()
+            proxy_url = f"http://127.0.0.1:{port}"
+            print(f"[Web] Using Clash proxy: {proxy_url}")
             
-            # 3. Check IP through Clash proxy
-            if fast_mode:
-                result = await state.checker.check_fast(proxy_url, source=source, fallback=fallback)
-            else:
-                result = await state.checker.check_browser(proxy=proxy_url)
+            # One /proxies call: pick the selector and find names the core doesn't have
+            names = [p.get("name", f"Node {i}") for i, p in enumerate(proxies)]
+            picked, unavailable = await controller.prepare_selector(names, selector)
+            if picked != selector:
+                _, extra = await _save_clash_state(controller, [picked])
+                saved_selected.update(extra)
+                selector = picked
             
-            node_data = {
-                "id": i,
-                "original_name": name,
-                "name": f"{name}{result.get('full_string', '')}",
-                "ip": result.get("ip", "❓"),
-                "risk": result.get("pure_score", "❓"),
-                "bot": result.get("bot_score", "N/A"),  # For non-fast mode
-                "shared": result.get("shared_users", "N/A"),  # For fast mode
-                "type": result.get("ip_attr", "❓"),
-                "native": result.get("ip_src", "❓"),
-                "source": result.get("source", "unknown"),
-                "status": "✅" if result.get("source") == "ping0" else "⚠️ 降级",
-                "proxy_config": proxy
-            }
-            state.nodes[i] = node_data
-            
-            # Push event
-            checked_count += 1
+        except Exception as e:
             state.events.append({
-                "type": "progress",
-                "progress": checked_count,
-                "total": state.total,
-                "node": node_data
+                "type": "error",
+                "node_name": "Clash API",
+                "error": f"无法连接到 Clash API: {e}"
             })
-            
-        except Exception as e:
+            return
+        
+        checked_count = 0
+        
+        # Report nodes that can't be switched to up front, and never try them
+        for i, proxy in enumerate(proxies):
+            name = proxy.get("name", f"Node {i}")
+            if name not in unavailable:
+                continue
             node_data = {
                 "id": i,
                 "original_name": name,
-                "name": f"{name}【❌ Error】",
+                "name": name,
                 "ip": "❓",
-                "status": "❌ 失败",
-                "error": str(e),
+                "status": "❌ 内核中不可用",
+                "error": unavailable[name],
                 "proxy_config": proxy
             }
             state.nodes[i] = node_data
             checked_count += 1
-            state.events.append({
-                "type": "error",
-                "node_name": name,
-                "error": str(e)
-            })
-        
+            state.events.append({"type": "progress", "progress": checked_count, "total": state.total, "node": node_data})
         state.progress = checked_count
+
+        # Nodes sharing a server address usually share the exit IP: check them back-to-back
+        state.checker.traffic.reset()
+        order = await egress_order(proxies) if config.get("egress_ordering", True) else range(len(proxies))
+        # One core checks one node at a time: the limit only drops below 1 (pausing) on trouble
+        aimd = AIMDController(maximum=1) if config.get("adaptive_concurrency", True) else None
+        fast_results = {}  # node id -> first pass result (tiered mode)
+        speedtest = _speedtest(config)
     
-    # Complete
-    state.is_running = False
-    state.checker.clear_cache() # Clear cache on completion
-    state.events.append({"type": "complete", "total": len(state.nodes)})
+        for i in order:
+            proxy = proxies[i]
+            if not state.is_running:
+                break
+        
+            name = proxy.get("name", f"Node {i}")
+            if name in unavailable:
+                continue
+            state.current_node = name
+            started = time.monotonic()
+            cloudflare_before = state.checker.cloudflare_hits
+        
+            try:
+                deadline = state.checker.node_deadline(fast_mode)
+            
+                # 1. Switch to this node via Clash API
+                print(f"[Web] Switching to: {name}")
+                switched = await controller.switch_proxy(selector, name)
+            
+                if not switched:
+                    node_data = {
+                        "id": i,
+                        "original_name": name,
+                        "name": f"{name}【❌ 切换失败】",
+                        "ip": "❓",
+                        "status": "❌ 切换失败",
+                        "proxy_config": proxy
+                    }
+                    state.nodes[i] = node_data
+                    state.events.append({"type": "progress", "progress": checked_count + 1, "total": state.total, "node": node_data})
+                    checked_count += 1
+                    await _pace(aimd, API_ERROR, started)
+                    continue
+            
+                # 2. Wait for switch to take effect
+                await asyncio.sleep(config.get("switch_settle", 1))
+            
+                # 3. Check IP through Clash proxy
+                with state.checker.traffic.node(name):
+                    if fast_mode:
+                        result = await state.checker.check_fast(proxy_url, source=source, fallback=fallback, deadline=deadline)
+                    else:
+                        result = await state.checker.check_browser(proxy=proxy_url, deadline=deadline)
+                    # 4. Optional speed stage, bounded by its own byte/time caps
+                    if speedtest and speedtest.worth_measuring(result):
+                        result = with_speed(result, await speedtest.measure(proxy_url))
+                traffic = state.checker.traffic.of(name)
+            
+                checked_count += 1
+                fast_results[i] = result
+                publish_node_result(i, proxy, result, traffic["sent"] + traffic["received"], checked_count)
+                await _pace(aimd, classify(result, cloudflare=state.checker.cloudflare_hits > cloudflare_before), started)
+            
+            except Exception as e:
+                node_data = {
+                    "id": i,
+                    "original_name": name,
+                    "name": f"{name}【❌ Error】",
+                    "ip": "❓",
+                    "status": "❌ 失败",
+                    "error": str(e),
+                    "proxy_config": proxy
+                }
+                state.nodes[i] = node_data
+                checked_count += 1
+                state.events.append({
+                    "type": "error",
+                    "node_name": name,
+                    "error": str(e)
+                })
+                await _pace(aimd, API_ERROR, started)
+        
+            state.progress = checked_count
+
+        if tiered and state.is_running:
+            await _browser_pass(controller, selector, proxy_url, proxies, fast_results, config, checked_count)
+    
+    except asyncio.CancelledError:
+        # /api/stop cancelled us mid-check; sessions and browser contexts are
+        # closed by their own context managers as the cancellation unwinds
+        cancelled = True
+        print("[Web] Check cancelled")
+        raise
+    finally:
+        await _restore_clash_state(controller, saved_mode, saved_selected)
+        state.is_running = False
+        state.checker.clear_cache() # Clear cache on completion
+        if not cancelled:
+            state.events.append({"type": "complete", "total": len(state.nodes),
+                                  "traffic": state.checker.traffic.summary()})
+
+
+async def _browser_pass(controller: ClashController, selector: str, proxy_url: str, proxies: List[Dict],
+                        fast_results: Dict[int, Dict], config: Dict, checked_count: int):
+    """Tiered mode, second pass: browser checks for the selected nodes, merged into their fast results."""
+    tier_groups = set(config.get("tier_groups") or [])
+    group_nodes = set()
+    for group in state.subscription.proxy_groups if state.subscription else []:
+        if group.get("name") in tier_groups:
+            group_nodes.update(group.get("proxies") or [])
+    selected = select_for_browser(((i, proxies[i].get("name", ""), res) for i, res in fast_results.items()),
+                                  top_k=config.get("tier_top_k", 20), group_nodes=group_nodes,
+                                  ambiguous=config.get("tier_ambiguous", True),
+                                  primary_source=config.get("source", "ping0"))
+    print(f"[Web] Tiered: browser pass for {len(selected)}/{len(fast_results)} nodes")
+    state.total += len(selected)
+    state.events.append({"type": "phase", "phase": "browser", "nodes": len(selected), "total": state.total})
+
+    for i in selected:
+        if not state.is_running:
+            break
+        proxy = proxies[i]
+        name = proxy.get("name", f"Node {i}")
+        state.current_node = f"🌐 {name}"
+        browser = None
+        try:
+            deadline = state.checker.node_deadline(fast_mode=False)
+            if await controller.switch_proxy(selector, name):
+                await asyncio.sleep(config.get("switch_settle", 1))
+                with state.checker.traffic.node(name):
+                    browser = await state.checker.check_browser(proxy=proxy_url, deadline=deadline)
+        except Exception as e:
+            print(f"[Web] Browser pass failed for {name}: {e}")
+
+        # A failed browser check keeps the fast result as it was
+        traffic = state.checker.traffic.of(name)
+        checked_count += 1
+        publish_node_result(i, proxy, merge_results(fast_results[i], browser),
+                            traffic["sent"] + traffic["received"], checked_count)
+        state.progress = checked_count
+
+
+def _speedtest(config: Dict) -> Optional[SpeedTest]:
+    if not config.get("speedtest", False):
+        return None
+    return SpeedTest(config.get("speedtest_url") or SPEEDTEST_URL,
+                     max_bytes=config.get("speedtest_max_bytes", 2_000_000),
+                     timeout=config.get("speedtest_timeout", 8))
+
+
+async def _pace(aimd: Optional[AIMDController], outcome: str, started: float):
+    """Feeds a node's outcome to the AIMD controller, reports adjustments and waits out its pause."""
+    if aimd is None:
+        return
+    elapsed = time.monotonic() - started
+    adjustment = aimd.record(outcome, elapsed)
+    if adjustment:
+        print(f"[Web] Concurrency {adjustment['previous']} -> {adjustment['concurrency']}: {adjustment['reason']}")
+        state.events.append(dict(adjustment, type="concurrency"))
+    pause = aimd.pause(elapsed)
+    if pause:
+        await asyncio.sleep(pause)
+
+
+async def _run_coordinated(proxies: List[Dict], config: Dict):
+    """
+    Coordinator mode: nothing is checked locally. The scan is split into work
+    units that remote workers (worker.py) lease, check against their own core
+    and push back through /api/coordinator; results are merged into the usual
+    node store and SSE stream.
+    """
+    cancelled = False
+    try:
+        order = await egress_order(proxies) if config.get("egress_ordering", True) else range(len(proxies))
+        # Egress-ordered units: nodes sharing an exit IP land on the same worker and hit its cache
+        queue = WorkQueue([(i, proxies[i]) for i in order],
+                          unit_size=config.get("coordinator_unit_size", 10),
+                          lease_seconds=config.get("coordinator_lease_seconds", 120),
+                          max_attempts=config.get("coordinator_max_attempts", 3))
+        # Units in flight across all workers, tuned from the outcomes they report
+        state.concurrency = AIMDController(initial=2, minimum=1, maximum=config.get("coordinator_max_units", 8),
+                                           increase=1, window=queue.unit_size)
+        queue.limit = state.concurrency.in_flight
+        state.coordinator = queue
+        state.current_node = "等待 Worker..."
+        print(f"[Coordinator] {len(proxies)} nodes in {len(queue.pending)} units, waiting for workers")
+
+        while not queue.finished:
+            for i, proxy in queue.reap():
+                state.progress += 1
+                publish_node_failure(i, proxy, "❌ Worker 失败", "No worker returned a result", state.progress)
+            await asyncio.sleep(1)
+
+    except asyncio.CancelledError:
+        cancelled = True
+        print("[Coordinator] Scan cancelled")
+        raise
+    finally:
+        state.coordinator = None
+        state.concurrency = None
+        state.is_running = False
+        if not cancelled:
+            state.events.append({"type": "complete", "total": len(state.nodes)})
+
+
+def publish_node_failure(i: int, proxy: Dict, status: str, error: str, checked_count: int):
+    """Stores a node that couldn't be checked and pushes the progress event."""
+    name = proxy.get("name", f"Node {i}")
+    node_data = {
+        "id": i,
+        "original_name": name,
+        "name": f"{name}【{status}】",
+        "ip": "❓",
+        "status": status,
+        "error": error,
+        "proxy_config": proxy
+    }
+    state.nodes[i] = node_data
+    state.events.append({"type": "progress", "progress": checked_count, "total": state.total, "node": node_data})
+    return node_data
+
+
+def _node_status(result: Dict) -> str:
+    """✅ when ping0 answered, including results the browser pass merged into ("ping0+browser"), else degraded."""
+    return "✅" if result.get("source", "").split("+")[0] == "ping0" else "⚠️ 降级"
+
+
+def publish_node_result(i: int, proxy: Dict, result: Dict, traffic: int, checked_count: int):
+    """Stores a node's check result, records history and pushes the progress event."""
+    name = proxy.get("name", f"Node {i}")
+    node_data = {
+        "id": i,
+        "original_name": name,
+        "name": f"{name}{result.get('full_string', '')}",
+        "ip": result.get("ip", "❓"),
+        "risk": result.get("pure_score", "❓"),
+        "bot": result.get("bot_score", "N/A"),  # For non-fast mode
+        "shared": result.get("shared_users", "N/A"),  # For fast mode
+        "type": result.get("ip_attr", "❓"),
+        "native": result.get("ip_src", "❓"),
+        "source": result.get("source", "unknown"),
+        "speed": result.get("speed_label", ""),
+        "status": _node_status(result),
+        "fingerprint": node_fingerprint(proxy),
+        "traffic": traffic,
+        "proxy_config": proxy
+    }
+    state.nodes[i] = node_data
+    if state.history:
+        state.history.record(proxy, result)
+
+    # Push event
+    state.events.append({
+        "type": "progress",
+        "progress": checked_count,
+        "total": state.total,
+        "node": node_data
+    })
+    return node_data
+
+
+async def _save_clash_state(controller: ClashController, selectors: List[str]):
+    """Returns (mode, {selector: selected node}) of the running core, None for what can't be read."""
+    try:
+        mode = await controller.get_mode()
+        selected = {sel: await controller.get_selected(sel) for sel in dict.fromkeys(selectors)}
+        return mode, selected
+    except Exception:
+        return None, {}
+
+
+async def _restore_clash_state(controller: ClashController, mode, selected: Dict[str, str]):
+    # Shielded so a second cancel (e.g. server shutdown) can't leave the core in global mode
+    async def restore():
+        for sel, node in selected.items():
+            if node:
+                await controller.switch_proxy(sel, node)
+        if mode and mode != "global":
+            await controller.set_mode(mode)
+    try:
+        await asyncio.shield(restore())
+    except Exception as e:
+        print(f"[Web] Failed to restore Clash state: {e}")
 
 
 # --- Routes ---
@@ -158,11 +407,17 @@ async def _run_check(proxies: List[Dict], config: Dict):
 async def validate_yaml(request: StartRequest):
     """Validate YAML format"""
     try:
-        data = yaml.load(request.yaml_content)
-        if not data:
+        if not request.yaml_content.strip():
             return JSONResponse({"valid": False, "error": "YAML 内容为空"}, status_code=400)
         
-        proxies = data.get("proxies", [])
+        # Parsed once and cached by content hash, /api/start reuses it. The whole
+        # document, not only the proxies block: a broken rules/proxy-groups section
+        # would otherwise pass here and only fail at /export
+        subscription = get_subscription(request.yaml_content)
+        data = await asyncio.to_thread(lambda: subscription.data)
+        if not isinstance(data, dict):
+            return JSONResponse({"valid": False, "error": "YAML 顶层必须是映射 (key: value)"}, status_code=400)
+        proxies = subscription.proxies
         if not proxies:
             return JSONResponse({"valid": False, "error": "未找到 proxies 节点"}, status_code=400)
         
@@ -179,8 +434,8 @@ async def start_check(request: StartRequest):
         raise HTTPException(status_code=409, detail="任务正在运行中")
     
     try:
-        data = yaml.load(request.yaml_content)
-        proxies = data.get("proxies", [])
+        subscription = get_subscription(request.yaml_content)
+        proxies = subscription.proxies
         
         if not proxies:
             raise HTTPException(status_code=400, detail="未找到 proxies 节点")
@@ -188,7 +443,8 @@ async def start_check(request: StartRequest):
         # Initialize state
         state.task_id = str(uuid.uuid4())
         state.is_running = True
-        state.original_yaml = data
+        state.subscription = subscription
+        state.coordinator_token = request.config.get("coordinator_token", "")
         state.nodes = []
         state.events = []  # Clear previous events
         state.progress = 0
@@ -215,14 +471,20 @@ async def start_check(request: StartRequest):
                 "type": "",
                 "native": "",
                 "source": "",
+                "speed": "",
                 "status": "pending",
+                "fingerprint": node_fingerprint(p),
                 "proxy_config": p
             })
 
         state.total = len(active_proxies)
         
         # Start background task with filtered proxies
-        asyncio.create_task(_run_check(active_proxies, request.config))
+        # Keep a handle so /api/stop can cancel it immediately
+        if request.config.get("coordinator"):
+            state.task = asyncio.create_task(_run_coordinated(active_proxies, request.config))
+        else:
+            state.task = asyncio.create_task(_run_check(active_proxies, request.config))
         
         return {"task_id": state.task_id, "total": state.total}
     
@@ -231,22 +493,30 @@ async def start_check(request: StartRequest):
 
 
 @router.get("/progress")
-async def progress_stream():
-    """SSE endpoint for progress updates"""
+async def progress_stream(coalesce: int = 0):
+    """
+    SSE endpoint for progress updates.
+    coalesce > 0 (ms) folds progress events into one "batch" frame per interval
+    with compact per-node diffs; other events are passed through in order.
+    """
+    coalescer = ProgressCoalescer() if coalesce > 0 else None
+    interval = max(coalesce, 50) / 1000 if coalescer else 0.1
+
     async def event_generator():
         last_sent = 0
         while True:
             # Send new events
-            while last_sent < len(state.events):
-                event = state.events[last_sent]
-                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
-                last_sent += 1
+            new_events = state.events[last_sent:]
+            last_sent += len(new_events)
+            frames = coalescer.feed(new_events) + coalescer.flush() if coalescer else new_events
+            for event in frames:
+                yield sse_frame(event)
             
             # Check if complete
             if not state.is_running and last_sent >= len(state.events):
                 break
             
-            await asyncio.sleep(0.1)
+            await asyncio.sleep(interval)
     
     return StreamingResponse(
         event_generator(),
@@ -257,19 +527,41 @@ async def progress_stream():
 
 @router.post("/stop")
 async def stop_check():
-    """Stop running task"""
-    if not state.is_running:
+    """Stop running task (scan or recheck) immediately"""
+    task = state.task
+    task_active = task is not None and not task.done()
+    if not state.is_running and not task_active:
         raise HTTPException(status_code=400, detail="没有正在运行的任务")
     
-    state.is_running = False
+    # Terminal event before is_running drops: the SSE stream ends as soon as
+    # it is False and every queued event is sent, and a cancelled scan sends no "complete"
     state.events.append({"type": "stopped"})
+    state.is_running = False
+    if task_active:
+        task.cancel()
+        # Give the task a moment to close sessions and restore the Clash selector/mode
+        await asyncio.wait({task}, timeout=5)
     return {"status": "stopped"}
 
 
+@router.get("/browser")
+async def browser_stats():
+    """Browser pool gauges (RSS, recycles, relaunches) for long-running instances"""
+    return {"browser": state.checker.browser_stats()}
+
+
+@router.get("/traffic")
+async def traffic_stats():
+    """Bytes used by the current/last scan, per source and per node on average"""
+    return state.checker.traffic.summary()
+
+
 @router.get("/nodes")
 async def get_nodes():
-    """Get all nodes"""
-    return {"nodes": state.nodes, "is_running": state.is_running}
+    """Get all nodes (records serialized once per change, see RecordCache)"""
+    body = b'{"nodes":' + state.node_json.listing(state.nodes) + b',"is_running":' + \
+        (b"true" if state.is_running else b"false") + b"}"
+    return Response(content=body, media_type="application/json")
 
 
 @router.put("/nodes/{node_id}")
@@ -278,6 +570,7 @@ async def update_node(node_id: int, request: UpdateNodeRequest):
     for node in state.nodes:
         if node["id"] == node_id:
             node["name"] = request.name
+            state.node_json.invalidate(node)
             return {"status": "updated", "node": node}
     
     raise HTTPException(status_code=404, detail="节点不存在")
@@ -297,7 +590,7 @@ async def delete_node(node_id: int):
 @router.post("/nodes/{node_id}/recheck")
 async def recheck_node(node_id: int, request: RecheckRequest):
     """Recheck a specific node"""
-    if state.is_running:
+    if state.is_running or (state.task is not None and not state.task.done()):
         raise HTTPException(status_code=409, detail="请先停止当前的批量检测任务")
     
     # Find the node
@@ -331,35 +624,54 @@ async def recheck_node(node_id: int, request: RecheckRequest):
     
     # Update checker headless setting dynamically
     state.checker.headless = headless
-   
+    state.checker.configure_local_db(config.get("local_db", ""), config.get("local_db_skip_datacenter", False))
 
 
 
-    controller = ClashController(api_url, api_secret)
+    controller = state.controller(api_url, api_secret, drop_connections=config.get("drop_connections", False))
+    state.checker.follow(controller, reuse=config.get("reuse_connections", True))
+    
+    async def run_recheck():
+        await state.warmed_up()
+        saved_mode, saved_selected = await _save_clash_state(controller, [selector])
+        try:
+            # 1. Switch
+            print(f"[Recheck] Switching to: {original_name}")
+            await controller.set_mode("global")
+            switched = await controller.switch_proxy(selector, original_name)
+            
+            if not switched:
+                 raise Exception("切换节点失败")
+                 
+            # 2. Wait
+            await asyncio.sleep(config.get("switch_settle", 1))
+            
+            # 3. Check IP through Clash proxy
+            port = await controller.get_running_port()
+            proxy_url = f"http://127.0.0.1:{port}"
+            
+            if fast_mode:
+                result = await state.checker.check_fast(proxy_url, source=source, fallback=fallback)
+            else:
+                result = await state.checker.check_browser(proxy=proxy_url)
+            speedtest = _speedtest(config)
+            if speedtest and speedtest.worth_measuring(result):
+                result = with_speed(result, await speedtest.measure(proxy_url))
+            return result
+        finally:
+            await _restore_clash_state(controller, saved_mode, saved_selected)
+    
+    # Run as a tracked task so /api/stop can cancel it
+    task = asyncio.create_task(run_recheck())
+    state.task = task
     
     try:
-        # 1. Switch
-        print(f"[Recheck] Switching to: {original_name}")
-        await controller.set_mode("global")
-        switched = await controller.switch_proxy(selector, original_name)
-        
-        if not switched:
-             raise Exception("切换节点失败")
-             
-        # 2. Wait
-        await asyncio.sleep(1)
- 
-        
-        
-        # 3. Check
-        port = await controller.get_running_port()
-        proxy_url = f"http://127.0.0.1:{port}"
-        
-         # 3. Check IP through Clash proxy
-        if fast_mode:
-            result = await state.checker.check_fast(proxy_url, source=source, fallback=fallback)
-        else:
-            result = await state.checker.check_browser(proxy=proxy_url)
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if task.cancelled():
+                raise HTTPException(status_code=409, detail="检测已停止")
+            raise
         
         # 4. Update Node
         node_data = target_node.copy()
@@ -372,10 +684,13 @@ async def recheck_node(node_id: int, request: RecheckRequest):
             "type": result.get("ip_attr", "❓"),
             "native": result.get("ip_src", "❓"),
             "source": result.get("source", "unknown"),
-            "status": "✅" if result.get("source") == "ping0" else "⚠️ 降级",
+            "speed": result.get("speed_label", ""),
+            "status": _node_status(result),
         })
         
         state.nodes[target_index] = node_data
+        if state.history:
+            state.history.record(target_node["proxy_config"], result)
         
         # 5. Push Event manually to trigger UI update
         event = {
@@ -386,30 +701,69 @@ async def recheck_node(node_id: int, request: RecheckRequest):
         
         return {"status": "success", "node": node_data}
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[Recheck] Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/export")
-async def export_yaml(request: ExportRequest):
-    """Export selected nodes as YAML"""
-    selected_nodes = [n for n in state.nodes if n["id"] in request.node_ids]
-    
-    if not selected_nodes:
-        raise HTTPException(status_code=400, detail="请选择要导出的节点")
-    
-    # Build name mapping for proxy-groups sync
-    name_map = {n["original_name"]: n["name"] for n in selected_nodes}
-    deleted_names = set(n["original_name"] for n in state.nodes if n["id"] not in request.node_ids)
-    
-    # Clone original YAML (Deep Copy to avoid mutating state)
-    export_data = copy.deepcopy(state.original_yaml)
+def _history():
+    if state.history is None:
+        raise HTTPException(status_code=404, detail="历史记录未启用 (web.py --history-db)")
+    return state.history
+
+
+@router.get("/history/nodes/{fingerprint}")
+async def node_history(fingerprint: str, since: float = 0, limit: int = 500):
+    """Check history of one node (fingerprint survives renames)"""
+    rows = await asyncio.to_thread(_history().node_history, fingerprint, since, limit)
+    return {"fingerprint": fingerprint, "history": rows}
+
+
+@router.get("/history/ips/{ip}")
+async def ip_history(ip: str, since: float = 0, limit: int = 500):
+    """Check history of one exit IP across all nodes"""
+    rows = await asyncio.to_thread(_history().ip_history, ip, since, limit)
+    return {"ip": ip, "history": rows}
+
+
+@router.get("/history/stats")
+async def history_stats(since: float = 0):
+    """Aggregate risk stats per provider"""
+    stats = await asyncio.to_thread(_history().provider_stats, since)
+    return {"providers": stats}
+
+
+def _shallow_copy(node):
+    """Copy of a ruamel mapping or sequence, comments and style included, sharing its children."""
+    duplicate = type(node)(node)
+    node.copy_attributes(duplicate)
+    return duplicate
+
+
+def _render_yaml(subscription, selected_nodes: List[Dict], name_map: Dict[str, str], deleted_names: set) -> str:
+    """The subscription with only the selected nodes, renamed, through the ruamel round trip."""
+    # The round-trip document is only parsed here, on first export.
+    try:
+        original = subscription.roundtrip
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"YAML 解析错误: {str(e)}")
+    # Copy only what gets replaced below (a deep copy of the rules took most of
+    # the export time); the shared rest is only read by the dump
+    export_data = _shallow_copy(original)
+    if isinstance(original.get("proxy-groups"), list):
+        export_data["proxy-groups"] = _shallow_copy(original["proxy-groups"])
+        for i, group in enumerate(original["proxy-groups"]):
+            if isinstance(group, dict):
+                export_data["proxy-groups"][i] = _shallow_copy(group)
     
-    # Replace proxies with updated config and name
+    # Replace proxies with updated config and name, keeping the original
+    # round-trip entries (quotes, comments) where possible
+    original_proxies = {p.get("name"): p for p in export_data.get("proxies", [])}
     new_proxies = []
     for node in selected_nodes:
-        proxy = node["proxy_config"].copy()
+        proxy = original_proxies.get(node["original_name"], node["proxy_config"]).copy()
         proxy["name"] = node["name"]
         new_proxies.append(proxy)
     
@@ -427,13 +781,57 @@ async def export_yaml(request: ExportRequest):
                 new_group_proxies.append(proxy_name)  # Keep DIRECT, REJECT, etc.
         group["proxies"] = new_group_proxies
     
-    # Generate YAML
+    # Generate YAML (own instance: exports may run in parallel threads)
+    dumper = YAML()
+    dumper.preserve_quotes = True
     stream = io.StringIO()
-    yaml.dump(export_data, stream)
-    yaml_content = stream.getvalue()
+    dumper.dump(export_data, stream)
+    return stream.getvalue()
+
+
+def _removed_names(kept: set) -> List[str]:
+    """
+    Proxies of the subscription an export leaves out, in document order: not
+    selected, deleted from the table or never checked (skip keywords).
+    """
+    if state.subscription is not None:
+        names = [p.get("name") for p in state.subscription.proxies if isinstance(p, dict)]
+    else:
+        names = [n["original_name"] for n in state.nodes]
+    return [name for name in names if name not in kept]
+
+
+@router.post("/export")
+async def export_yaml(request: ExportRequest):
+    """Export selected nodes as YAML, or only the renames/removals as a patch"""
+    selected_nodes = [n for n in state.nodes if n["id"] in request.node_ids]
     
-    # Save to file system for URL access
+    if not selected_nodes:
+        raise HTTPException(status_code=400, detail="请选择要导出的节点")
+    
+    # Build name mapping for proxy-groups sync
+    name_map = {n["original_name"]: n["name"] for n in selected_nodes}
+    removed = _removed_names(set(name_map))
+    deleted_names = set(removed)
     task_id = state.task_id or str(uuid.uuid4())
+
+    # Patch formats only carry the name changes: O(nodes), the document is never parsed
+    if request.format in PATCH_FORMATS:
+        patch = build_patch(name_map, removed)
+        extension, render = PATCH_FORMATS[request.format]
+        content = render(patch)
+        filename = f"clash_checked_{task_id[:8]}{extension}"
+        with open(os.path.join("exports", filename), "w", encoding="utf-8") as f:
+            f.write(content)
+        return {"yaml": content, "format": request.format, "filename": filename, "url": f"/exports/{filename}"}
+    if request.format != "yaml":
+        raise HTTPException(status_code=400, detail=f"未知导出格式: {request.format}")
+
+    # The round trip (parse on first export, deep copy, dump) takes seconds on
+    # large subscriptions: keep it off the event loop, SSE and polling go on
+    yaml_content = await asyncio.to_thread(_render_yaml, state.subscription, selected_nodes, name_map, deleted_names)
+
+    # Save to file system for URL access
     filename = f"clash_checked_{task_id[:8]}.yaml"
     filepath = os.path.join("exports", filename)
     with open(filepath, "w", encoding="utf-8") as f:
@@ -441,6 +839,7 @@ async def export_yaml(request: ExportRequest):
 
     return {
         "yaml": yaml_content,
+        "format": "yaml",
         "filename": filename,
         "url": f"/exports/{filename}"
     }
@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Header, HTTPException
+from typing import Optional
+import secrets
+
+from state import state
+from schemas import LeaseRequest, HeartbeatRequest, ResultsRequest
+from routers.api import publish_node_result, publish_node_failure
+from core.concurrency import classify
+
+router = APIRouter(prefix="/api/coordinator")
+
+
+def _authorize(token: Optional[str]):
+    if state.coordinator_token and not secrets.compare_digest(token or "", state.coordinator_token):
+        raise HTTPException(status_code=403, detail="Worker token 无效")
+
+
+def _record_outcome(queue, outcome: str, seconds: float):
+    """Feeds the AIMD controller and applies its limit to the leases handed out."""
+    if state.concurrency is None:
+        return
+    adjustment = state.concurrency.record(outcome, seconds)
+    if adjustment:
+        queue.limit = state.concurrency.in_flight
+        print(f"[Coordinator] Units in flight {adjustment['previous']} -> {adjustment['concurrency']}: {adjustment['reason']}")
+        state.events.append(dict(adjustment, type="concurrency"))
+
+
+@router.post("/lease")
+async def lease_unit(request: LeaseRequest, x_worker_token: Optional[str] = Header(None)):
+    """Hands the next work unit to a worker; unit is null when nothing is pending"""
+    _authorize(x_worker_token)
+    queue = state.coordinator
+    if queue is None:
+        return {"unit": None, "finished": True}
+    unit = queue.lease(request.worker_id)
+    if unit:
+        print(f"[Coordinator] {unit['unit_id']} ({len(unit['nodes'])} nodes) -> {request.worker_id}")
+    return {"unit": unit, "finished": queue.finished}
+
+
+@router.post("/heartbeat")
+async def heartbeat(request: HeartbeatRequest, x_worker_token: Optional[str] = Header(None)):
+    """Extends a lease; a 409 tells the worker to drop the unit"""
+    _authorize(x_worker_token)
+    queue = state.coordinator
+    if queue is None or not queue.heartbeat(request.worker_id, request.unit_id, request.lease_id):
+        raise HTTPException(status_code=409, detail="Lease 已失效")
+    return {"status": "ok"}
+
+
+@router.post("/results")
+async def push_results(request: ResultsRequest, x_worker_token: Optional[str] = Header(None)):
+    """Merges the results of a leased unit into the node store and SSE stream"""
+    _authorize(x_worker_token)
+    queue = state.coordinator
+    if queue is None:
+        raise HTTPException(status_code=409, detail="没有正在运行的分布式任务")
+
+    results = {r.id: r for r in request.results}
+    accepted, given_up = queue.complete(request.worker_id, request.unit_id, request.lease_id,
+                                        {i: r.result for i, r in results.items()})
+    if accepted is None:
+        raise HTTPException(status_code=409, detail="Lease 已失效, 结果已丢弃")
+
+    for i, proxy, result in accepted:
+        state.progress += 1
+        publish_node_result(i, proxy, result, results[i].traffic, state.progress)
+        _record_outcome(queue, results[i].outcome or classify(result), results[i].seconds)
+    for i, proxy in given_up:
+        state.progress += 1
+        publish_node_failure(i, proxy, "❌ Worker 失败", "No worker returned a result", state.progress)
+    return {"accepted": len(accepted), "given_up": len(given_up)}
+
+
+@router.get("/status")
+async def coordinator_status():
+    """Queue depth, completed nodes and last-seen time of every worker"""
+    if state.coordinator is None:
+        return {"running": False}
+    stats = dict(state.coordinator.stats(), running=True)
+    if state.concurrency is not None:
+        stats["concurrency"] = state.concurrency.stats()
+    return stats
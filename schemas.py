@@ -10,6 +10,28 @@ class UpdateNodeRequest(BaseModel):
 
 class ExportRequest(BaseModel):
     node_ids: List[int]
+    format: str = "yaml"  # yaml | patch (rename map JSON) | script (mihomo override script)
 
 class RecheckRequest(BaseModel):
     config: Dict[str, Any] = {}
+
+class LeaseRequest(BaseModel):
+    worker_id: str
+
+class HeartbeatRequest(BaseModel):
+    worker_id: str
+    unit_id: str
+    lease_id: str
+
+class WorkerResult(BaseModel):
+    id: int
+    result: Dict[str, Any]
+    traffic: int = 0
+    outcome: str = ""  # core.concurrency outcome, classified by the worker
+    seconds: float = 0
+
+class ResultsRequest(BaseModel):
+    worker_id: str
+    unit_id: str
+    lease_id: str
+    results: List[WorkerResult] = []
@@ -1,17 +1,79 @@
-from typing import Dict, List, Optional
+import asyncio
+from typing import Dict, List, Optional, Tuple
 from core.ip_checker import IPChecker
+from core.clash_api import ClashController
+from core.history import HistoryStore
+from core.coordinator import WorkQueue
+from core.concurrency import AIMDController
+from utils.yaml_io import Subscription, cache_stats as subscription_cache_stats
+from core.memprof import deep_size, rss_bytes
+from utils.json_io import RecordCache
 
 class AppState:
     def __init__(self):
         self.checker = IPChecker(headless=True)
+        self.history_db: Optional[str] = "history.db"  # web.py --history-db, empty/None = no history
+        self._history: Optional[HistoryStore] = None
         self.task_id: Optional[str] = None
         self.is_running: bool = False
+        self.task: Optional[asyncio.Task] = None  # Running scan or recheck
         self.nodes: List[Dict] = []
-        self.original_yaml: Dict = {}
+        self.node_json = RecordCache()  # Serialized state.nodes records for /api/nodes
+        self.subscription: Optional[Subscription] = None
+        self.coordinator: Optional[WorkQueue] = None  # Work units of a distributed scan
+        self.coordinator_token: str = ""  # Shared secret workers must send, empty = open
+        self.admin_token: str = ""  # Required by /api/admin if set, else local clients only
+        self.concurrency: Optional[AIMDController] = None  # Units in flight of a distributed scan
         self.progress: int = 0
         self.total: int = 0
         self.current_node: str = ""
         self.events: List[Dict] = []
+        self.controllers: Dict[Tuple[str, str], ClashController] = {}  # Kept so /configs stays cached between scans
+        self.warmup: Optional[Dict] = None  # web.py --warmup: {"api_url", "secret", "browser"}
+        self.warmup_task: Optional[asyncio.Task] = None
+
+    @property
+    def history(self) -> Optional[HistoryStore]:
+        """Opened on first use, so the path set by web.py applies before any file is created."""
+        if self._history is None and self.history_db:
+            self._history = HistoryStore(self.history_db)
+        return self._history
+
+    def close_history(self):
+        if self._history is not None:
+            self._history.close()
+
+    def controller(self, api_url: str, secret: str = "", drop_connections: bool = False) -> ClashController:
+        """The controller for this address, shared by scans and rechecks."""
+        key = (api_url.rstrip("/"), secret)
+        if key not in self.controllers:
+            self.controllers[key] = ClashController(api_url, secret)
+        controller = self.controllers[key]
+        controller.drop_connections = drop_connections
+        return controller
+
+    async def warmed_up(self):
+        """Waits for a start-up warm-up still in progress, so a scan doesn't race it."""
+        if self.warmup_task and not self.warmup_task.done():
+            await asyncio.wait({self.warmup_task})
+
+    def memory_gauges(self, deep: bool = False) -> Dict:
+        """Sizes of everything the app keeps between requests; deep adds (slow) byte estimates."""
+        gauges = {
+            "rss": rss_bytes(),
+            "events": len(self.events),
+            "nodes": len(self.nodes),
+            "node_json": self.node_json.stats(),
+            "subscription": self.subscription.stats() if self.subscription else None,
+            "subscription_cache": subscription_cache_stats(),
+            "history_pending": self._history.pending if self._history else None,
+            "coordinator": self.coordinator.stats() if self.coordinator else None,
+            "checker": self.checker.memory_gauges(deep),
+        }
+        if deep:
+            gauges["events_bytes"] = deep_size(self.events)
+            gauges["nodes_bytes"] = deep_size(self.nodes)
+        return gauges
 
 # Global instance
 state = AppState()
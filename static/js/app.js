@@ -2,7 +2,21 @@
  * Clash IP Checker - Alpine.js Application
  */
 
+// Windowed node table: only the rows in view (plus OVERSCAN above and below) are in the DOM.
+// ROW_HEIGHT is the row pitch in px, it must match .table-viewport in style.css.
+const ROW_HEIGHT = 40;
+const OVERSCAN = 10;
+// Batch SSE frames every N ms instead of one frame per node
+const PROGRESS_COALESCE_MS = 250;
+// Export formats: CodeMirror mode and download MIME type
+const EXPORT_MODES = { yaml: 'yaml', patch: { name: 'javascript', json: true }, script: 'javascript' };
+const EXPORT_TYPES = { yaml: 'application/x-yaml', patch: 'application/json', script: 'text/javascript' };
+
 function app() {
+    // Non-reactive helpers: node id -> index in nodes, pending scroll frame
+    let nodeIndex = new Map();
+    let scrollFrame = null;
+
     return {
         // State
         yamlContent: '',
@@ -14,9 +28,18 @@ function app() {
             // 可选配置
             source: 'ping0',
             fallback: true,
+            // 分层模式: 先极速检测全部节点, 再对前 K 个/降级节点做浏览器检测
+            tiered: false,
+            tier_top_k: 20,
             output_suffix: '_checked',
             selector_name: 'GLOBAL',
             headless: true,
+            // 测速: IP 检测后测量延迟与下载速度
+            speedtest: false,
+            speedtest_url: '',
+            // 分布式模式: 节点由远程 worker.py 检测
+            coordinator: false,
+            coordinator_token: '',
             // 跳过关键词 (逗号分隔字符串)
             skip_keywords_str: '剩余,重置,到期,有效期,官网,网址,更新,公告,建议'
         },
@@ -25,9 +48,13 @@ function app() {
         progress: 0,
         total: 0,
         currentNode: '',
+        traffic: null,  // 扫描流量汇总 (complete 事件)
+        concurrency: null,  // 最近一次并发调整 {concurrency, reason}
         nodes: [],
         selected: [],
         error: '',
+        scrollTop: 0,
+        viewportHeight: 600,
 
         // Edit state
         editingId: null,
@@ -35,6 +62,7 @@ function app() {
 
         // Export state
         exportedYaml: '',
+        exportFormat: 'yaml',
         exportFilename: '',
         exportUrl: '',
 
@@ -86,6 +114,8 @@ function app() {
         async startCheck() {
             this.error = '';
             this.progress = 0;
+            this.traffic = null;
+            this.concurrency = null;
             this.isRechecking = false;
 
             try {
@@ -147,6 +177,7 @@ function app() {
                     this.nodes = [];
                     this.selected = [];
                 }
+                this.reindexNodes();
 
                 // Connect SSE
                 this.connectSSE();
@@ -162,31 +193,30 @@ function app() {
                 this.eventSource.close();
             }
 
-            this.eventSource = new EventSource('/api/progress');
+            this.eventSource = new EventSource(`/api/progress?coalesce=${PROGRESS_COALESCE_MS}`);
 
             this.eventSource.onmessage = (event) => {
                 const data = JSON.parse(event.data);
 
-                if (data.type === 'progress') {
+                if (data.type === 'batch') {
+                    // Coalesced progress: latest counters + changed fields per node
+                    if (data.progress !== undefined) this.progress = data.progress;
+                    if (data.total !== undefined) this.total = data.total;
+                    if (data.current !== undefined) this.currentNode = data.current;
+                    for (const diff of data.nodes) this.upsertNode(diff, true);
+                } else if (data.type === 'progress') {
                     this.progress = data.progress;
                     this.currentNode = data.node?.original_name || '';
-                    if (data.node) {
-                        const idx = this.nodes.findIndex(n => n.id === data.node.id);
-                        if (idx !== -1) {
-                            this.nodes[idx] = data.node;
-                        } else {
-                            this.nodes.push(data.node);
-                            this.selected.push(data.node.id);
-                        }
-                    }
+                    if (data.node) this.upsertNode(data.node, false);
                 } else if (data.type === 'update') {
                     // Handle single node update
-                    const idx = this.nodes.findIndex(n => n.id === data.node.id);
+                    const idx = this.indexOfNode(data.node.id);
                     if (idx !== -1) {
                         this.nodes.splice(idx, 1, data.node);
                     }
                 } else if (data.type === 'complete') {
                     this.isRunning = false;
+                    this.traffic = data.traffic || null;
                     this.currentNode = '';
                     this.eventSource.close();
                     this.eventSource = null;
@@ -195,6 +225,10 @@ function app() {
                     this.currentNode = '已停止';
                     this.eventSource.close();
                     this.eventSource = null;
+                } else if (data.type === 'phase') {
+                    this.total = data.total;
+                } else if (data.type === 'concurrency') {
+                    this.concurrency = data;
                 } else if (data.type === 'error') {
                     console.error('Node error:', data);
                 }
@@ -229,11 +263,11 @@ function app() {
                     const errMsg = typeof data.detail === 'object' ? JSON.stringify(data.detail) : (data.detail || '重测失败');
                     alert(errMsg);
                     // Revert name on failure if not updated via SSE/Response
-                    const idx = this.nodes.findIndex(n => n.id === node.id);
+                    const idx = this.indexOfNode(node.id);
                     if (idx !== -1) this.nodes[idx].name = originalName;
                 } else {
                     const data = await res.json();
-                    const idx = this.nodes.findIndex(n => n.id === data.node.id);
+                    const idx = this.indexOfNode(data.node.id);
                     if (idx !== -1) {
                         this.nodes.splice(idx, 1, data.node);
                     }
@@ -241,7 +275,7 @@ function app() {
 
             } catch (e) {
                 alert('请求失败: ' + e);
-                const idx = this.nodes.findIndex(n => n.id === node.id);
+                const idx = this.indexOfNode(node.id);
                 if (idx !== -1) this.nodes[idx].name = originalName;
             } finally {
                 this.isRechecking = false;
@@ -249,9 +283,11 @@ function app() {
         },
 
         async stopCheck() {
+            // Before the request: the stream may end while /api/stop waits for the task,
+            // and onerror must then close it instead of reconnecting (which replays every event)
+            this.isRunning = false;
             try {
                 await fetch('/api/stop', { method: 'POST' });
-                this.isRunning = false;
             } catch (e) {
                 console.error('Stop failed:', e);
             }
@@ -312,11 +348,88 @@ function app() {
                 await fetch(`/api/nodes/${node.id}`, { method: 'DELETE' });
                 this.nodes = this.nodes.filter(n => n.id !== node.id);
                 this.selected = this.selected.filter(id => id !== node.id);
+                this.reindexNodes();
             } catch (e) {
                 console.error('Delete failed:', e);
             }
         },
 
+        // Node lookup
+        reindexNodes() {
+            nodeIndex = new Map(this.nodes.map((n, i) => [n.id, i]));
+        },
+
+        indexOfNode(id) {
+            const idx = nodeIndex.get(id);
+            if (idx !== undefined && this.nodes[idx]?.id === id) return idx;
+            this.reindexNodes();  // Stale after a reorder/removal
+            return nodeIndex.has(id) ? nodeIndex.get(id) : -1;
+        },
+
+        // merge: node is a diff (batch frame), null fields were removed
+        upsertNode(node, merge) {
+            const idx = this.indexOfNode(node.id);
+            if (idx === -1) {
+                nodeIndex.set(node.id, this.nodes.length);
+                this.nodes.push(node);
+                this.selected.push(node.id);
+                return;
+            }
+            if (!merge) {
+                this.nodes[idx] = node;
+                return;
+            }
+            const merged = { ...this.nodes[idx], ...node };
+            for (const key in node) {
+                if (node[key] === null) delete merged[key];
+            }
+            this.nodes[idx] = merged;
+        },
+
+        // Windowed table
+        onTableScroll(e) {
+            const el = e.target;
+            if (scrollFrame) return;  // At most one re-render per frame
+            scrollFrame = requestAnimationFrame(() => {
+                scrollFrame = null;
+                this.scrollTop = el.scrollTop;
+                this.viewportHeight = el.clientHeight;
+            });
+        },
+
+        get windowStart() {
+            return Math.max(0, Math.floor(this.scrollTop / ROW_HEIGHT) - OVERSCAN);
+        },
+
+        get windowEnd() {
+            const rows = Math.ceil(this.viewportHeight / ROW_HEIGHT) + 2 * OVERSCAN;
+            return Math.min(this.nodes.length, this.windowStart + rows);
+        },
+
+        get visibleNodes() {
+            return this.nodes.slice(this.windowStart, this.windowEnd);
+        },
+
+        get padTop() {
+            return this.windowStart * ROW_HEIGHT;
+        },
+
+        get padBottom() {
+            return (this.nodes.length - this.windowEnd) * ROW_HEIGHT;
+        },
+
+        formatBytes(size) {
+            if (size < 1024) return `${size}B`;
+            if (size < 1024 * 1024) return `${(size / 1024).toFixed(1)}KB`;
+            return `${(size / 1024 / 1024).toFixed(1)}MB`;
+        },
+
+        trafficSummary() {
+            if (!this.traffic) return '';
+            const t = this.traffic;
+            return `流量 ↑${this.formatBytes(t.sent)} ↓${this.formatBytes(t.received)} · 平均 ${this.formatBytes(t.per_node)}/节点`;
+        },
+
         // Risk color class based on percentage (Matches Python get_emoji logic)
         getRiskClass(risk) {
             if (!risk || risk === '❓' || risk === 'N/A') return '';
@@ -355,7 +468,8 @@ function app() {
         },
 
         // Export
-        async exportYaml() {
+        // format: 'yaml' (full config), 'patch' (rename map JSON) or 'script' (mihomo override script)
+        async exportYaml(format = 'yaml') {
             if (this.selected.length === 0) {
                 alert('请先选择要导出的节点');
                 return;
@@ -365,10 +479,12 @@ function app() {
                 const res = await fetch('/api/export', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ node_ids: this.selected })
+                    body: JSON.stringify({ node_ids: this.selected, format })
                 });
 
                 const data = await res.json();
+                if (!res.ok) throw new Error(data.detail || res.statusText);
+                this.exportFormat = data.format;
                 this.exportedYaml = data.yaml;
                 this.exportFilename = data.filename;
                 this.exportUrl = data.url;
@@ -382,7 +498,7 @@ function app() {
                     // Clear and recreate to avoid stale content
                     el.innerHTML = '';
                     this.exportEditor = CodeMirror(el, {
-                        mode: 'yaml',
+                        mode: EXPORT_MODES[this.exportFormat],
                         theme: 'material-darker',
                         lineNumbers: true,
                         readOnly: true,
@@ -398,7 +514,7 @@ function app() {
         },
 
         downloadYaml() {
-            const blob = new Blob([this.exportedYaml], { type: 'application/x-yaml' });
+            const blob = new Blob([this.exportedYaml], { type: EXPORT_TYPES[this.exportFormat] });
             const url = URL.createObjectURL(blob);
             const a = document.createElement('a');
             a.href = url;
@@ -0,0 +1,169 @@
+"""
+BrowserSource._check_with against a fake browser (no Chromium needed).
+
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+pytest.importorskip("playwright")
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from core.sources.browser import RSS_MIN_CHECKS, BrowserSource
+
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+
+
+class FakePage:
+    """Records the calls of _check_with; wait_for_selector blocks, times out or returns."""
+
+    def __init__(self, selector: str = "block"):
+        self.selector = selector
+        self.calls = []
+        self.waiting = asyncio.Event()
+        self.closed = False
+
+    def on(self, event, handler):
+        pass
+
+    async def goto(self, url, **kwargs):
+        self.calls.append("goto")
+
+    async def wait_for_selector(self, selector, timeout=None):
+        self.calls.append("wait_for_selector")
+        self.waiting.set()
+        if self.selector == "timeout":
+            raise PlaywrightTimeoutError("Timeout exceeded")
+        if self.selector == "block":
+            await asyncio.sleep(3600)
+
+    async def wait_for_timeout(self, ms):
+        self.calls.append("wait_for_timeout")
+
+    async def inner_text(self, selector):
+        self.calls.append("inner_text")
+        with open(os.path.join(FIXTURES, "ippure_normal.txt"), encoding="utf-8") as f:
+            return f.read()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self, page: FakePage):
+        self.page = page
+        self.closed = False
+
+    async def route(self, pattern, handler):
+        pass
+
+    async def new_page(self):
+        return self.page
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self, page: FakePage):
+        self.context = FakeContext(page)
+
+    async def new_context(self, **kwargs):
+        return self.context
+
+
+def test_cancel_while_waiting_for_scores():
+    # Not headless: a swallowed cancel would also sit through the 5s debug pause
+    source = BrowserSource(headless=False)
+    page = FakePage("block")
+    browser = FakeBrowser(page)
+
+    async def run():
+        task = asyncio.create_task(source._check_with(browser, None, timeout=20))
+        await asyncio.wait_for(page.waiting.wait(), 1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(task, 1)
+
+    asyncio.run(run())
+    assert page.calls == ["goto", "wait_for_selector"]
+    assert page.closed and browser.context.closed
+
+
+def test_selector_timeout_still_parses_page():
+    page = FakePage("timeout")
+    result = asyncio.run(BrowserSource()._check_with(FakeBrowser(page), None, timeout=20))
+    assert page.calls == ["goto", "wait_for_selector", "wait_for_timeout", "inner_text"]
+    assert result["error"] is None and result["pure_score"] == "12%"
+
+
+# --- Pool recycling ---
+
+class FakeChromium:
+    def __init__(self):
+        self.launched = 0
+
+    async def launch(self, **kwargs):
+        self.launched += 1
+        return FakeProcess()
+
+
+class FakeProcess:
+    def on(self, event, handler):
+        pass
+
+    async def close(self):
+        pass
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = FakeChromium()
+
+
+class MeteredSource(BrowserSource):
+    """BrowserSource on a fake Playwright, with the RSS set by the test."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.playwright = FakePlaywright()
+        self.rss = 0.0
+
+    def rss_mb(self):
+        return self.rss
+
+
+def checks(source: BrowserSource, count: int):
+    async def run():
+        for _ in range(count):
+            await source._release(await source._acquire())
+    asyncio.run(run())
+
+
+def test_pool_over_rss_limit_at_launch_is_not_relaunched():
+    source = MeteredSource(max_rss_mb=500, max_checks=0)
+    source.rss = 800  # Fresh browser already over the limit
+    checks(source, 100)
+    assert source.playwright.chromium.launched == 1 and source.recycles == 0
+    assert source.rss_baseline == 800
+
+
+def test_rss_growth_recycles_after_min_checks():
+    source = MeteredSource(max_rss_mb=500, max_checks=0)
+    source.rss = 300
+    checks(source, 1)
+    source.rss = 900  # Grew past the limit
+    checks(source, RSS_MIN_CHECKS - 1)
+    assert source.recycles == 0
+    checks(source, 1)
+    assert source.recycles == 1 and source.playwright.chromium.launched == 2
+    # The relaunched browser sets the new baseline
+    checks(source, RSS_MIN_CHECKS * 2)
+    assert source.recycles == 1 and source.rss_baseline == 900
@@ -0,0 +1,263 @@
+"""
+Distributed scans: the WorkQueue lease protocol (with a fake clock), the
+worker's result delivery, and a scan of the coordinator router by two
+Worker instances on localhost, each with its own fake Clash core.
+
+    python -m pytest tests
+"""
+import asyncio
+import contextlib
+import os
+import socket
+import sys
+import time
+
+import aiohttp
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import clash_automator
+from benchmarks.fakes import FakeChecker, FakeClash, node_names
+from core.clash_api import ClashController
+from core.coordinator import WorkQueue
+from worker import Worker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_queue(count=5, unit_size=2, lease_seconds=60, max_attempts=3):
+    clock = Clock()
+    nodes = [(i, {"name": f"node {i}"}) for i in range(count)]
+    return WorkQueue(nodes, unit_size=unit_size, lease_seconds=lease_seconds,
+                     max_attempts=max_attempts, clock=clock), clock
+
+
+def ids(unit):
+    return [node["id"] for node in unit["nodes"]]
+
+
+# --- WorkQueue ---
+
+def test_units_and_lease():
+    queue, _ = make_queue(count=5, unit_size=2)
+    units = [queue.lease("w1"), queue.lease("w2"), queue.lease("w1")]
+    assert [ids(u) for u in units] == [[0, 1], [2, 3], [4]]
+    assert queue.lease("w2") is None
+    assert not queue.finished
+
+
+def test_limit_caps_units_in_flight():
+    queue, _ = make_queue(count=6, unit_size=2)
+    queue.limit = 1
+    assert queue.lease("w1") is not None
+    assert queue.lease("w2") is None
+
+
+def test_heartbeat_renews_lease():
+    queue, clock = make_queue(lease_seconds=60)
+    unit = queue.lease("w1")
+    clock.now += 50
+    assert queue.heartbeat("w1", unit["unit_id"], unit["lease_id"])
+    clock.now += 50  # 100s after the lease, 50s after the renewal
+    assert queue.reap() == []
+    assert unit["unit_id"] in queue.leased
+
+
+def test_expired_lease_is_requeued_first():
+    queue, clock = make_queue(count=4, unit_size=2, lease_seconds=60)
+    lost = queue.lease("w1")
+    clock.now += 61
+    assert queue.reap() == []
+    assert not queue.leased
+    again = queue.lease("w2")
+    assert ids(again) == ids(lost) and again["unit_id"] != lost["unit_id"]
+    assert queue.attempts == {0: 1, 1: 1}
+
+
+def test_stale_lease_is_rejected():
+    queue, clock = make_queue(count=2, unit_size=2, lease_seconds=60)
+    lost = queue.lease("w1")
+    clock.now += 61
+    queue.reap()
+    again = queue.lease("w2")
+
+    assert not queue.heartbeat("w1", lost["unit_id"], lost["lease_id"])
+    accepted, given_up = queue.complete("w1", lost["unit_id"], lost["lease_id"], {0: {}, 1: {}})
+    assert accepted is None and given_up == []
+    # The current holder, but with a forged lease id or under another worker's name
+    assert queue.complete("w2", again["unit_id"], "0" * 16, {0: {}})[0] is None
+    assert queue.complete("w1", again["unit_id"], again["lease_id"], {0: {}})[0] is None
+
+    accepted, _ = queue.complete("w2", again["unit_id"], again["lease_id"], {0: {"ip": "a"}, 1: {"ip": "b"}})
+    assert [(i, result) for i, _, result in accepted] == [(0, {"ip": "a"}), (1, {"ip": "b"})]
+    assert queue.finished and queue.completed == 2
+
+
+def test_missing_results_are_retried():
+    queue, _ = make_queue(count=2, unit_size=2)
+    unit = queue.lease("w1")
+    accepted, given_up = queue.complete("w1", unit["unit_id"], unit["lease_id"], {0: {}})
+    assert [i for i, _, _ in accepted] == [0] and given_up == []
+    assert ids(queue.lease("w1")) == [1]
+
+
+def test_attempt_cap():
+    queue, clock = make_queue(count=2, unit_size=2, lease_seconds=60, max_attempts=2)
+    queue.lease("w1")
+    clock.now += 61
+    assert queue.reap() == []
+    unit = queue.lease("w2")
+    # Second failure: node 1 has no result and reaches max_attempts
+    accepted, given_up = queue.complete("w2", unit["unit_id"], unit["lease_id"], {0: {}})
+    assert [i for i, _, _ in accepted] == [0]
+    assert [i for i, _ in given_up] == [1]
+    assert queue.finished and queue.given_up == 1
+
+
+# --- Worker result delivery ---
+
+class FlakyWorker(Worker):
+    """Worker whose results post fails `failures` times before it goes through."""
+
+    def __init__(self, failures: int):
+        self.worker_id = "w1"
+        self.failures = failures
+        self.posts = 0
+
+    async def _post(self, session, path, payload):
+        self.posts += 1
+        if self.posts <= self.failures:
+            raise aiohttp.ClientConnectionError("coordinator down")
+        return 200, {"accepted": len(payload["results"]), "given_up": 0}
+
+
+def lease(seconds: float, renewed_ago: float = 0):
+    return {"unit_id": "u0", "lease_id": "l0", "lease_seconds": seconds, "renewed_at": time.monotonic() - renewed_ago}
+
+
+def test_results_retried_until_delivered():
+    worker = FlakyWorker(failures=1)
+    asyncio.run(worker._post_results(None, lease(60), [], asyncio.Event()))
+    assert worker.posts == 2
+
+
+def test_results_given_up_when_lease_expires():
+    worker = FlakyWorker(failures=100)
+    asyncio.run(worker._post_results(None, lease(60, renewed_ago=59.5), [], asyncio.Event()))
+    assert worker.posts == 1
+
+
+def test_results_given_up_when_lease_lost():
+    worker = FlakyWorker(failures=100)
+    lost = asyncio.Event()
+    lost.set()
+    asyncio.run(worker._post_results(None, lease(60), [], lost))
+    assert worker.posts == 1
+
+
+# --- Two workers against the router on localhost ---
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def coordinator(nodes, token="", unit_size=3):
+    """The coordinator router of web.py, served by uvicorn, with a distributed scan of nodes running."""
+    uvicorn = pytest.importorskip("uvicorn")
+    pytest.importorskip("fastapi")
+    from fastapi import FastAPI
+    from routers.coordinator import router
+    from state import state
+
+    state.history_db = None
+    state.nodes = [{} for _ in nodes]
+    state.events = []
+    state.progress, state.total = 0, len(nodes)
+    state.coordinator = WorkQueue(list(enumerate(nodes)), unit_size=unit_size)
+    state.coordinator_token = token
+    state.concurrency = None
+
+    app = FastAPI()
+    app.include_router(router)
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}", state
+    finally:
+        server.should_exit = True
+        await serving
+        state.coordinator = None
+        state.coordinator_token = ""
+
+
+def test_two_workers_report_every_node_once(monkeypatch):
+    monkeypatch.setattr(clash_automator, "SWITCH_SETTLE", 0)
+    names = node_names(20)
+    nodes = [{"name": name, "type": "ss"} for name in names]
+
+    async def run():
+        cores = [await FakeClash(names).serve(port=0) for _ in range(2)]
+        try:
+            async with coordinator(nodes, token="secret") as (url, state):
+                workers = []
+                for i, core in enumerate(cores):
+                    port = core.addresses[0][1]
+                    controller = ClashController(f"http://127.0.0.1:{port}")
+                    checker = FakeChecker(latency=0.005, seed=i, fast_budget=5)
+                    workers.append(Worker(url, controller, checker, worker_id=f"w{i}", token="secret",
+                                          fast_mode=True, poll_interval=0.05))
+                await asyncio.wait_for(asyncio.gather(*(w.run(exit_when_done=True) for w in workers)), 60)
+                return state, state.coordinator.stats()["workers"]
+        finally:
+            for core in cores:
+                await core.cleanup()
+
+    state, workers = asyncio.run(run())
+    reported = [event["node"]["original_name"] for event in state.events if event["type"] == "progress"]
+    assert sorted(reported) == sorted(names)
+    assert [node["original_name"] for node in state.nodes] == names
+    assert all(node["ip"].startswith("198.51.") for node in state.nodes)
+    assert set(workers) == {"w0", "w1"} and all(w["nodes"] > 0 for w in workers.values())
+
+
+def test_router_rejects_bad_token_and_stale_lease():
+    async def run():
+        async with coordinator([{"name": "a"}, {"name": "b"}], token="secret", unit_size=2) as (url, state):
+            async with aiohttp.ClientSession() as session:
+                async def post(path, payload, token="secret"):
+                    async with session.post(f"{url}/api/coordinator/{path}", json=payload,
+                                            headers={"X-Worker-Token": token}) as resp:
+                        return resp.status, await resp.json()
+
+                assert (await post("lease", {"worker_id": "w1"}, token="wrong"))[0] == 403
+                status, data = await post("lease", {"worker_id": "w1"})
+                assert status == 200
+                unit = data["unit"]
+                stale = {"worker_id": "w1", "unit_id": unit["unit_id"], "lease_id": "0" * 16}
+                assert (await post("heartbeat", stale))[0] == 409
+                assert (await post("results", dict(stale, results=[])))[0] == 409
+                lease = dict(stale, lease_id=unit["lease_id"])
+                assert (await post("heartbeat", lease))[0] == 200
+                results = [{"id": node["id"], "result": {"ip": "192.0.2.1", "source": "ping0"}}
+                           for node in unit["nodes"]]
+                assert await post("results", dict(lease, results=results)) == (200, {"accepted": 2, "given_up": 0})
+                # Delivered once: a replay of the same results is refused
+                assert (await post("results", dict(lease, results=results)))[0] == 409
+                return state
+
+    state = asyncio.run(run())
+    assert [node["status"] for node in state.nodes] == ["✅", "✅"]
@@ -0,0 +1,93 @@
+"""
+/api/export: the patch and override-script formats describe the same proxy
+set as the YAML export of the same selection.
+
+    python -m pytest tests
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+pytest.importorskip("fastapi")
+
+from routers.api import delete_node, export_yaml
+from schemas import ExportRequest
+from state import state
+from utils.rename_patch import apply_patch_stream
+from utils.yaml_io import get_subscription
+
+SUBSCRIPTION = """\
+proxies:
+  - {name: "HK 01", type: ss, server: 192.0.2.1, port: 8388, cipher: aes-128-gcm, password: "x"}
+  - {name: "剩余流量：10 GB", type: ss, server: 192.0.2.2, port: 8388, cipher: aes-128-gcm, password: "x"}
+  - {name: "JP 01", type: ss, server: 192.0.2.3, port: 8388, cipher: aes-128-gcm, password: "x"}
+  - {name: "US 01", type: ss, server: 192.0.2.4, port: 8388, cipher: aes-128-gcm, password: "x"}
+  - {name: "SG 01", type: ss, server: 192.0.2.5, port: 8388, cipher: aes-128-gcm, password: "x"}
+proxy-groups:
+  - name: Proxy
+    type: select
+    proxies: ["HK 01", "剩余流量：10 GB", "JP 01", "US 01", "SG 01", DIRECT]
+  - name: Auto
+    type: url-test
+    proxies: ["JP 01", "SG 01"]
+rules:
+  - DOMAIN-SUFFIX,example.com,Proxy
+  - MATCH,DIRECT
+"""
+
+
+@pytest.fixture
+def scanned(tmp_path, monkeypatch):
+    """A finished scan of SUBSCRIPTION: the traffic-info node was skipped by keyword."""
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("exports")
+    subscription = get_subscription(SUBSCRIPTION)
+    checked = [p for p in subscription.proxies if "剩余" not in p["name"]]
+    state.subscription = subscription
+    state.task_id = "test-export"
+    state.nodes = [{"id": i, "original_name": p["name"], "name": f"{p['name']}【⚪ 住宅|原生】", "proxy_config": p}
+                   for i, p in enumerate(checked)]
+    yield
+    state.subscription = None
+    state.nodes = []
+
+
+def export(node_ids, fmt):
+    return asyncio.run(export_yaml(ExportRequest(node_ids=node_ids, format=fmt)))["yaml"]
+
+
+def patched(patch):
+    target = io.StringIO()
+    apply_patch_stream(io.StringIO(SUBSCRIPTION), target, patch)
+    return yaml.safe_load(target.getvalue())
+
+
+@pytest.mark.parametrize("node_ids", [[0, 1, 2, 3], [0, 2], [1]])
+def test_patch_matches_yaml_export(scanned, node_ids):
+    exported = yaml.safe_load(export(node_ids, "yaml"))
+    assert patched(json.loads(export(node_ids, "patch"))) == exported
+    # Skipped and unselected nodes leave no dangling group members
+    names = {p["name"] for p in exported["proxies"]}
+    for group in exported["proxy-groups"]:
+        assert set(group["proxies"]) <= names | {"DIRECT"}
+
+
+def test_patch_removes_deleted_node(scanned):
+    asyncio.run(delete_node(2))  # "US 01"
+    ids = [node["id"] for node in state.nodes]
+    patch = json.loads(export(ids, "patch"))
+    assert patch["remove"] == ["剩余流量：10 GB", "US 01"]
+    assert patched(patch) == yaml.safe_load(export(ids, "yaml"))
+
+
+def test_script_carries_same_removals(scanned):
+    script = export([0, 1], "script")
+    assert 'new Set(["剩余流量：10 GB", "US 01", "SG 01"])' in script
@@ -0,0 +1,57 @@
+"""
+Start-up must not import Playwright or curl_cffi (see benchmarks/import_bench.py).
+
+    python -m pytest tests
+
+The entry modules are imported in a fresh interpreter with sentinel
+playwright/curl_cffi packages first on the path, so an eager import is caught
+whether or not the real packages are installed.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_MODULES = ("state", "clash_automator", "core.ip_checker")
+# Package -> submodules the sources import from
+LAZY = {"playwright": ("async_api",), "curl_cffi": ("requests",)}
+
+SENTINEL = "def __getattr__(name):\n    return object()\n"
+
+PROBE = """
+import json, sys
+sys.path[:0] = [{sentinels!r}, {root!r}]
+import {module}
+print(json.dumps(sorted(name for name in sys.modules if name.split(".")[0] in {lazy!r})))
+"""
+
+
+@pytest.fixture(scope="module")
+def sentinels(tmp_path_factory):
+    path = tmp_path_factory.mktemp("sentinels")
+    for package, submodules in LAZY.items():
+        (path / package).mkdir()
+        for module in ("__init__",) + submodules:
+            (path / package / f"{module}.py").write_text(SENTINEL)
+    return str(path)
+
+
+def imported_lazy(module: str, sentinels: str, tmp_path) -> list:
+    """LAZY modules in sys.modules after `import module` in a fresh interpreter (cwd: an empty dir)."""
+    code = PROBE.format(sentinels=sentinels, root=ROOT, module=module, lazy=tuple(LAZY))
+    proc = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ENTRY_MODULES)
+def test_sources_not_imported_at_start(module, sentinels, tmp_path):
+    assert imported_lazy(module, sentinels, tmp_path) == []
+
+
+def test_sentinels_detect_eager_import(sentinels, tmp_path):
+    assert imported_lazy("core.sources.ping0", sentinels, tmp_path) == ["curl_cffi", "curl_cffi.requests"]
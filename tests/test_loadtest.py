@@ -0,0 +1,36 @@
+"""
+Smoke run of benchmarks/loadtest.py: a tiny scan against the fakes, so the
+script and the endpoints it drives keep working. The thresholds are loose,
+timings are the benchmark's business.
+
+    python -m pytest tests
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for module in ("fastapi", "uvicorn", "jinja2"):
+    pytest.importorskip(module)
+
+
+def test_loadtest_smoke(tmp_path):
+    report_path = tmp_path / "report.json"
+    proc = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "loadtest.py"),
+         "--nodes", "20", "--sse", "2", "--pollers", "1", "--poll-interval", "0.2",
+         "--exporters", "1", "--export-interval", "0.3", "--rechecks", "2", "--check-latency", "0.005",
+         "--max-poll-p95", "10000", "--max-export-p95", "10000", "--max-recheck-p95", "10000",
+         "--max-lag-p95", "10000", "--save", str(report_path)],
+        cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+
+    report = json.loads(report_path.read_text())
+    assert report["sse"]["incomplete"] == 0 and report["errors"] == {}
+    assert report["lag_ms"]["count"] == 2 * 20
+    assert report["latency_ms"]["recheck"]["count"] == 2
+    assert report["latency_ms"]["nodes"]["count"] > 0
@@ -0,0 +1,130 @@
+"""
+Regression tests of core.sources.parsers against the pages in tests/fixtures.
+
+    python -m pytest tests
+
+The fixtures cover a normal result, a datacenter/broadcast result, a
+Cloudflare challenge and a redesigned (layout-changed) page per site; a
+changed layout must leave the placeholders in place rather than pick up an
+unrelated label.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.sources.parsers import (PING0_TAIL, WINDOW, Ping0Stream, is_cloudflare_challenge, parse_ippure_text,
+                                  parse_ping0, ping0_complete)
+
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+
+
+def fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+PING0_EXPECTED = {
+    "ping0_normal.html": {"ip": "203.0.113.45", "ip_attr": "住宅", "ip_src": "原生", "pure_score": "15%",
+                          "shared_users": "1-10"},
+    # No window.ip: the IP comes from the /ping/ link, shared users from the bar text
+    "ping0_idc.html": {"ip": "45.76.12.34", "ip_attr": "机房", "ip_src": "广播", "pure_score": "70%",
+                       "shared_users": "100-1000+"},
+    "ping0_layout_changed.html": {"ip": "203.0.113.45", "ip_attr": "❓", "ip_src": "❓", "pure_score": "❓",
+                                  "shared_users": "N/A"},
+    "ping0_cloudflare.html": {"ip": "❓", "ip_attr": "❓", "ip_src": "❓", "pure_score": "❓", "shared_users": "N/A"},
+}
+
+IPPURE_EXPECTED = {
+    "ippure_normal.txt": {"ip": "203.0.113.45", "ip_attr": "住宅", "ip_src": "原生", "pure_score": "12%",
+                          "bot_score": "3.5%"},
+    "ippure_datacenter.txt": {"ip": "45.76.12.34", "ip_attr": "机房", "ip_src": "广播", "pure_score": "68%",
+                              "bot_score": "42%"},
+    "ippure_layout_changed.txt": {"ip": "203.0.113.45", "ip_attr": "❓", "ip_src": "❓", "pure_score": "❓",
+                                  "bot_score": "❓"},
+}
+
+
+@pytest.mark.parametrize("name", sorted(PING0_EXPECTED))
+def test_parse_ping0(name):
+    assert parse_ping0(fixture(name)) == PING0_EXPECTED[name]
+
+
+@pytest.mark.parametrize("name", sorted(IPPURE_EXPECTED))
+def test_parse_ippure_text(name):
+    assert parse_ippure_text(fixture(name)) == IPPURE_EXPECTED[name]
+
+
+@pytest.mark.parametrize("name,expected", [
+    ("ping0_cloudflare.html", True),
+    ("ping0_normal.html", False),
+    ("ping0_idc.html", False),
+    ("ping0_layout_changed.html", False),
+])
+def test_is_cloudflare_challenge(name, expected):
+    assert is_cloudflare_challenge(fixture(name)) is expected
+
+
+def test_ping0_complete():
+    html = fixture("ping0_normal.html")
+    assert ping0_complete(html)
+    # Cut right after the last field: its value may not be in yet
+    assert not ping0_complete(html[:html.index("usecount=") + 20])
+    # Without every anchor the whole page has to be read
+    assert not ping0_complete(fixture("ping0_layout_changed.html"))
+
+
+def read_in_chunks(html: str, size: int):
+    """What Ping0Source reads of html arriving size chars at a time: (text read, stopped early)."""
+    stream = Ping0Stream()
+    for start in range(0, len(html), size):
+        if stream.feed(html[start:start + size]):
+            return stream.text, True
+    return stream.text, False
+
+
+def test_tail_covers_parse_window():
+    assert PING0_TAIL >= WINDOW
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 1500])
+def test_ping0_stream_normal(size):
+    html = fixture("ping0_normal.html")
+    text, early = read_in_chunks(html, size)
+    assert early and len(text) < len(html)
+    assert parse_ping0(text) == PING0_EXPECTED["ping0_normal.html"]
+
+
+@pytest.mark.parametrize("size", [1, 7, 64])
+def test_ping0_stream_challenge(size):
+    text, early = read_in_chunks(fixture("ping0_cloudflare.html"), size)
+    assert early and is_cloudflare_challenge(text)
+
+
+@pytest.mark.parametrize("name", ["ping0_idc.html", "ping0_layout_changed.html"])
+def test_ping0_stream_reads_to_end_without_every_anchor(name):
+    html = fixture(name)
+    text, early = read_in_chunks(html, 64)
+    assert not early and text == html
+    assert parse_ping0(text) == PING0_EXPECTED[name]
+
+
+def test_ping0_stream_matches_ping0_complete():
+    html = fixture("ping0_normal.html")
+    stream = Ping0Stream()
+    for start in range(0, len(html), 97):
+        stream.feed(html[start:start + 97])
+        assert stream.complete == ping0_complete(stream.text)
+
+
+def test_ping0_stream_waits_for_values_past_marker():
+    # The shared-users value ~2 KB after the first "usecount" marker: within the
+    # parser's window, so reading must not stop before it arrives
+    html = fixture("ping0_normal.html").replace(
+        '<div class="usecountbar"', " " * 2000 + '<div class="usecountbar"')
+    text, early = read_in_chunks(html, 64)
+    assert early
+    assert parse_ping0(text)["shared_users"] == "1-10"
@@ -0,0 +1,54 @@
+"""
+ProgressCoalescer: batch frames carry per-node diffs against what this stream sent.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.progress import ProgressCoalescer
+
+
+def progress(n, node):
+    return {"type": "progress", "progress": n, "total": 2, "node": node}
+
+
+def test_batch_sends_changed_fields_only():
+    coalescer = ProgressCoalescer()
+    coalescer.feed([progress(0, {"id": 0, "name": "a", "ip": "❓", "proxy_config": {}})])
+    first = coalescer.flush()[0]
+    assert first["nodes"] == [{"id": 0, "name": "a", "ip": "❓"}]
+
+    coalescer.feed([progress(1, {"id": 0, "name": "a", "ip": "192.0.2.1", "proxy_config": {}})])
+    batch = coalescer.flush()[0]
+    assert batch["nodes"] == [{"id": 0, "ip": "192.0.2.1"}]
+    assert (batch["progress"], batch["total"]) == (1, 2)
+
+
+def test_update_resets_baseline():
+    coalescer = ProgressCoalescer()
+    coalescer.feed([progress(1, {"id": 0, "name": "a【❌】", "ip": "❓", "error": "Timeout"})])
+    coalescer.flush()
+
+    # A recheck replaces the node as a whole on the client
+    updated = {"id": 0, "name": "a【⚪】", "ip": "192.0.2.1", "status": "✅"}
+    update = {"type": "update", "node": updated}
+    assert coalescer.feed([update]) == [update]
+
+    # Nothing changed since the update: no resent fields, no delete of "status",
+    # no delete of "error" the client no longer has
+    coalescer.feed([progress(2, dict(updated))])
+    assert coalescer.flush()[0]["nodes"] == [{"id": 0}]
+
+    coalescer.feed([progress(2, dict(updated, ip="192.0.2.2"))])
+    assert coalescer.flush()[0]["nodes"] == [{"id": 0, "ip": "192.0.2.2"}]
+
+
+def test_other_events_flush_pending_progress_first():
+    coalescer = ProgressCoalescer()
+    frames = coalescer.feed([progress(1, {"id": 0, "name": "a"}), {"type": "complete", "total": 1}])
+    assert [frame["type"] for frame in frames] == ["batch", "complete"]
+    assert coalescer.flush() == []
@@ -0,0 +1,68 @@
+"""
+Node budgets: a spent budget never turns into a stage timeout of 0, which the
+HTTP clients and Playwright read as "no timeout".
+
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.ip_checker import IPChecker
+from core.timeouts import MIN_STAGE_TIMEOUT, Deadline, TimeoutPolicy
+
+
+class RecordingSource:
+    def __init__(self):
+        self.timeouts = []
+
+    def new_session(self, proxy=None):
+        return None
+
+    async def check(self, proxy=None, timeout=5, session=None):
+        self.timeouts.append(timeout)
+        return None
+
+
+def spent() -> Deadline:
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    return deadline
+
+
+def test_cap_never_reaches_zero():
+    deadline = spent()
+    assert deadline.expired
+    assert deadline.cap(5) == MIN_STAGE_TIMEOUT
+    assert TimeoutPolicy().timeout("browser", deadline) == MIN_STAGE_TIMEOUT
+    assert Deadline(60).cap(5) == 5
+    assert 0 < Deadline(0.05).cap(5) <= 0.1
+
+
+def offline_checker() -> IPChecker:
+    """IPChecker with recording sources and no simple-IP lookup (no traffic leaves the test)."""
+    checker = IPChecker()
+    checker._ping0, checker._ippure = RecordingSource(), RecordingSource()
+
+    async def no_ip(proxy=None, deadline=None):
+        return None
+    checker.get_simple_ip = no_ip
+    return checker
+
+
+def test_spent_budget_skips_fast_sources():
+    checker = offline_checker()
+    result = asyncio.run(checker._check_fast_impl(None, "ping0", True, spent()))
+    assert result["source"] == "failed"
+    assert checker._ping0.timeouts == [] and checker._ippure.timeouts == []
+
+
+def test_sources_get_positive_timeouts():
+    checker = offline_checker()
+    asyncio.run(checker._check_fast_impl(None, "ping0", True, Deadline(0.5)))
+    sent = checker._ping0.timeouts + checker._ippure.timeouts
+    assert sent and all(timeout >= MIN_STAGE_TIMEOUT for timeout in sent)
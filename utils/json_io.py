@@ -0,0 +1,63 @@
+"""
+JSON helpers for the web service.
+Uses orjson when installed (several times faster than the json module and
+emits bytes directly) and falls back to the standard library otherwise.
+Node records are serialized once per change and reused by every listing.
+"""
+import json
+from typing import Any, Dict, Iterable, Tuple
+
+try:
+    import orjson
+except ImportError:  # Optional: pip install orjson
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON, unknown types as str (same output either backend)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, default=str, separators=(",", ":")).encode("utf-8")
+
+
+def sse_frame(event: Dict) -> bytes:
+    return b"data: " + dumps(event) + b"\n\n"
+
+
+class RecordCache:
+    """
+    Serialized form of dict records, keyed by object identity.
+    Replacing a record with a new dict re-serializes it on next use; a record
+    mutated in place must be invalidate()d.
+    """
+
+    def __init__(self):
+        self._cache: Dict[int, Tuple[Dict, bytes]] = {}  # id(record) -> (record, json)
+        self.counters = {"hits": 0, "encoded": 0}
+
+    def encode(self, record: Dict) -> bytes:
+        entry = self._cache.get(id(record))
+        if entry is not None and entry[0] is record:
+            self.counters["hits"] += 1
+            return entry[1]
+        data = dumps(record)
+        self._cache[id(record)] = (record, data)  # Holding the record keeps its id from being reused
+        self.counters["encoded"] += 1
+        return data
+
+    def invalidate(self, record: Dict):
+        self._cache.pop(id(record), None)
+
+    def stats(self) -> Dict:
+        return dict(self.counters, entries=len(self._cache), bytes=sum(len(data) for _, data in self._cache.values()))
+
+    def listing(self, records: Iterable[Dict]) -> bytes:
+        """JSON array of the records; entries of records no longer listed are dropped."""
+        records = list(records)
+        body = b"[" + b",".join(self.encode(r) for r in records) + b"]"
+        if len(self._cache) > len(records):
+            live = {id(r) for r in records}
+            self._cache = {key: entry for key, entry in self._cache.items() if key in live}
+        return body
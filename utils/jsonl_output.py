@@ -0,0 +1,28 @@
+"""
+JSON-lines result stream for the CLI (--output jsonl).
+One object per line, flushed as soon as it is written, so a pipeline
+can consume node results while the scan is still running.
+"""
+import json
+import sys
+from typing import Any, Dict, TextIO
+
+
+class JsonlWriter:
+    def __init__(self, path: str = "-", stream: TextIO = None):
+        """path "-" writes to stream (the real stdout by default), anything else appends to a file."""
+        self.path = path
+        if path == "-":
+            self._file = stream or sys.stdout
+            self._owned = False
+        else:
+            self._file = open(path, "a", encoding="utf-8")
+            self._owned = True
+
+    def write(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._owned:
+            self._file.close()
@@ -0,0 +1,189 @@
+"""
+Rename patches: the outcome of a scan as old name -> new name plus removed
+names, instead of a rewritten config. Built in O(nodes) without looking at
+rules, and shipped as
+- JSON ({"version", "rename", "remove"}), for tools of our own
+- a JavaScript override script (function main(config)), as run by mihomo
+  front-ends (Clash Verge Rev, Mihomo Party) on every profile update
+apply_patch_stream() applies a patch to a full YAML file in one pass over
+PyYAML parser events: only proxy names and proxy-group members change, every
+other node (rules included) goes through without being constructed, and
+scalar styles (quotes, flow mappings) are kept.
+"""
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+import yaml
+
+from .yaml_io import FastLoader, FastDumper
+
+PATCH_VERSION = 1
+
+
+def build_patch(renames: Dict[str, str], removed: Iterable[str] = ()) -> Dict:
+    """Patch from {old name: new name} (unchanged names are dropped) and names to delete."""
+    removed = list(dict.fromkeys(removed))
+    gone = set(removed)
+    return {
+        "version": PATCH_VERSION,
+        "rename": {old: new for old, new in renames.items() if new != old and old not in gone},
+        "remove": removed,
+    }
+
+
+def to_json(patch: Dict) -> str:
+    return json.dumps(patch, ensure_ascii=False, indent=2)
+
+
+def to_script(patch: Dict) -> str:
+    """mihomo-style override script applying the patch to the profile's proxies and proxy-groups."""
+    rename = json.dumps(patch.get("rename", {}), ensure_ascii=False, indent=2)
+    remove = json.dumps(patch.get("remove", []), ensure_ascii=False)
+    return f"""// Generated by clash-ip-checker: renames checked nodes, removes deleted ones
+const rename = {rename};
+const remove = new Set({remove});
+
+function main(config) {{
+  config.proxies = (config.proxies || [])
+    .filter(p => !remove.has(p.name))
+    .map(p => (p.name in rename ? {{ ...p, name: rename[p.name] }} : p));
+  for (const group of config["proxy-groups"] || []) {{
+    if (Array.isArray(group.proxies)) {{
+      group.proxies = group.proxies.filter(n => !remove.has(n)).map(n => rename[n] || n);
+    }}
+  }}
+  return config;
+}}
+"""
+
+
+# --- Streaming apply ---
+
+_STARTS = (yaml.MappingStartEvent, yaml.SequenceStartEvent)
+_ENDS = (yaml.MappingEndEvent, yaml.SequenceEndEvent)
+
+
+def _subtree(events: Iterator, start) -> Iterator:
+    """Events after start up to the end of the node it opens (nothing for a scalar or alias)."""
+    if not isinstance(start, _STARTS):
+        return
+    depth = 1
+    for event in events:
+        yield event
+        if isinstance(event, _STARTS):
+            depth += 1
+        elif isinstance(event, _ENDS):
+            depth -= 1
+            if depth == 0:
+                return
+
+
+def _end(item: List, i: int) -> int:
+    """Index of the last event of the node starting at item[i]."""
+    if not isinstance(item[i], _STARTS):
+        return i
+    depth = 0
+    for j in range(i, len(item)):
+        if isinstance(item[j], _STARTS):
+            depth += 1
+        elif isinstance(item[j], _ENDS):
+            depth -= 1
+            if depth == 0:
+                return j
+    return len(item) - 1
+
+
+def _entries(item: List):
+    """(key index, value start, value end) of the top-level entries of a buffered mapping."""
+    i = 1
+    while i < len(item) - 1:
+        value = _end(item, i) + 1
+        value_end = _end(item, value)
+        yield i, value, value_end
+        i = value_end + 1
+
+
+def _is_key(event, name: str) -> bool:
+    return isinstance(event, yaml.ScalarEvent) and event.value == name
+
+
+def _renamed(event: yaml.ScalarEvent, value: str) -> yaml.ScalarEvent:
+    # Plain style may not fit the new value; the emitter then picks a quoted one
+    style = event.style if event.style in ("'", '"') else None
+    return yaml.ScalarEvent(event.anchor, event.tag, (True, True), value, event.start_mark, event.end_mark, style=style)
+
+
+def _patch_proxy(item: List, rename: Dict[str, str], remove: set) -> List:
+    if not isinstance(item[0], yaml.MappingStartEvent):
+        return item
+    for key, value, _ in _entries(item):
+        if _is_key(item[key], "name") and isinstance(item[value], yaml.ScalarEvent):
+            name = item[value].value
+            if name in remove:
+                return []
+            if name in rename:
+                item[value] = _renamed(item[value], rename[name])
+            break
+    return item
+
+
+def _patch_group(item: List, rename: Dict[str, str], remove: set) -> List:
+    if not isinstance(item[0], yaml.MappingStartEvent):
+        return item
+    for key, value, value_end in _entries(item):
+        if _is_key(item[key], "proxies") and isinstance(item[value], yaml.SequenceStartEvent):
+            members = []
+            for event in item[value + 1:value_end]:
+                if isinstance(event, yaml.ScalarEvent):
+                    if event.value in remove:
+                        continue
+                    if event.value in rename:
+                        event = _renamed(event, rename[event.value])
+                members.append(event)
+            return item[:value + 1] + members + item[value_end:]
+    return item
+
+
+def _items(events: Iterator, patch_item) -> Iterator:
+    """Sequence items one at a time (buffered), through patch_item, then the sequence end."""
+    for event in events:
+        if isinstance(event, yaml.SequenceEndEvent):
+            yield event
+            return
+        yield from patch_item([event] + list(_subtree(events, event)))
+
+
+def _patched_events(events: Iterator, rename: Dict[str, str], remove: set) -> Iterator:
+    sections = {
+        "proxies": lambda item: _patch_proxy(item, rename, remove),
+        "proxy-groups": lambda item: _patch_group(item, rename, remove),
+    }
+    events = iter(events)
+    for event in events:
+        yield event
+        if not isinstance(event, yaml.DocumentStartEvent):
+            continue
+        root = next(events)
+        yield root
+        if not isinstance(root, yaml.MappingStartEvent):
+            yield from _subtree(events, root)
+            continue
+        for key in events:
+            yield key
+            if isinstance(key, yaml.MappingEndEvent):
+                break
+            value = next(events)
+            yield value
+            patch_item = sections.get(key.value) if isinstance(key, yaml.ScalarEvent) else None
+            if patch_item and isinstance(value, yaml.SequenceStartEvent):
+                yield from _items(events, patch_item)
+            else:
+                yield from _subtree(events, value)  # e.g. rules: passed through as is
+
+
+def apply_patch_stream(source: TextIO, target: TextIO, patch: Dict, width: Optional[int] = None):
+    """Writes source with the patch applied to target, in one streaming pass."""
+    rename = patch.get("rename", {})
+    remove = set(patch.get("remove", []))
+    yaml.emit(_patched_events(yaml.parse(source, Loader=FastLoader), rename, remove), target,
+              Dumper=FastDumper, allow_unicode=True, width=width or 4096)
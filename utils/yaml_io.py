@@ -0,0 +1,135 @@
+"""
+YAML helpers for Clash subscriptions.
+Uses the libyaml C loader/dumper when available, and caches parsed
+subscriptions by content hash so one upload is never parsed twice.
+"""
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import yaml
+from yaml import YAMLError
+
+try:
+    from yaml import CSafeLoader as FastLoader, CSafeDumper as FastDumper
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as FastLoader, SafeDumper as FastDumper
+
+# Start of a top-level mapping key (not indented, not a comment, list item or document marker)
+TOP_LEVEL_KEY = re.compile(r"^(?![\s#\-.{\[])(?P<key>[^:\n]+?)\s*:(?=\s|$)", re.MULTILINE)
+
+CACHE_SIZE = 4
+
+
+def load_yaml(stream) -> Any:
+    return yaml.load(stream, Loader=FastLoader)
+
+
+def dump_yaml(data, stream=None):
+    return yaml.dump(data, stream, Dumper=FastDumper, allow_unicode=True,
+                     default_flow_style=False, sort_keys=False)
+
+
+class Subscription:
+    """
+    A Clash config as uploaded. Parsing is lazy:
+    - section(): only the top-level block asked for (proxies, proxy-groups),
+      skipping the usually huge rules list
+    - data: the whole document, C loader
+    - roundtrip: ruamel round-trip document, only needed to export with
+      comments and quoting preserved
+    """
+
+    def __init__(self, text: str, digest: Optional[str] = None):
+        self.text = text
+        self.digest = digest or hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self._data = None
+        self._sections: Dict[str, Any] = {}
+        self._roundtrip = None
+
+    @property
+    def data(self) -> Any:
+        if self._data is None:
+            self._data = load_yaml(self.text)
+        return self._data
+
+    def _extract(self, key: str) -> Optional[str]:
+        """Text of one top-level block, "" if the key is absent, None if the text can't be split."""
+        matches = list(TOP_LEVEL_KEY.finditer(self.text))
+        if not matches:
+            return None  # flow style document or similar
+        for i, match in enumerate(matches):
+            if match.group("key").strip("'\"") == key:
+                end = matches[i + 1].start() if i + 1 < len(matches) else len(self.text)
+                return self.text[match.start():end]
+        return ""
+
+    def _load_section(self, key: str) -> Any:
+        if self._data is None:
+            fragment = self._extract(key)
+            if fragment == "":
+                return None
+            if fragment is not None:
+                try:
+                    parsed = load_yaml(fragment)
+                    if isinstance(parsed, dict) and len(parsed) == 1 and key in parsed:
+                        return parsed[key]
+                except YAMLError:
+                    pass  # e.g. aliases defined in another block, use the full document
+        return self.data.get(key) if isinstance(self.data, dict) else None
+
+    def section(self, key: str) -> Any:
+        if key not in self._sections:
+            self._sections[key] = self._load_section(key)
+        return self._sections[key]
+
+    @property
+    def proxies(self) -> List[Dict]:
+        proxies = self.section("proxies")
+        return proxies if isinstance(proxies, list) else []
+
+    @property
+    def proxy_groups(self) -> List[Dict]:
+        groups = self.section("proxy-groups")
+        return groups if isinstance(groups, list) else []
+
+    def stats(self) -> Dict:
+        """What this subscription holds in memory besides its text."""
+        return {
+            "text_bytes": len(self.text),
+            "parsed": self._data is not None,
+            "roundtrip": self._roundtrip is not None,
+            "sections": sorted(self._sections),
+        }
+
+    @property
+    def roundtrip(self) -> Any:
+        if self._roundtrip is None:
+            from ruamel.yaml import YAML
+            rt = YAML()
+            rt.preserve_quotes = True
+            self._roundtrip = rt.load(self.text)
+        return self._roundtrip
+
+
+_cache: "OrderedDict[str, Subscription]" = OrderedDict()
+
+
+def get_subscription(text: str) -> Subscription:
+    """Returns the cached Subscription for this content, parsing nothing up front."""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    sub = _cache.get(digest)
+    if sub is None:
+        sub = Subscription(text, digest)
+        _cache[digest] = sub
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    else:
+        _cache.move_to_end(digest)
+    return sub
+
+
+def cache_stats() -> Dict:
+    """Subscriptions kept by get_subscription and the text they hold."""
+    return {"entries": len(_cache), "text_bytes": sum(len(sub.text) for sub in _cache.values())}
@@ -4,7 +4,11 @@ FastAPI backend with SSE progress and REST API
 """
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
+import argparse
+import asyncio
+import importlib.util
 import os
 import sys
 
@@ -13,19 +17,47 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from routers.api import router as api_router
 from routers.views import router as views_router
+from routers.coordinator import router as coordinator_router
+from routers.admin import router as admin_router
 
 from contextlib import asynccontextmanager
 from state import state
+from utils.json_io import dumps, BACKEND as JSON_BACKEND
+from core.memprof import profiler
+from core.warmup import warm_up, format_timings
+from utils.config_loader import load_config
+
+async def run_warmup(options):
+    """Start-up warm-up (web.py --warmup); scans started meanwhile wait for it."""
+    controller = state.controller(options["api_url"], options["secret"]) if options.get("api_url") else None
+    timings = await warm_up(state.checker, controller, browser=options.get("browser", False))
+    print(f"[Warmup] {format_timings(timings)}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
+    # Startup: warm up in the background, the server answers right away
+    if state.warmup:
+        state.warmup_task = asyncio.create_task(run_warmup(state.warmup))
     yield
     # Shutdown
     print("[Web] Shutting down, cleaning up resources...")
+    if state.warmup_task and not state.warmup_task.done():
+        state.warmup_task.cancel()
+        await asyncio.wait({state.warmup_task}, timeout=5)
+    if state.task and not state.task.done():
+        state.task.cancel()
+        await asyncio.wait({state.task}, timeout=5)
     await state.checker.stop()
+    state.close_history()
+
+class FastJSONResponse(JSONResponse):
+    """Responses rendered with utils.json_io (orjson when installed)."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
 
-app = FastAPI(title="Clash IP Checker", lifespan=lifespan)
+app = FastAPI(title="Clash IP Checker", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Mount supporting static files
 static_dir = os.path.join(os.path.dirname(__file__), "static")
@@ -40,7 +72,47 @@ app.mount("/exports", StaticFiles(directory=exports_dir), name="exports")
 # Include Routers
 app.include_router(views_router)
 app.include_router(api_router)
+app.include_router(coordinator_router)
+app.include_router(admin_router)
+
+def event_loop() -> str:
+    """uvloop when installed (uvicorn[standard] ships it except on Windows), asyncio otherwise."""
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8080)
+    parser = argparse.ArgumentParser(description="Clash IP Checker web interface")
+    parser.add_argument("--memprof", action="store_true",
+                        help="Trace allocations from startup (report: GET /api/admin/memory)")
+    parser.add_argument("--memprof-frames", type=int, default=1, help="Traceback depth kept by tracemalloc")
+    parser.add_argument("--admin-token", default=os.environ.get("CLASH_CHECKER_ADMIN_TOKEN", ""),
+                        help="Required in X-Admin-Token for /api/admin (default: local clients only)")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Address to listen on; remote workers need e.g. 0.0.0.0, then also set --admin-token "
+                             "and the scan's coordinator_token")
+    parser.add_argument("--history-db", default="history.db",
+                        help='SQLite file for the check history (like history_db in config.yaml), "" disables it')
+    parser.add_argument("--warmup", action="store_true",
+                        help="At startup: load check sources, resolve their hosts, cache the controller's /configs")
+    parser.add_argument("--warmup-browser", action="store_true", help="Also launch Chromium at startup (browser mode)")
+    parser.add_argument("--clash-api", default=None,
+                        help="Controller to warm up (default: clash_api_url from config.yaml, else http://127.0.0.1:9097)")
+    parser.add_argument("--clash-secret", default=None, help="Its secret (default: clash_api_secret from config.yaml)")
+    args = parser.parse_args()
+    state.admin_token = args.admin_token
+    state.history_db = args.history_db or None
+    if args.warmup or args.warmup_browser:
+        cfg = load_config("config.yaml") or {}
+        state.warmup = {
+            "api_url": args.clash_api or cfg.get("clash_api_url", "http://127.0.0.1:9097"),
+            "secret": args.clash_secret if args.clash_secret is not None else cfg.get("clash_api_secret", ""),
+            "browser": args.warmup_browser,
+        }
+    if args.memprof:
+        profiler.start(args.memprof_frames)
+        print(f"[Web] tracemalloc on ({args.memprof_frames} frames), report at /api/admin/memory")
+
+    loop = event_loop()
+    print(f"[Web] Event loop: {loop}, JSON: {JSON_BACKEND}")
+    uvicorn.run(app, host=args.host, port=8080, loop=loop)
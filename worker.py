@@ -0,0 +1,170 @@
+"""
+Remote worker for coordinator mode.
+Pulls work units from a web.py instance running a scan with "coordinator": true,
+checks them through its own local Clash core and pushes the results back.
+
+    python worker.py --coordinator http://192.168.1.10:8080 --clash-api http://127.0.0.1:9097
+
+Several workers can run on one host, each pointed at its own core.
+Connection settings not given on the command line come from config.yaml.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from clash_automator import (
+    test_single_proxy, print_unavailable,
+    CLASH_API_URL, CLASH_API_SECRET, SELECTOR_NAME, FAST_MODE, SOURCE, FALLBACK, HEADLESS,
+    NODE_TIMEOUT, BROWSER_NODE_TIMEOUT, LOCAL_DB, LOCAL_DB_SKIP_DATACENTER,
+    REUSE_CONNECTIONS, DROP_CONNECTIONS,
+)
+from core.ip_checker import IPChecker
+from core.clash_api import ClashController
+from core.concurrency import classify
+
+
+class Worker:
+    def __init__(self, coordinator: str, controller: ClashController, checker: IPChecker,
+                 worker_id: str, token: str = "", fast_mode: bool = FAST_MODE, poll_interval: float = 3):
+        self.coordinator = coordinator.rstrip("/")
+        self.controller = controller
+        self.checker = checker
+        self.worker_id = worker_id
+        self.headers = {"X-Worker-Token": token} if token else {}
+        self.fast_mode = fast_mode
+        self.poll_interval = poll_interval
+        self.local_proxy = None
+        checker.follow(controller, reuse=REUSE_CONNECTIONS)
+
+    async def _post(self, session: aiohttp.ClientSession, path: str, payload: Dict) -> Tuple[int, Optional[Dict]]:
+        async with session.post(f"{self.coordinator}/api/coordinator/{path}", json=payload, headers=self.headers) as resp:
+            data = await resp.json() if resp.content_type == "application/json" else None
+            return resp.status, data
+
+    async def _keep_lease(self, session, unit: Dict, lost: asyncio.Event):
+        """Heart-beats until cancelled; sets lost if the coordinator took the unit back."""
+        payload = {"worker_id": self.worker_id, "unit_id": unit["unit_id"], "lease_id": unit["lease_id"]}
+        interval = max(unit["lease_seconds"] / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                status, _ = await self._post(session, "heartbeat", payload)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"[Worker] Heartbeat failed: {e!r}")
+                continue
+            if status != 200:
+                lost.set()
+                return
+            unit["renewed_at"] = time.monotonic()
+
+    async def _post_results(self, session, unit: Dict, results: List[Dict], lost: asyncio.Event):
+        """Delivers a unit's results, retrying with backoff while its lease may still be valid."""
+        payload = {"worker_id": self.worker_id, "unit_id": unit["unit_id"],
+                   "lease_id": unit["lease_id"], "results": results}
+        delay = 1
+        while True:
+            try:
+                status, data = await self._post(session, "results", payload)
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Past the lease the coordinator hands the unit to someone else and rejects these results
+                expires = unit["renewed_at"] + unit["lease_seconds"]
+                if lost.is_set() or time.monotonic() + delay >= expires:
+                    print(f"[Worker] Results of {unit['unit_id']} not delivered, lease expired: {e!r}")
+                    return
+                print(f"[Worker] Delivering results of {unit['unit_id']} failed ({e!r}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+        if status == 200:
+            print(f"[Worker] {unit['unit_id']} done: {data}")
+        else:
+            print(f"[Worker] Results of {unit['unit_id']} rejected ({status}): {data}")
+
+    async def run_unit(self, session, unit: Dict):
+        nodes = unit["nodes"]
+        print(f"\n[Worker] {unit['unit_id']}: {len(nodes)} nodes")
+        names = [n["proxy"].get("name", "") for n in nodes]
+        selector, unavailable = await self.controller.prepare_selector(names, SELECTOR_NAME)
+        print_unavailable(unavailable)
+
+        lost = asyncio.Event()
+        unit["renewed_at"] = time.monotonic()
+        keeper = asyncio.create_task(self._keep_lease(session, unit, lost))
+        results = []
+        try:
+            for node in nodes:
+                if lost.is_set():
+                    print(f"[Worker] Lost the lease of {unit['unit_id']}, dropping it")
+                    return
+                name = node["proxy"].get("name", "")
+                if name in unavailable:
+                    continue  # No result: the coordinator retries it, possibly on another worker
+                cloudflare_before = self.checker.cloudflare_hits
+                started = time.monotonic()
+                res = await test_single_proxy(self.controller, self.checker, name, selector, self.local_proxy,
+                                              fast_mode=self.fast_mode, source=SOURCE, fallback=FALLBACK)
+                used = self.checker.traffic.of(name)
+                results.append({
+                    "id": node["id"], "result": res, "traffic": used["sent"] + used["received"],
+                    "outcome": classify(res, cloudflare=self.checker.cloudflare_hits > cloudflare_before),
+                    "seconds": round(time.monotonic() - started, 3),
+                })
+            # Heart-beats go on meanwhile, a retry may outlast the original lease
+            await self._post_results(session, unit, results, lost)
+        finally:
+            keeper.cancel()
+
+    async def run(self, exit_when_done: bool = False):
+        await self.controller.set_mode("global")
+        port = await self.controller.get_running_port()
+        self.local_proxy = f"http://127.0.0.1:{port}"
+        print(f"[Worker] {self.worker_id} using local proxy {self.local_proxy}, coordinator {self.coordinator}")
+
+        if not self.fast_mode:
+            await self.checker.start()
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+                while True:
+                    try:
+                        status, data = await self._post(session, "lease", {"worker_id": self.worker_id})
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        print(f"[Worker] Coordinator unreachable: {e!r}")
+                        await asyncio.sleep(self.poll_interval)
+                        continue
+                    if status != 200:
+                        print(f"[Worker] Lease refused ({status}): {data}")
+                        return
+                    if data["unit"]:
+                        await self.run_unit(session, data["unit"])
+                        continue
+                    if exit_when_done and data["finished"]:
+                        print("[Worker] Scan finished, exiting")
+                        return
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            await self.checker.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pull-based worker for distributed scans")
+    parser.add_argument("--coordinator", required=True, help="Web app URL, e.g. http://127.0.0.1:8080")
+    parser.add_argument("--token", default="", help="coordinator_token of the scan, if set")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--clash-api", default=CLASH_API_URL, help="External controller of this worker's core")
+    parser.add_argument("--clash-secret", default=CLASH_API_SECRET)
+    parser.add_argument("--exit-when-done", action="store_true", help="Exit once the current scan is finished")
+    args = parser.parse_args()
+
+    checker = IPChecker(headless=HEADLESS, local_db=LOCAL_DB, skip_datacenter=LOCAL_DB_SKIP_DATACENTER,
+                        fast_budget=NODE_TIMEOUT, browser_budget=BROWSER_NODE_TIMEOUT)
+    controller = ClashController(args.clash_api, args.clash_secret, drop_connections=DROP_CONNECTIONS)
+    worker = Worker(args.coordinator, controller, checker, worker_id=args.worker_id, token=args.token)
+    try:
+        asyncio.run(worker.run(exit_when_done=args.exit_when_done))
+    except KeyboardInterrupt:
+        print("\n[Worker] Interrupted")